@@ -1,45 +1,126 @@
 import pygame
 import sys
 import os
-from utils import sound_manager  
+import argparse
+from utils import sound_manager, model_manager, frame_stats
+from engine.profiling import activar, tramo
 from screens.title_screen import TitleScreen
 
 WIDTH, HEIGHT = 800, 600
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Frames por segundo máximos mientras hay cambios en pantalla
+FPS = 60
+
+# Sin eventos, la App espera hasta este tiempo (ms) antes de comprobar si ha terminado la carga del modelo
+IDLE_WAIT_MS = 250
+
+def dirty_rects(current_screen, event):
+    """Áreas a redibujar por un evento: None es la pantalla completa y [] ninguna."""
+    if hasattr(current_screen, "dirty_rects"):
+        return current_screen.dirty_rects(event)
+
+    # Las pantallas que no reaccionan al ratón solo cambian con clics, teclas o eventos de la ventana
+    if event.type == pygame.MOUSEMOTION:
+        return []
+    return None
+
 def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Poker Mind")
-    pygame.display.set_icon(pygame.image.load(os.path.join(BASE_DIR, "assets", "img", "res", "icon.png")))
+    parser = argparse.ArgumentParser(description="Poker Mind")
+    parser.add_argument("--fps", type=int, default=FPS, help="Frames por segundo máximos")
+    parser.add_argument("--tiempos", action="store_true", help="Muestra los tiempos de cada frame (también con F3)")
+    parser.add_argument("--perfil", metavar="RUTA", help="Guarda al salir los tiempos de cada tramo (.json o .prof)")
+    args = parser.parse_args()
+    if args.perfil:
+        activar(args.perfil)
+
+    with tramo("arranque.ventana"):
+        pygame.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Poker Mind")
+        pygame.display.set_icon(pygame.image.load(os.path.join(BASE_DIR, "assets", "img", "res", "icon.png")))
+    clock = pygame.time.Clock()
+    frame_stats.visible = args.tiempos
+
+    # Cargamos el modelo en segundo plano mientras se muestra la pantalla de título
+    model_manager.start_loading()
 
     # Música de fondo
-    sound_manager.load_music(os.path.join(BASE_DIR, "assets", "sounds", "music"))
-    sound_manager.play_music(loops=-1, start=0.0) 
+    with tramo("arranque.musica"):
+        sound_manager.load_music(os.path.join(BASE_DIR, "assets", "sounds", "music"))
+        sound_manager.play_music(loops=-1, start=0.0)
 
     current_screen = TitleScreen()
+    model_status = model_manager.status()
 
-    # Bucle principal
+    # Bucle principal: solo se dibuja cuando algo cambia
     running = True
+    full_redraw = True
+    rects = []
     while running:
-        for event in pygame.event.get():
+        # Sin nada pendiente de dibujar, esperamos al siguiente evento sin consumir CPU
+        events = pygame.event.get()
+        if not events and not full_redraw and not rects:
+            events = [pygame.event.wait(IDLE_WAIT_MS)]
+
+        for event in events:
+            if event.type == pygame.NOEVENT:
+                continue
             if event.type == pygame.QUIT:
                 running = False
+                break
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                frame_stats.visible = not frame_stats.visible
+                full_redraw = True
+                continue
 
-            new_screen = current_screen.handle_events(event)
+            with tramo("frame.eventos"):
+                new_screen = current_screen.handle_events(event)
             if new_screen is None:
                 running = False
+                break
             elif new_screen is not current_screen:
                 current_screen = new_screen
+                full_redraw = True
+            else:
+                changed = dirty_rects(current_screen, event)
+                if changed is None:
+                    full_redraw = True
+                else:
+                    rects.extend(changed)
+
+        # El estado del modelo se muestra en todas las pantallas
+        if model_manager.status() != model_status:
+            model_status = model_manager.status()
+            # Las pantallas con una predicción pendiente la terminan al cargarse el modelo
+            if hasattr(current_screen, "on_model_status"):
+                current_screen.on_model_status()
+            full_redraw = True
+
+        if running and (full_redraw or rects):
+            frame_stats.start()
+            with tramo("frame.dibujo." + type(current_screen).__name__):
+                if full_redraw:
+                    current_screen.draw(screen)
+                else:
+                    # Solo se pintan las áreas que han cambiado: lo que cae fuera del recorte no se toca
+                    for rect in rects:
+                        screen.set_clip(rect)
+                        current_screen.draw(screen)
+                    screen.set_clip(None)
+            if frame_stats.visible:
+                rects.append(frame_stats.draw(screen))
+            if full_redraw:
+                pygame.display.flip()
+            else:
+                pygame.display.update(rects)
+            frame_stats.stop(full_redraw)
+            full_redraw = False
+            rects = []
+            clock.tick(args.fps)
 
-        if running:
-            screen.fill((0, 0, 0))
-            current_screen.draw(screen)
-            pygame.display.flip()
-    
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,407 @@
+# ANOTACIÓN DE HISTORIALES DE MANOS JUGADAS
+#
+# Lee historiales de manos en texto (el formato de PokerStars y compatibles) o en JSON lines y
+# anota la equity del jugador en cada punto de decisión: cada calle (preflop, flop, turn y river)
+# que empieza con el jugador todavía en la mano, con el tablero visible y los rivales que no se
+# han retirado en ese momento (como máximo MAX_RIVALES, el máximo del modelo y de la tabla).
+#
+#   - Antes del flop la equity sale de la tabla de engine.preflop.
+#   - Con el método modelo, cada punto del flop y del turn se resuelve con el modelo sobre
+#     varias continuaciones al azar del tablero (la media de sus probabilidades, como en
+#     engine.whatif) y el river con una sola fila. Todas las filas de un lote van en una
+#     llamada al modelo.
+#   - Con el método evaluador, por Monte Carlo con el evaluador por lotes: se reparten el resto
+#     del tablero y las cartas de los rivales varias veces para todos los puntos a la vez.
+#
+# Las manos se leen en streaming y se agrupan en lotes de tamaño fijo. Un pool de procesos
+# interpreta y anota cada lote mientras se leen los siguientes (con un número acotado de lotes
+# pendientes) y las anotaciones se escriben en el orden de entrada, así que la memoria no
+# depende del tamaño de los ficheros.
+#
+# Formato JSON lines de entrada, una mano por línea (rivales es un número o uno por calle):
+#   {"id": "1", "cartas_jugador": ["Ah", "Kd"], "rivales": [5, 2, 1, 1], "mesa": ["2c", "7d", "Th", "Js", "3h"]}
+# La salida es JSON lines (una línea por mano, con sus calles) o CSV (una fila por punto de
+# decisión) si termina en .csv.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.annotator ../historiales/*.txt --salida ../anotaciones.jsonl
+#   python -m engine.annotator ../manos.jsonl --salida ../anotaciones.csv --metodo evaluador --procesos 8
+
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+import re
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas
+from engine.cards import BARAJA, carta_a_numero, codigo_carta, indice_carta, numero_a_carta
+from engine.features import features_mano
+from engine.inference import RUTA_MODELO, ModeloNumpy, cargar_modelo
+from engine.preflop import MAX_RIVALES, equity_preflop_lote
+from engine.profiling import medir, volcar_proceso
+
+CALLES = ["preflop", "flop", "turn", "river"]
+CARTAS_CALLE = {"preflop": 0, "flop": 3, "turn": 4, "river": 5}
+
+METODOS = ["modelo", "evaluador"]
+
+# Manos por lote y lotes pendientes por proceso
+TAM_LOTE = 2000
+LOTES_POR_PROCESO = 2
+
+# Continuaciones del tablero por punto (método modelo) y repartos por punto (método evaluador)
+CONTINUACIONES = 16
+SIMULACIONES = 1000
+
+# Filas (puntos x repartos) que se simulan de cada vez con el evaluador
+MAX_FILAS_SIMULACION = 131072
+
+_INDICES = np.zeros(145, dtype=np.int64)
+_INDICES[BARAJA] = [indice_carta(codigo) for codigo in BARAJA]
+_CODIGOS = np.array([codigo_carta(indice) for indice in range(52)], dtype=np.uint8)
+
+
+# LECTURA
+
+_PALOS_ASCII = {"s": "♠", "c": "♣", "d": "♦", "h": "♥"}
+_INICIO_MANO = re.compile(r"Hand #\s*([\w-]+)")
+_ASIENTO = re.compile(r"^Seat \d+: (.+?) \(.*in chips")
+_REPARTO = re.compile(r"^Dealt to (.+?) \[([^\]]+)\]")
+_CORCHETES = re.compile(r"\[([^\]]+)\]")
+
+
+def carta_historial(texto):
+    """Código de una carta escrita como en los historiales ("Ah", "Td", "10d") o como en la App ("A♠")."""
+    texto = texto.strip()
+    valor, palo = texto[:-1].upper(), texto[-1]
+    try:
+        return carta_a_numero({"T": "10"}.get(valor, valor) + _PALOS_ASCII.get(palo.lower(), palo))
+    except KeyError:
+        raise ValueError(f"Carta no válida: {texto}")
+
+
+def _comprobar(cartas_jugador, mesa):
+    if len(cartas_jugador) != 2 or len(mesa) > 5 or len(set(cartas_jugador + mesa)) != len(cartas_jugador) + len(mesa):
+        raise ValueError("Cartas repetidas o en número incorrecto")
+
+
+def mano_desde_texto(texto, jugador=None):
+    """Mano de un historial en texto: {"id", "cartas_jugador", "mesa", "calles": [(calle, rivales)]}, o None.
+
+    El jugador es el de la línea "Dealt to" con cartas (o el indicado). Los rivales de cada calle
+    son los jugadores sentados que no se han retirado (folds) al empezar la calle.
+    """
+    identificador, heroe, cartas_jugador = None, None, None
+    activos, mesa, inicios = set(), [], []
+    repartidas = False
+    for linea in texto.splitlines():
+        linea = linea.strip()
+        if identificador is None and (encontrado := _INICIO_MANO.search(linea)):
+            identificador = encontrado.group(1)
+        if linea.startswith("*** "):
+            marcador = linea[4:].split(" ***")[0].upper()
+            if marcador == "HOLE CARDS":
+                repartidas = True
+                inicios.append(("preflop", set(activos)))
+            elif marcador in ("FLOP", "TURN", "RIVER"):
+                mesa = [carta_historial(carta) for grupo in _CORCHETES.findall(linea) for carta in grupo.split()]
+                inicios.append((marcador.lower(), set(activos)))
+            elif marcador in ("SHOW DOWN", "SUMMARY"):
+                break
+        elif not repartidas:
+            if (asiento := _ASIENTO.match(linea)) and "sitting out" not in linea:
+                activos.add(asiento.group(1))
+        elif (reparto := _REPARTO.match(linea)) and heroe is None and (jugador is None or reparto.group(1) == jugador):
+            heroe, cartas_jugador = reparto.group(1), [carta_historial(c) for c in reparto.group(2).split()]
+        elif linea.endswith(": folds") or ": folds " in linea:
+            activos.discard(linea.split(": folds")[0])
+
+    if heroe is None:
+        return None
+    _comprobar(cartas_jugador, mesa)
+    calles = [(calle, min(len(jugadores) - 1, MAX_RIVALES)) for calle, jugadores in inicios
+              if (calle == "preflop" or heroe in jugadores) and len(jugadores) > 1 and len(mesa) >= CARTAS_CALLE[calle]]
+    return {"id": identificador, "cartas_jugador": cartas_jugador, "mesa": mesa, "calles": calles}
+
+
+def mano_desde_json(linea):
+    """Mano de una línea JSON con id, cartas_jugador, rivales (número o uno por calle) y mesa."""
+    datos = json.loads(linea)
+    cartas_jugador = [carta_historial(carta) for carta in datos["cartas_jugador"]]
+    mesa = [carta_historial(carta) for carta in datos.get("mesa", [])]
+    _comprobar(cartas_jugador, mesa)
+    rivales = datos["rivales"]
+    rivales = [rivales] * len(CALLES) if isinstance(rivales, int) else list(rivales)
+    calles = []
+    for calle, num_rivales in zip(CALLES, rivales):
+        if len(mesa) < CARTAS_CALLE[calle] or num_rivales < 1:
+            break
+        calles.append((calle, min(int(num_rivales), MAX_RIVALES)))
+    return {"id": datos.get("id"), "cartas_jugador": cartas_jugador, "mesa": mesa, "calles": calles}
+
+
+def _es_json(ruta):
+    return ruta.endswith((".jsonl", ".json", ".ndjson"))
+
+
+def leer_registros(rutas):
+    """Recorre los ficheros en streaming y devuelve (formato, texto) de cada mano: una línea JSON o un historial."""
+    for patron in rutas:
+        for ruta in sorted(glob.glob(patron)) or [patron]:
+            with open(ruta, encoding="utf-8-sig", errors="replace") as fichero:
+                if _es_json(ruta):
+                    for linea in fichero:
+                        if linea.strip():
+                            yield "json", linea
+                    continue
+
+                # En texto, cada mano empieza en la línea con "Hand #"
+                lineas = []
+                for linea in fichero:
+                    if _INICIO_MANO.search(linea) and lineas:
+                        yield "texto", "".join(lineas)
+                        lineas = []
+                    if lineas or linea.strip():
+                        lineas.append(linea)
+                if lineas:
+                    yield "texto", "".join(lineas)
+
+
+# EQUITY DE LOS PUNTOS DE DECISIÓN
+
+def repartir(rng, conocidas, num_cartas, repeticiones):
+    """Cartas (N, repeticiones, num_cartas) al azar sin reemplazamiento entre las que no están en conocidas (N, K)."""
+    claves = rng.random((len(conocidas), repeticiones, 52), dtype=np.float32)
+    mascara = np.zeros((len(conocidas), 52), dtype=bool)
+    mascara[np.arange(len(conocidas))[:, None], _INDICES[conocidas]] = True
+    claves[np.broadcast_to(mascara[:, None, :], claves.shape)] = 2
+    if num_cartas == 0:
+        return np.empty((len(conocidas), repeticiones, 0), dtype=np.uint8)
+    return _CODIGOS[np.argpartition(claves, num_cartas - 1, axis=2)[:, :, :num_cartas]]
+
+
+def equity_modelo(modelo, rng, cartas_jugador, mesa, num_comunitarias, num_rivales, continuaciones=CONTINUACIONES):
+    """Probabilidades (N, 3) del modelo, de media sobre continuaciones al azar del tablero (una en el river)."""
+    faltan = 5 - num_comunitarias
+    repeticiones = continuaciones if faltan else 1
+    conocidas = np.concatenate([cartas_jugador, mesa[:, :num_comunitarias]], axis=1)
+    tablero = np.concatenate([np.broadcast_to(mesa[:, None, :num_comunitarias], (len(mesa), repeticiones, num_comunitarias)),
+                              repartir(rng, conocidas, faltan, repeticiones)], axis=2)
+    X = features_mano(np.repeat(cartas_jugador, repeticiones, axis=0), np.repeat(num_rivales, repeticiones),
+                      tablero.reshape(-1, 5))
+    return modelo.predecir(X).reshape(len(mesa), repeticiones, 3).mean(axis=1)
+
+
+def equity_evaluador(rng, cartas_jugador, mesa, num_comunitarias, num_rivales, simulaciones=SIMULACIONES):
+    """Probabilidades (N, 3) por Monte Carlo con el evaluador, para puntos con el mismo tablero visible y rivales."""
+    n, faltan = len(mesa), 5 - num_comunitarias
+    conocidas = np.concatenate([cartas_jugador, mesa[:, :num_comunitarias]], axis=1)
+    reparto = repartir(rng, conocidas, faltan + 2 * num_rivales, simulaciones)
+    tablero = np.concatenate([np.broadcast_to(mesa[:, None, :num_comunitarias], (n, simulaciones, num_comunitarias)),
+                              reparto[:, :, :faltan]], axis=2)
+    fuerza_jugador = evaluar_fuerzas(np.concatenate(
+        [np.broadcast_to(cartas_jugador[:, None, :], (n, simulaciones, 2)), tablero], axis=2).reshape(-1, 7))
+    rivales = reparto[:, :, faltan:].reshape(n, simulaciones, num_rivales, 2)
+    manos_rivales = np.concatenate([rivales, np.broadcast_to(tablero[:, :, None, :], (n, simulaciones, num_rivales, 5))], axis=3)
+    mejor_rival = evaluar_fuerzas(manos_rivales.reshape(-1, 7)).reshape(-1, num_rivales).max(axis=1)
+
+    # Derrota si algún rival tiene mejor mano y empate si alguno la iguala, como en el generador
+    derrotas = (mejor_rival > fuerza_jugador).reshape(n, simulaciones).mean(axis=1)
+    empates = (mejor_rival == fuerza_jugador).reshape(n, simulaciones).mean(axis=1)
+    return np.column_stack([derrotas, empates, 1 - derrotas - empates])
+
+
+@medir("anotador.puntos")
+def equity_puntos(cartas_jugador, mesa, num_comunitarias, num_rivales, metodo="modelo", modelo=None, rng=None,
+                  continuaciones=CONTINUACIONES, simulaciones=SIMULACIONES):
+    """Probabilidades (N, 3) de derrota, empate y victoria de N puntos de decisión.
+
+    cartas_jugador es (N, 2), mesa (N, 5) (rellena con ceros hasta 5 cartas), num_comunitarias
+    (N,) con 0, 3, 4 o 5 cartas visibles y num_rivales (N,).
+    """
+    rng = rng or np.random.default_rng()
+    probabilidades = np.zeros((len(mesa), 3))
+    for visibles in (0, 3, 4, 5):
+        seleccion = np.flatnonzero(num_comunitarias == visibles)
+        if not len(seleccion):
+            continue
+        if visibles == 0:
+            probabilidades[seleccion] = equity_preflop_lote(cartas_jugador[seleccion], num_rivales[seleccion])
+        elif metodo == "modelo":
+            probabilidades[seleccion] = equity_modelo(modelo, rng, cartas_jugador[seleccion], mesa[seleccion], visibles,
+                                                      num_rivales[seleccion], continuaciones)
+        else:
+            # Los repartos tienen la misma forma para los puntos con los mismos rivales
+            for rivales in np.unique(num_rivales[seleccion]):
+                grupo = seleccion[num_rivales[seleccion] == rivales]
+                paso = max(1, MAX_FILAS_SIMULACION // simulaciones)
+                for inicio in range(0, len(grupo), paso):
+                    puntos = grupo[inicio:inicio + paso]
+                    probabilidades[puntos] = equity_evaluador(rng, cartas_jugador[puntos], mesa[puntos], visibles,
+                                                              int(rivales), simulaciones)
+    return probabilidades
+
+
+# ANOTACIÓN POR LOTES
+
+_configuracion = {}
+_modelo = None
+
+
+def _iniciar_proceso(configuracion):
+    # Cada proceso carga el modelo una sola vez
+    global _configuracion, _modelo
+    _configuracion = configuracion
+    if configuracion["metodo"] == "modelo":
+        ruta = configuracion["ruta_modelo"]
+        _modelo = cargar_modelo() if ruta == RUTA_MODELO else ModeloNumpy(ruta)
+
+
+def _lineas_salida(manos, probabilidades, csv_salida):
+    # Texto de salida de las manos anotadas: una línea JSON por mano o una fila CSV por punto
+    salida = io.StringIO()
+    escritor = csv.writer(salida, lineterminator="\n") if csv_salida else None
+    punto = 0
+    for mano in manos:
+        calles = []
+        for calle, rivales in mano["calles"]:
+            derrota, empate, victoria = (round(float(p), 4) for p in probabilidades[punto])
+            punto += 1
+            if escritor:
+                mesa = " ".join(numero_a_carta(c) for c in mano["mesa"][:CARTAS_CALLE[calle]])
+                escritor.writerow([mano["id"], calle, " ".join(numero_a_carta(c) for c in mano["cartas_jugador"]), mesa,
+                                   rivales, derrota, empate, victoria])
+            else:
+                calles.append({"calle": calle, "rivales": rivales, "derrota": derrota, "empate": empate, "victoria": victoria})
+        if not escritor:
+            salida.write(json.dumps({"id": mano["id"], "cartas_jugador": [numero_a_carta(c) for c in mano["cartas_jugador"]],
+                                     "mesa": [numero_a_carta(c) for c in mano["mesa"]], "calles": calles},
+                                    ensure_ascii=False) + "\n")
+    return salida.getvalue()
+
+
+@medir("anotador.lote")
+def anotar_lote(registros, configuracion=None, modelo=None, semilla=None):
+    """Interpreta y anota un lote de registros de leer_registros: (texto de salida, manos, puntos, omitidas)."""
+    configuracion = configuracion or _configuracion
+    modelo = modelo or _modelo
+    manos, omitidas = [], 0
+    for formato, texto in registros:
+        try:
+            mano = mano_desde_json(texto) if formato == "json" else mano_desde_texto(texto, configuracion["jugador"])
+        except (KeyError, TypeError, ValueError):
+            mano = None
+        if mano is None or not mano["calles"]:
+            omitidas += 1
+        else:
+            manos.append(mano)
+
+    puntos = [(mano["cartas_jugador"], mano["mesa"] + [0] * (5 - len(mano["mesa"])), CARTAS_CALLE[calle], rivales)
+              for mano in manos for calle, rivales in mano["calles"]]
+    if puntos:
+        cartas_jugador, mesa, num_comunitarias, num_rivales = (np.array(columna) for columna in zip(*puntos))
+        probabilidades = equity_puntos(cartas_jugador.astype(np.uint8), mesa.astype(np.uint8), num_comunitarias, num_rivales,
+                                       configuracion["metodo"], modelo, np.random.default_rng(semilla),
+                                       configuracion["continuaciones"], configuracion["simulaciones"])
+    else:
+        probabilidades = np.empty((0, 3))
+    return _lineas_salida(manos, probabilidades, configuracion["csv"]), len(manos), len(puntos), omitidas
+
+
+def _anotar_lote(argumentos):
+    registros, semilla = argumentos
+    resultado = anotar_lote(registros, semilla=semilla)
+    volcar_proceso()
+    return resultado
+
+
+def _lotes(registros, tam_lote):
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) == tam_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def anotar_ficheros(rutas, salida, metodo="modelo", jugador=None, ruta_modelo=RUTA_MODELO, continuaciones=CONTINUACIONES,
+                    simulaciones=SIMULACIONES, procesos=None, tam_lote=TAM_LOTE, semilla=0):
+    """Anota todas las manos de los ficheros en salida (JSON lines o CSV) y devuelve (manos, puntos, omitidas)."""
+    if metodo not in METODOS:
+        raise ValueError(f"Método desconocido: {metodo}")
+    # Exportamos el modelo antes de lanzar los procesos si falta o está desactualizado
+    if metodo == "modelo" and ruta_modelo == RUTA_MODELO:
+        cargar_modelo()
+    procesos = procesos or os.cpu_count()
+    configuracion = {"metodo": metodo, "jugador": jugador, "ruta_modelo": ruta_modelo, "continuaciones": continuaciones,
+                     "simulaciones": simulaciones, "csv": salida.endswith(".csv")}
+    semillas = np.random.SeedSequence(semilla)
+
+    totales = np.zeros(3, dtype=np.int64)
+    inicio = time.perf_counter()
+    with open(salida, "w", encoding="utf-8", newline="") as fichero:
+        if configuracion["csv"]:
+            fichero.write("id,calle,cartas_jugador,mesa,rivales,derrota,empate,victoria\n")
+
+        def escribir(resultado):
+            texto, *cuentas = resultado
+            fichero.write(texto)
+            totales[:] += cuentas
+            print(f"{totales[0]:,} manos anotadas ({totales[0] / (time.perf_counter() - inicio):,.0f} manos/s)")
+
+        tareas = ((lote, semillas.spawn(1)[0]) for lote in _lotes(leer_registros(rutas), tam_lote))
+        if procesos == 1:
+            _iniciar_proceso(configuracion)
+            for tarea in tareas:
+                escribir(_anotar_lote(tarea))
+            return tuple(int(t) for t in totales)
+
+        # Como mucho LOTES_POR_PROCESO lotes por proceso pendientes, escritos en el orden de lectura
+        with Pool(procesos, initializer=_iniciar_proceso, initargs=(configuracion,)) as pool:
+            pendientes = deque()
+            for tarea in tareas:
+                pendientes.append(pool.apply_async(_anotar_lote, (tarea,)))
+                if len(pendientes) >= procesos * LOTES_POR_PROCESO:
+                    escribir(pendientes.popleft().get())
+            while pendientes:
+                escribir(pendientes.popleft().get())
+    return tuple(int(t) for t in totales)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anota la equity de cada calle de las manos de historiales en texto o JSON lines.")
+    parser.add_argument("rutas", nargs="+", help="Historiales en texto (.txt) o JSON lines (.jsonl), admite patrones")
+    parser.add_argument("--salida", required=True, help="Fichero de salida: JSON lines o CSV (.csv)")
+    parser.add_argument("--metodo", choices=METODOS, default="modelo", help="Modelo o Monte Carlo con el evaluador")
+    parser.add_argument("--jugador", default=None, help="Nombre del jugador en los historiales (por defecto, el de Dealt to)")
+    parser.add_argument("--modelo", default=RUTA_MODELO, help="Modelo exportado (.npz)")
+    parser.add_argument("--continuaciones", type=int, default=CONTINUACIONES, help="Continuaciones del tablero por punto (modelo)")
+    parser.add_argument("--simulaciones", type=int, default=SIMULACIONES, help="Repartos por punto (evaluador)")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--tam-lote", type=int, default=TAM_LOTE, help="Manos por lote")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de las continuaciones y los repartos")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        manos, puntos, omitidas = anotar_ficheros(args.rutas, args.salida, args.metodo, args.jugador, args.modelo,
+                                                  args.continuaciones, args.simulaciones, args.procesos, args.tam_lote,
+                                                  args.semilla)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    segundos = time.perf_counter() - inicio
+    print(f"Anotaciones guardadas en: {os.path.abspath(args.salida)} ({manos:,} manos y {puntos:,} puntos de decisión "
+          f"en {segundos:.1f} s, {manos / segundos * 3600:,.0f} manos/hora; {omitidas:,} omitidas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# EVALUADOR DE MANOS POR LOTES (NumPy)
+#
+# Versión vectorizada de engine.evaluator para evaluar millones de manos en una sola llamada.
+# Recibe una matriz (N, 7) de códigos valor * 10 + palo (la misma codificación del modelo) y
+# aplica las mismas operaciones de bits y tablas por máscara sobre columnas enteras, sin
+# bucles por fila. La fuerza devuelta coincide exactamente con la de evaluar_mano.
+
+import numpy as np
+
+from engine.evaluator import TOP5, ESCALERA, NUM_BITS, PATRONES
+from engine.profiling import contar, medir
+
+_TOP5 = np.array(TOP5, dtype=np.int32)
+_ESCALERA = np.array(ESCALERA, dtype=np.int32)
+_NUM_BITS = np.array(NUM_BITS, dtype=np.int8)
+
+# Bit de cada valor en la máscara (el índice 0 no corresponde a ningún valor)
+_BIT = np.array([0, 0] + [1 << (valor - 2) for valor in range(2, 15)], dtype=np.int32)
+
+# Cartas de cada valor que forman la mano, por categoría y campo de desempate
+_PATRONES = np.zeros((11, 5), dtype=np.int8)
+for _cat, _patron in PATRONES.items():
+    _PATRONES[_cat, :len(_patron)] = _patron
+
+
+def _mascaras(valores, palos):
+    # Máscara de valores presentes en cada palo
+    bits = _BIT[valores]
+    return [np.bitwise_or.reduce(np.where(palos == palo, bits, 0), axis=1) for palo in range(1, 5)]
+
+
+@medir("evaluador.lote")
+def evaluar_fuerzas(cartas):
+    """Fuerza de la mejor mano de cada fila de una matriz (N, 5..7) de códigos de carta."""
+    cartas = np.asarray(cartas, dtype=np.uint8)
+    contar("evaluador.manos", len(cartas))
+    valores = (cartas // 10).astype(np.intp)
+    palos = cartas % 10
+    m1, m2, m3, m4 = _mascaras(valores, palos)
+
+    # Valores presentes en al menos 1, 2, 3 y 4 palos
+    rangos = m1 | m2 | m3 | m4
+    parejas = (m1 & m2) | (m3 & m4) | ((m1 | m2) & (m3 | m4))
+    trios = (m1 & m2 & (m3 | m4)) | (m3 & m4 & (m1 | m2))
+    poker = m1 & m2 & m3 & m4
+
+    # Color: máscara del palo con 5 cartas o más (como mucho hay uno)
+    color = np.zeros_like(m1)
+    for mascara in (m1, m2, m3, m4):
+        color = np.where(_NUM_BITS[mascara] >= 5, mascara, color)
+    top_color = _ESCALERA[color]
+
+    valor_poker = _TOP5[poker] >> 16
+    trio = _TOP5[trios] >> 16
+    resto_full = parejas & ~_BIT[trio]
+    top = _ESCALERA[rangos]
+    alta = _TOP5[parejas] >> 16
+    baja = (_TOP5[parejas] >> 12) & 15
+
+    # Fuerza de cada categoría candidata, elegida en orden de prioridad
+    condiciones = [
+        (color != 0) & (top_color != 0),
+        color != 0,
+        poker != 0,
+        (trios != 0) & (resto_full != 0),
+        top != 0,
+        trios != 0,
+        _NUM_BITS[parejas] >= 2,
+        parejas != 0,
+    ]
+    fuerzas = [
+        np.where(top_color == 14, 10, 9) << 20 | top_color << 16,
+        6 << 20 | _TOP5[color],
+        8 << 20 | valor_poker << 16 | (_TOP5[rangos & ~_BIT[valor_poker]] >> 16) << 12,
+        7 << 20 | trio << 16 | (_TOP5[resto_full] >> 16) << 12,
+        5 << 20 | top << 16,
+        4 << 20 | trio << 16 | (_TOP5[rangos & ~_BIT[trio]] >> 12) << 8,
+        3 << 20 | alta << 16 | baja << 12 | (_TOP5[rangos & ~(_BIT[alta] | _BIT[baja])] >> 16) << 8,
+        2 << 20 | alta << 16 | (_TOP5[rangos & ~_BIT[alta]] >> 8) << 4,
+    ]
+    return np.select(condiciones, fuerzas, 1 << 20 | _TOP5[rangos]).astype(np.int32)
+
+
+def indices_mejores_manos(cartas, fuerzas=None):
+    """Posiciones (N, 5) de las cartas que forman la mejor mano de cada fila, en orden de entrada."""
+    cartas = np.asarray(cartas, dtype=np.uint8)
+    if fuerzas is None:
+        fuerzas = evaluar_fuerzas(cartas)
+    n, num_cartas = cartas.shape
+    filas = np.arange(n)
+    valores = (cartas // 10).astype(np.intp)
+    palos = cartas % 10
+    categorias = fuerzas >> 20
+
+    # Cartas que necesitamos de cada valor según los campos de desempate
+    necesarias = np.zeros((n, 16), dtype=np.int8)
+    for campo in range(5):
+        valor = (fuerzas >> (16 - 4 * campo)) & 15
+        necesarias[filas, valor] += _PATRONES[categorias, campo]
+    necesarias[:, 0] = 0
+
+    # Escaleras: una carta de cada uno de los 5 valores (la rueda usa el As como 1)
+    es_escalera = np.isin(categorias, (5, 9, 10))
+    top = (fuerzas >> 16) & 15
+    for paso in range(5):
+        valor = top - paso
+        valor = np.where(valor == 1, 14, valor)
+        necesarias[filas[es_escalera], valor[es_escalera]] = 1
+
+    # En los colores solo valen las cartas del palo con 5 o más cartas
+    conteo_palos = np.stack([(palos == palo).sum(axis=1) for palo in range(1, 5)], axis=1)
+    palo_color = np.where(np.isin(categorias, (6, 9, 10)), conteo_palos.argmax(axis=1) + 1, 0)
+
+    # Recorremos las columnas (no las filas) quedándonos con las primeras cartas que sirven
+    seleccion = np.zeros((n, num_cartas), dtype=bool)
+    for columna in range(num_cartas):
+        valor = valores[:, columna]
+        sirve = (necesarias[filas, valor] > 0) & ((palo_color == 0) | (palos[:, columna] == palo_color))
+        seleccion[:, columna] = sirve
+        necesarias[filas, valor] -= sirve
+
+    return np.nonzero(seleccion)[1].reshape(n, 5).astype(np.uint8)
+
+
+def evaluar_lote(cartas):
+    """Categoría (1..10), fuerza comparable e índices de la mejor mano de cada fila."""
+    cartas = np.asarray(cartas, dtype=np.uint8)
+    fuerzas = evaluar_fuerzas(cartas)
+    return (fuerzas >> 20).astype(np.uint8), fuerzas, indices_mejores_manos(cartas, fuerzas)
+
+
+def cartas_mejores_manos(cartas, indices):
+    """Códigos (N, 5) de las cartas finales a partir de los índices de evaluar_lote."""
+    return np.take_along_axis(np.asarray(cartas, dtype=np.uint8), indices.astype(np.intp), axis=1)
@@ -0,0 +1,173 @@
+# PREDICCIÓN POR LOTES SIN INTERFAZ GRÁFICA
+#
+# Calcula las probabilidades de derrota, empate y victoria del modelo para todas las situaciones
+# (cartas del jugador, número de rivales y las 5 cartas comunitarias) de un fichero, con las
+# mismas features que HandScreen.predict_hand (engine.features) y el modelo exportado a NumPy.
+#
+# La entrada puede ser un dataset .pmd o un CSV con las columnas cartas_jugador, num_rivales y
+# flop, turn y river (el formato del dataset original) o mesa con las 5 cartas. El fichero se
+# lee por bloques que se reparten entre varios procesos, cada uno con su copia del modelo, y los
+# resultados se escriben en orden en un CSV a medida que terminan. Solo hay unos pocos bloques
+# en memoria a la vez, así que la memoria no depende del tamaño del fichero. Cada bloque se
+# comprueba antes de predecirlo: una fila con cartas desconocidas o repetidas o con un número de
+# rivales fuera de 1..8 detiene la ejecución indicando la fila, en lugar de predecirla.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.batch_predictor ../data/simulacion_montecarlo.pmd ../data/predicciones.csv --procesos 8
+#   python -m engine.batch_predictor ../data/situaciones.csv ../data/predicciones.csv
+
+import argparse
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.cards import BARAJA, numero_a_carta
+from engine.dataset import cargar_dataset, parsear_cartas
+from engine.features import features_mano
+from engine.inference import CLASES, RUTA_MODELO, ModeloNumpy, cargar_modelo
+from engine.preflop import MAX_RIVALES
+from engine.profiling import medir, volcar_proceso
+from engine.writer import iterar_lotes
+
+TAM_LOTE = 65536
+
+# Bloques en cola por proceso: los procesos no esperan, pero la memoria sigue acotada
+BLOQUES_POR_PROCESO = 2
+
+
+# LECTURA DE SITUACIONES
+
+def _texto_cartas(cartas):
+    return " ".join(numero_a_carta(c) if c in BARAJA else f"?({c})" for c in cartas)
+
+
+def comprobar_situaciones(cartas_jugador, num_rivales, comunitarias, primera_fila=0):
+    """Lanza ValueError con la primera fila que tenga cartas fuera de la baraja o repetidas, o rivales fuera de 1..MAX_RIVALES."""
+    cartas = np.concatenate([cartas_jugador, comunitarias], axis=1).astype(np.int64)
+    ordenadas = np.sort(cartas, axis=1)
+    num_rivales = np.asarray(num_rivales, dtype=np.int64)
+    problemas = [
+        (~np.isin(cartas, BARAJA).all(axis=1), "cartas desconocidas"),
+        ((ordenadas[:, 1:] == ordenadas[:, :-1]).any(axis=1), "cartas repetidas"),
+        ((num_rivales < 1) | (num_rivales > MAX_RIVALES), f"el número de rivales debe estar entre 1 y {MAX_RIVALES}"),
+    ]
+    for filas, mensaje in problemas:
+        if filas.any():
+            fila = int(np.argmax(filas))
+            raise ValueError(f"fila {primera_fila + fila}: {mensaje} (cartas {_texto_cartas(cartas[fila])}, "
+                             f"{num_rivales[fila]} rivales)")
+
+
+def leer_situaciones(ruta, tam_lote=TAM_LOTE):
+    """Recorre el fichero por bloques comprobados de (cartas_jugador (N, 2), num_rivales (N,), comunitarias (N, 5))."""
+    filas = 0
+    for situacion in _leer_bloques(ruta, tam_lote):
+        comprobar_situaciones(*situacion, primera_fila=filas)
+        filas += len(situacion[0])
+        yield situacion
+
+
+def _leer_bloques(ruta, tam_lote):
+    if ruta.endswith(".pmd"):
+        for lote in iterar_lotes(cargar_dataset(ruta), tam_lote):
+            comunitarias = np.column_stack([lote["flop"], lote["turn"], lote["river"]])
+            yield np.asarray(lote["cartas_jugador"]), np.asarray(lote["num_rivales"]), comunitarias
+        return
+
+    import pandas as pd
+
+    for df in pd.read_csv(ruta, chunksize=tam_lote):
+        if "mesa" in df.columns:
+            comunitarias = parsear_cartas(df["mesa"].tolist(), 5)
+        else:
+            comunitarias = np.column_stack([parsear_cartas(df[columna].tolist(), num_cartas)
+                                            for columna, num_cartas in (("flop", 3), ("turn", 1), ("river", 1))])
+        # Los rivales se leen como enteros con signo para que un valor fuera de rango no se convierta en otro válido
+        yield parsear_cartas(df["cartas_jugador"].tolist(), 2), df["num_rivales"].to_numpy(dtype=np.int64), comunitarias
+
+
+# PREDICCIÓN
+
+_modelo = None
+
+
+def _iniciar_proceso(ruta_modelo):
+    # Cada proceso carga el modelo una sola vez
+    global _modelo
+    _modelo = ModeloNumpy(ruta_modelo)
+
+
+@medir("predictor.bloque")
+def predecir_bloque(situacion, modelo=None):
+    """Probabilidades (N, 3) de derrota, empate y victoria de un bloque de situaciones."""
+    cartas_jugador, num_rivales, comunitarias = situacion
+    return (modelo or _modelo).predecir(features_mano(cartas_jugador, num_rivales, comunitarias))
+
+
+def _predecir_bloque(situacion):
+    probabilidades = predecir_bloque(situacion)
+    volcar_proceso()
+    return probabilidades
+
+
+def predecir_fichero(entrada, salida, ruta_modelo=RUTA_MODELO, procesos=None, tam_lote=TAM_LOTE):
+    """Escribe en salida (CSV) las probabilidades de todas las situaciones de entrada y devuelve cuántas hay."""
+    # Exportamos el modelo antes de lanzar los procesos si falta o está desactualizado
+    if ruta_modelo == RUTA_MODELO:
+        cargar_modelo()
+    procesos = procesos or os.cpu_count()
+
+    filas = 0
+    inicio = time.perf_counter()
+    with open(salida, "w", encoding="utf-8", newline="") as fichero:
+        fichero.write("fila," + ",".join(clase.lower() for clase in CLASES) + ",clase\n")
+
+        def escribir(probabilidades):
+            nonlocal filas
+            indices = np.arange(filas, filas + len(probabilidades))
+            clases = np.array(CLASES)[probabilidades.argmax(axis=1)]
+            lineas = [f"{i},{p[0]:.6f},{p[1]:.6f},{p[2]:.6f},{c}" for i, p, c in zip(indices, probabilidades.tolist(), clases)]
+            fichero.write("\n".join(lineas) + "\n")
+            filas += len(probabilidades)
+            print(f"{filas:,} filas ({filas / (time.perf_counter() - inicio):,.0f} filas/s)")
+
+        if procesos == 1:
+            _iniciar_proceso(ruta_modelo)
+            for situacion in leer_situaciones(entrada, tam_lote):
+                escribir(predecir_bloque(situacion))
+            return filas
+
+        # Como mucho BLOQUES_POR_PROCESO bloques por proceso pendientes, escritos en el orden de lectura
+        with Pool(procesos, initializer=_iniciar_proceso, initargs=(ruta_modelo,)) as pool:
+            pendientes = deque()
+            for situacion in leer_situaciones(entrada, tam_lote):
+                pendientes.append(pool.apply_async(_predecir_bloque, (situacion,)))
+                if len(pendientes) >= procesos * BLOQUES_POR_PROCESO:
+                    escribir(pendientes.popleft().get())
+            while pendientes:
+                escribir(pendientes.popleft().get())
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predice con el modelo las probabilidades de todas las situaciones de un fichero.")
+    parser.add_argument("entrada", help="Dataset .pmd o CSV con cartas_jugador, num_rivales y flop, turn y river (o mesa)")
+    parser.add_argument("salida", help="CSV de salida con las probabilidades de cada fila")
+    parser.add_argument("--modelo", default=RUTA_MODELO, help="Modelo exportado (.npz)")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--tam-lote", type=int, default=TAM_LOTE, help="Situaciones que se predicen de cada vez")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        filas = predecir_fichero(args.entrada, args.salida, args.modelo, args.procesos, args.tam_lote)
+    except (KeyError, ValueError) as error:
+        parser.error(f"Entrada no válida: {error}")
+    print(f"Predicciones guardadas en: {os.path.abspath(args.salida)} ({filas:,} filas en {time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# BENCHMARKS DEL MOTOR Y DE LA APP
+#
+# Mide, con semillas y conjuntos de manos fijos, el rendimiento de las partes que más tiempo
+# consumen: el evaluador de manos (mano a mano y por lotes), la simulación del generador, la
+# construcción de features, la inferencia del modelo (latencia de una predicción y de un lote)
+# y el arranque de la App (importar la pantalla de título y crear cada pantalla).
+#
+# Cada medida se repite varias veces y se guarda la mediana. Los resultados se guardan en JSON
+# y se pueden comparar con los de una ejecución anterior (la línea base): se marca como
+# regresión toda medida que empeore más que la tolerancia, y en ese caso el comando termina con
+# código 1 para poder usarlo en integración continua.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.benchmark --salida ../benchmarks/base.json
+#   python -m engine.benchmark --base ../benchmarks/base.json --tolerancia 0.1
+#   python -m engine.benchmark --grupos evaluador features --rapido
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas, evaluar_lote
+from engine.cards import BARAJA
+from engine.evaluator import evaluar_mano, obtener_mejor_mano
+from engine.features import features_mano, matriz_features
+from engine.generator import simular_manos
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RUTA_CSV = os.path.join(APP_DIR, '..', 'data', 'ej_simulacion_montecarlo.csv')
+
+SEMILLA = 42
+GRUPOS = ["evaluador", "generador", "features", "inferencia", "arranque"]
+
+# Tamaños de los conjuntos de manos (normal, rápido)
+TAMANOS = {
+    "manos": (20000, 2000),
+    "lote": (500000, 50000),
+    "simulaciones": (200000, 20000),
+    "predicciones": (2000, 200),
+    "arranques": (5, 2),
+}
+
+# Percentiles de latencia que se guardan
+PERCENTILES = (50, 90, 99)
+
+
+# FUNCIONES PARA MEDIR
+
+def _repetir(funcion, repeticiones):
+    # Mediana del tiempo de varias ejecuciones (la primera, de calentamiento, no cuenta)
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return float(np.median(tiempos))
+
+
+def rendimiento(funcion, elementos, unidad, repeticiones=5):
+    """Elementos procesados por segundo (mediana de las repeticiones)."""
+    return {"valor": elementos / _repetir(funcion, repeticiones), "unidad": unidad, "mayor_es_mejor": True}
+
+
+def latencias(funcion, repeticiones, unidad="ms"):
+    """Percentiles de la latencia de cada llamada, en milisegundos."""
+    funcion()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos = np.array(tiempos) * 1000
+    return {f"p{p}": {"valor": float(np.percentile(tiempos, p)), "unidad": unidad, "mayor_es_mejor": False}
+            for p in PERCENTILES}
+
+
+def manos_fijas(num_manos, num_cartas=7, semilla=SEMILLA):
+    """Manos aleatorias sin cartas repetidas (num_manos, num_cartas), siempre las mismas para una semilla."""
+    rng = np.random.default_rng(semilla)
+    mazos = rng.permuted(np.tile(np.arange(52, dtype=np.uint8), (num_manos, 1)), axis=1)
+    return np.array(BARAJA, dtype=np.uint8)[mazos[:, :num_cartas]]
+
+
+# BENCHMARKS
+
+def benchmark_evaluador(tamanos):
+    manos = manos_fijas(tamanos["manos"])
+    lista = manos.tolist()
+    lote = manos_fijas(tamanos["lote"])
+    rivales = manos_fijas(tamanos["manos"], semilla=SEMILLA + 1).tolist()
+
+    def comparar():
+        # Igual que comparar_manos del notebook: gana la mano con mayor fuerza
+        for mano_1, mano_2 in zip(lista, rivales):
+            evaluar_mano(mano_1) > evaluar_mano(mano_2)
+
+    return {
+        "evaluar_mano": rendimiento(lambda: [evaluar_mano(mano) for mano in lista], len(lista), "manos/s"),
+        "obtener_mejor_mano": rendimiento(lambda: [obtener_mejor_mano(mano) for mano in lista], len(lista), "manos/s"),
+        "comparar_manos": rendimiento(comparar, len(lista), "comparaciones/s"),
+        "evaluar_fuerzas_lote": rendimiento(lambda: evaluar_fuerzas(lote), len(lote), "manos/s"),
+        "evaluar_lote_con_cartas": rendimiento(lambda: evaluar_lote(lote), len(lote), "manos/s"),
+    }
+
+
+def benchmark_generador(tamanos):
+    num_manos = tamanos["simulaciones"]
+    return {
+        "simular_manos": rendimiento(lambda: simular_manos(np.random.default_rng(SEMILLA), num_manos), num_manos,
+                                     "simulaciones/s", repeticiones=3),
+    }
+
+
+def benchmark_features(tamanos):
+    columnas = simular_manos(np.random.default_rng(SEMILLA), tamanos["simulaciones"])
+    resultados = {
+        "matriz_features": rendimiento(lambda: matriz_features(columnas), tamanos["simulaciones"], "filas/s"),
+        "features_mano_lote": rendimiento(
+            lambda: features_mano(columnas["cartas_jugador"], columnas["num_rivales"],
+                                  np.column_stack([columnas["flop"], columnas["turn"], columnas["river"]])),
+            tamanos["simulaciones"], "filas/s", repeticiones=3),
+    }
+
+    # Preprocesado del CSV de ejemplo (literal_eval de las listas de cartas incluido)
+    if os.path.exists(RUTA_CSV):
+        import pandas as pd
+        from engine.dataset import columnas_desde_csv
+
+        df = pd.read_csv(RUTA_CSV)
+        resultados["preprocesado_csv"] = rendimiento(lambda: matriz_features(columnas_desde_csv(df)), len(df),
+                                                     "filas/s", repeticiones=3)
+    return resultados
+
+
+def benchmark_inferencia(tamanos, ruta_modelo=None):
+    from engine.inference import cargar_modelo, ModeloNumpy
+
+    try:
+        modelo = ModeloNumpy(ruta_modelo) if ruta_modelo else cargar_modelo()
+    except (OSError, ImportError, ValueError) as error:
+        print(f"Inferencia omitida, no se pudo cargar el modelo: {error}")
+        return {}
+
+    # Una predicción como la de HandScreen.predict_hand: features de una mano y modelo
+    manos = manos_fijas(tamanos["predicciones"]).tolist()
+    siguiente = iter(manos * 2)
+
+    def prediccion():
+        mano = next(siguiente)
+        modelo.predecir(features_mano(mano[:2], 3, mano[2:]))
+
+    resultados = {f"prediccion_{nombre}": valor for nombre, valor in latencias(prediccion, tamanos["predicciones"] - 1).items()}
+
+    # Lotes de 1024 filas, del orden de los de la predicción de la siguiente carta
+    X = features_mano(manos_fijas(1024)[:, :2], 3, manos_fijas(1024)[:, 2:])
+    resultados.update({f"lote_1024_{nombre}": valor for nombre, valor in latencias(lambda: modelo.predecir(X), 50).items()})
+    resultados["lote_1024_filas"] = rendimiento(lambda: modelo.predecir(X), len(X), "filas/s")
+    return resultados
+
+
+# Se ejecuta en un proceso nuevo para medir el arranque en frío
+_CODIGO_ARRANQUE = """
+import json, os, sys, time
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+inicio = time.perf_counter()
+import pygame
+from screens.title_screen import TitleScreen
+importar = time.perf_counter() - inicio
+pygame.init()
+pygame.display.set_mode((800, 600))
+tiempos = {'importar': importar}
+for nombre, crear in (
+        ('titulo', lambda: TitleScreen()),
+        ('preflop', lambda: __import__('screens.preflop_screen', fromlist=['PreflopScreen']).PreflopScreen()),
+        ('mano', lambda: __import__('screens.hand_screen', fromlist=['HandScreen']).HandScreen('141', '131', 3))):
+    for vez in ('primera', 'siguiente'):
+        inicio = time.perf_counter()
+        crear()
+        tiempos[nombre + '_' + vez] = time.perf_counter() - inicio
+print(json.dumps(tiempos))
+"""
+
+
+def benchmark_arranque(tamanos):
+    mediciones = []
+    for _ in range(tamanos["arranques"]):
+        salida = subprocess.run([sys.executable, "-c", _CODIGO_ARRANQUE], cwd=APP_DIR, capture_output=True, text=True)
+        if salida.returncode != 0:
+            print(f"Arranque omitido: {salida.stderr.strip().splitlines()[-1]}")
+            return {}
+        mediciones.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+    return {f"{nombre}_ms": {"valor": 1000 * float(np.median([m[nombre] for m in mediciones])), "unidad": "ms", "mayor_es_mejor": False}
+            for nombre in mediciones[0]}
+
+
+def ejecutar(grupos=GRUPOS, rapido=False, ruta_modelo=None):
+    """Ejecuta los grupos de benchmarks y devuelve los resultados con la información del entorno."""
+    tamanos = {nombre: valores[1 if rapido else 0] for nombre, valores in TAMANOS.items()}
+    funciones = {
+        "evaluador": benchmark_evaluador,
+        "generador": benchmark_generador,
+        "features": benchmark_features,
+        "inferencia": lambda t: benchmark_inferencia(t, ruta_modelo),
+        "arranque": benchmark_arranque,
+    }
+
+    resultados = {}
+    for grupo in grupos:
+        inicio = time.perf_counter()
+        for nombre, medida in funciones[grupo](tamanos).items():
+            resultados[f"{grupo}.{nombre}"] = medida
+        print(f"{grupo}: {time.perf_counter() - inicio:.1f} s")
+
+    return {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "entorno": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "procesador": platform.processor() or platform.machine(),
+            "nucleos": os.cpu_count(),
+        },
+        "semilla": SEMILLA,
+        "rapido": rapido,
+        "tamanos": tamanos,
+        "resultados": resultados,
+    }
+
+
+# COMPARACIÓN CON LA LÍNEA BASE
+
+def comparar(actual, base, tolerancia=0.1):
+    """Filas (nombre, base, actual, cambio relativo, regresión) de las medidas comunes a las dos ejecuciones.
+
+    El cambio es positivo si la medida ha mejorado (más rápida) y negativo si ha empeorado.
+    """
+    filas = []
+    for nombre, medida in actual["resultados"].items():
+        if nombre not in base["resultados"]:
+            continue
+        valor_base, valor = base["resultados"][nombre]["valor"], medida["valor"]
+        cambio = valor / valor_base - 1 if medida["mayor_es_mejor"] else valor_base / valor - 1
+        filas.append((nombre, valor_base, valor, cambio, cambio < -tolerancia))
+    return filas
+
+
+def _formato(valor):
+    return f"{valor:,.0f}" if valor >= 1000 else f"{valor:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del evaluador, el generador, las features, la inferencia y el arranque de la App.")
+    parser.add_argument("--grupos", nargs="+", choices=GRUPOS, default=GRUPOS, help="Grupos de benchmarks que se ejecutan")
+    parser.add_argument("--rapido", action="store_true", help="Conjuntos de manos más pequeños (medidas menos estables)")
+    parser.add_argument("--modelo", help="Modelo .npz para la inferencia (por defecto, el de la App)")
+    parser.add_argument("--salida", help="Fichero JSON donde se guardan los resultados")
+    parser.add_argument("--base", help="Resultados JSON de una ejecución anterior con los que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.1, help="Empeoramiento relativo a partir del cual hay regresión")
+    args = parser.parse_args()
+
+    actual = ejecutar(args.grupos, args.rapido, args.modelo)
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w", encoding="utf-8") as fichero:
+            json.dump(actual, fichero, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en: {os.path.abspath(args.salida)}")
+
+    if not args.base:
+        for nombre, medida in actual["resultados"].items():
+            print(f"{nombre:<40} {_formato(medida['valor']):>16} {medida['unidad']}")
+        return
+
+    with open(args.base, encoding="utf-8") as fichero:
+        base = json.load(fichero)
+    if base.get("tamanos") != actual["tamanos"] or base.get("entorno") != actual["entorno"]:
+        print("Aviso: la línea base se midió con otros tamaños o en otro entorno, la comparación es orientativa")
+    filas = comparar(actual, base, args.tolerancia)
+    for nombre, valor_base, valor, cambio, regresion in filas:
+        unidad = actual["resultados"][nombre]["unidad"]
+        print(f"{nombre:<40} {_formato(valor_base):>16} -> {_formato(valor):>16} {unidad:<16} {cambio:+7.1%}"
+              f"{'  REGRESIÓN' if regresion else ''}")
+
+    regresiones = [fila[0] for fila in filas if fila[4]]
+    if regresiones:
+        print(f"{len(regresiones)} medidas empeoran más de un {args.tolerancia:.0%}: {', '.join(regresiones)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# CACHÉ DE RESULTADOS POR SITUACIÓN CANÓNICA
+#
+# Dos situaciones que solo se diferencian en una permutación de los palos (A♠ K♠ con Q♠ J♠ 2♦
+# y A♥ K♥ con Q♥ J♥ 2♣) tienen exactamente la misma equity, así que basta con calcularla una
+# vez. clave_canonica resume cada palo en una firma con los valores que tiene en cada grupo de
+# cartas (jugador, flop, turn, river) y ordena las cuatro firmas: el resultado no depende de
+# qué palo concreto sea cada uno ni del orden de las cartas dentro de cada grupo.
+#
+# cartas_canonicas aplica la misma idea a las cartas de muchas manos a la vez: devuelve, para
+# cada una, el representante de su clase (los palos renombrados según su firma y las cartas del
+# jugador y del flop ordenadas), que es lo que ve el modelo y con lo que se compacta el dataset.
+#
+# CacheResultados guarda los resultados por clave en un LRU de tamaño acotado en memoria y,
+# opcionalmente, en una base de datos SQLite que se conserva entre ejecuciones.
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Grupo de cada una de las 7 cartas de una mano completa: jugador, jugador, flop x 3, turn, river
+_GRUPOS_MANO = np.array([0, 0, 1, 1, 1, 2, 3], dtype=np.int64)
+
+
+# CLAVE CANÓNICA
+
+def _grupos(cartas_jugador, comunitarias, por_calles):
+    comunitarias = list(comunitarias)
+    if por_calles:
+        return [cartas_jugador, comunitarias[:3], comunitarias[3:4], comunitarias[4:5]]
+    return [cartas_jugador, comunitarias]
+
+
+def clave_canonica(cartas_jugador, comunitarias, num_rivales, por_calles=False):
+    """Clave de la situación independiente de los palos concretos y del orden de las cartas.
+
+    Con por_calles=True el flop, el turn y el river se distinguen (como en la entrada del
+    modelo); si no, el tablero se trata como un único conjunto de cartas (como en la equity).
+    """
+    firmas = [0, 0, 0, 0]
+    for grupo, cartas in enumerate(_grupos(cartas_jugador, comunitarias, por_calles)):
+        for carta in cartas:
+            carta = int(carta)
+            firmas[carta % 10 - 1] |= 1 << (13 * grupo + carta // 10 - 2)
+    firmas.sort(reverse=True)
+    return (int(num_rivales), len(comunitarias), por_calles, *firmas)
+
+
+def cartas_canonicas(cartas_jugador, comunitarias):
+    """Representante canónico (por calles) de cada mano: cartas del jugador (N, 2) y comunitarias (N, 5).
+
+    El palo con la mayor firma pasa a ser el 1 (Picas), el siguiente el 2... y las cartas del
+    jugador y del flop se ordenan de mayor a menor código. Dos manos tienen el mismo representante
+    si y solo si tienen la misma clave_canonica(..., por_calles=True).
+    """
+    cartas = np.concatenate([np.asarray(cartas_jugador, dtype=np.int64).reshape(-1, 2),
+                             np.asarray(comunitarias, dtype=np.int64).reshape(-1, 5)], axis=1)
+    filas = np.arange(len(cartas))
+    valores, palos = cartas // 10, cartas % 10 - 1
+    firmas = np.zeros((len(cartas), 4), dtype=np.int64)
+    for columna in range(7):
+        firmas[filas, palos[:, columna]] |= 1 << (13 * _GRUPOS_MANO[columna] + valores[:, columna] - 2)
+
+    # Los palos con la misma firma son intercambiables, así que el orden entre ellos no importa
+    orden = np.argsort(-firmas, axis=1, kind="stable")
+    nuevos = np.empty_like(orden)
+    nuevos[filas[:, None], orden] = np.arange(1, 5)
+    cartas = (valores * 10 + np.take_along_axis(nuevos, palos, axis=1)).astype(np.uint8)
+
+    jugador = -np.sort(-cartas[:, :2].astype(np.int16), axis=1)
+    flop = -np.sort(-cartas[:, 2:5].astype(np.int16), axis=1)
+    return (jugador.astype(np.uint8),
+            np.concatenate([flop.astype(np.uint8), cartas[:, 5:]], axis=1))
+
+
+# CACHÉ LRU CON PERSISTENCIA OPCIONAL
+
+class CacheResultados:
+    """Caché LRU de resultados (diccionarios serializables en JSON) con copia opcional en disco."""
+
+    def __init__(self, capacidad=4096, ruta=None):
+        self.capacidad = capacidad
+        self.memoria = OrderedDict()
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.bloqueo = threading.Lock()
+
+        self.conexion = None
+        if ruta:
+            self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+            self.conexion.execute("CREATE TABLE IF NOT EXISTS resultados (clave TEXT PRIMARY KEY, valor TEXT)")
+            self.conexion.commit()
+
+    def obtener(self, clave):
+        """Resultado guardado para la clave, o None si no está."""
+        with self.bloqueo:
+            if clave in self.memoria:
+                self.memoria.move_to_end(clave)
+                self.aciertos += 1
+                return self.memoria[clave]
+
+            if self.conexion is not None:
+                fila = self.conexion.execute("SELECT valor FROM resultados WHERE clave = ?", (repr(clave),)).fetchone()
+                if fila:
+                    self.aciertos_disco += 1
+                    valor = json.loads(fila[0])
+                    self._guardar_memoria(clave, valor)
+                    return valor
+
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        """Guarda el resultado en memoria y, si hay base de datos, también en disco."""
+        # Los valores de NumPy (float32, float64...) se guardan como tipos de Python
+        valor = {k: v.item() if hasattr(v, "item") else v for k, v in valor.items()}
+        with self.bloqueo:
+            self._guardar_memoria(clave, valor)
+            if self.conexion is not None:
+                self.conexion.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?)", (repr(clave), json.dumps(valor)))
+                self.conexion.commit()
+        return valor
+
+    def _guardar_memoria(self, clave, valor):
+        self.memoria[clave] = valor
+        self.memoria.move_to_end(clave)
+        while len(self.memoria) > self.capacidad:
+            self.memoria.popitem(last=False)
+
+    def estadisticas(self):
+        """Contadores de aciertos (en memoria y en disco), fallos y tamaño de la caché."""
+        consultas = self.aciertos + self.aciertos_disco + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "aciertos_disco": self.aciertos_disco,
+            "fallos": self.fallos,
+            "tasa_aciertos": (self.aciertos + self.aciertos_disco) / consultas if consultas else 0.0,
+            "en_memoria": len(self.memoria),
+        }
+
+    def vaciar(self):
+        """Borra la caché en memoria y en disco."""
+        with self.bloqueo:
+            self.memoria.clear()
+            if self.conexion is not None:
+                self.conexion.execute("DELETE FROM resultados")
+                self.conexion.commit()
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+            self.conexion = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
@@ -0,0 +1,39 @@
+# CODIFICACIÓN DE LAS CARTAS
+#
+# En todo el proyecto una carta se representa como valor * 10 + palo, que es la
+# codificación con la que se entrenó el modelo:
+#   - valor: 2..14 (J = 11, Q = 12, K = 13, A = 14)
+#   - palo: 1 = Picas, 2 = Tréboles, 3 = Diamantes, 4 = Corazones
+# La App usa estos mismos códigos como texto ("141" = A de Picas) y el dataset
+# original guarda las cartas como "10♣", "Q♦"...
+
+VALORES = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+PALOS = {'♠': 1, '♣': 2, '♦': 3, '♥': 4}
+
+VALORES_TEXTO = {v: k for k, v in VALORES.items()}
+PALOS_TEXTO = {v: k for k, v in PALOS.items()}
+
+# Las 52 cartas de la baraja ordenadas por palo y valor
+BARAJA = [valor * 10 + palo for palo in range(1, 5) for valor in range(2, 15)]
+
+
+def carta_a_numero(carta):
+    """Convierte una carta en texto ("10♣") a su código numérico (102)."""
+    return VALORES[carta[:-1]] * 10 + PALOS[carta[-1]]
+
+
+def numero_a_carta(codigo):
+    """Convierte un código numérico (102) a la carta en texto ("10♣")."""
+    codigo = int(codigo)
+    return VALORES_TEXTO[codigo // 10] + PALOS_TEXTO[codigo % 10]
+
+
+def indice_carta(codigo):
+    """Índice compacto 0..51 de una carta (útil para máscaras de bits y tablas)."""
+    codigo = int(codigo)
+    return (codigo % 10 - 1) * 13 + codigo // 10 - 2
+
+
+def codigo_carta(indice):
+    """Operación inversa de indice_carta."""
+    return (indice % 13 + 2) * 10 + indice // 13 + 1
@@ -0,0 +1,199 @@
+# COMPACTACIÓN DEL DATASET POR SITUACIÓN CANÓNICA
+#
+# Dos manos que solo se diferencian en los palos o en el orden de las cartas del jugador o del
+# flop son la misma situación y tienen la misma probabilidad de cada resultado, pero el dataset
+# las guarda como filas distintas. Este módulo pasa cada mano a su representante canónico
+# (engine.cache.cartas_canonicas, el mismo que recibe el modelo en la App), junta las filas
+# iguales en una sola con el número de derrotas, empates y victorias (columna conteos) y escribe
+# el resultado por partes, como el generador. engine.training entrena con estas partes usando
+# las proporciones de conteos como etiquetas blandas y el total como peso de la fila, que da la
+# misma pérdida que todas las manos originales con sus cartas canónicas.
+#
+# Para no depender de la memoria, las manos se reparten primero en particiones (ficheros
+# temporales) según un hash de su clave, y cada partición se agrupa por separado y se escribe
+# como una parte: la memoria depende del tamaño de las particiones y no del número de manos.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.compaction ../data/partes ../data/simulacion_montecarlo.csv --destino ../data/compacto
+#   python -m engine.training ../data/compacto --epocas 50
+
+import argparse
+import math
+import os
+import shutil
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.cache import cartas_canonicas
+from engine.cards import BARAJA, indice_carta, codigo_carta
+from engine.features import columnas_situacion
+from engine.training import abrir_fragmento, listar_fragmentos
+from engine.writer import COLUMNAS, EscritorColumnas, iterar_lotes, TAM_GRUPO
+
+# Columnas de las partes compactadas: las del dataset más los recuentos de cada resultado. La
+# columna resultado guarda el más frecuente, para las herramientas que no usan conteos
+COLUMNAS_COMPACTAS = {**COLUMNAS, "conteos": 3}
+TIPOS_COMPACTOS = {"conteos": "uint32"}
+
+# Manos por partición (cada una se agrupa en memoria de una vez)
+MANOS_POR_PARTICION = 4000000
+
+_INDICES = np.zeros(145, dtype=np.int64)
+_INDICES[BARAJA] = [indice_carta(codigo) for codigo in BARAJA]
+_CODIGOS = np.array([codigo_carta(indice) for indice in range(52)], dtype=np.uint8)
+
+
+# CLAVES
+
+def claves_manos(cartas_jugador, num_rivales, comunitarias):
+    """Clave int64 de la situación canónica de cada mano: rivales y los índices de sus 7 cartas (6 bits cada uno)."""
+    jugador, comunitarias = cartas_canonicas(cartas_jugador, comunitarias)
+    claves = np.asarray(num_rivales, dtype=np.int64).copy()
+    for columna in np.concatenate([jugador, comunitarias], axis=1).T:
+        claves = (claves << 6) | _INDICES[columna]
+    return claves
+
+
+def manos_desde_claves(claves):
+    """Operación inversa de claves_manos: cartas del jugador (N, 2), rivales (N,) y comunitarias (N, 5)."""
+    cartas = np.empty((len(claves), 7), dtype=np.uint8)
+    for columna in range(6, -1, -1):
+        cartas[:, columna] = _CODIGOS[claves & 63]
+        claves = claves >> 6
+    return cartas[:, :2], claves.astype(np.uint8), cartas[:, 2:]
+
+
+def _particion(claves, num_particiones):
+    # Hash multiplicativo para repartir las claves (ordenadas por rivales y cartas) por igual
+    return ((claves.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(33)) % np.uint64(num_particiones)
+
+
+# COMPACTACIÓN
+
+def _bloques_fragmento(fragmento, tam_bloque):
+    if fragmento.endswith(".csv"):
+        import pandas as pd
+
+        from engine.dataset import columnas_desde_csv
+
+        for df in pd.read_csv(fragmento, chunksize=tam_bloque):
+            yield columnas_desde_csv(df)
+    else:
+        yield from iterar_lotes(abrir_fragmento(fragmento), tam_bloque)
+
+
+def _contar_manos(fragmento):
+    if fragmento.endswith(".csv"):
+        with open(fragmento, "rb") as f:
+            return max(sum(1 for _ in f) - 1, 0)
+    return len(abrir_fragmento(fragmento)["resultado"])
+
+
+def repartir(fragmentos, temporal, num_particiones, tam_bloque=TAM_GRUPO):
+    """Escribe la clave y el resultado de cada mano en el fichero de su partición y devuelve el número de manos."""
+    ficheros = [(open(os.path.join(temporal, f"{i:05d}.claves"), "wb"), open(os.path.join(temporal, f"{i:05d}.resultados"), "wb"))
+                for i in range(num_particiones)]
+    num_manos = 0
+    try:
+        for fragmento in fragmentos:
+            for bloque in _bloques_fragmento(fragmento, tam_bloque):
+                comunitarias = np.concatenate([bloque["flop"], np.asarray(bloque["turn"])[:, None],
+                                               np.asarray(bloque["river"])[:, None]], axis=1)
+                claves = claves_manos(bloque["cartas_jugador"], bloque["num_rivales"], comunitarias)
+                resultados = np.asarray(bloque["resultado"], dtype=np.uint8)
+                particiones = _particion(claves, num_particiones)
+                orden = np.argsort(particiones, kind="stable")
+                limites = np.searchsorted(particiones[orden], np.arange(num_particiones + 1))
+                for i, (claves_f, resultados_f) in enumerate(ficheros):
+                    seleccion = orden[limites[i]:limites[i + 1]]
+                    claves[seleccion].tofile(claves_f)
+                    resultados[seleccion].tofile(resultados_f)
+                num_manos += len(claves)
+    finally:
+        for claves_f, resultados_f in ficheros:
+            claves_f.close()
+            resultados_f.close()
+    return num_manos
+
+
+def agrupar(claves, resultados):
+    """Claves distintas (ordenadas) y recuentos (M, 3) de derrotas, empates y victorias de cada una."""
+    unicas, inversa = np.unique(claves, return_inverse=True)
+    conteos = np.empty((len(unicas), 3), dtype=np.uint32)
+    for resultado in range(3):
+        conteos[:, resultado] = np.bincount(inversa[resultados == resultado], minlength=len(unicas))
+    return unicas, conteos
+
+
+def _compactar_particion(argumentos):
+    # Agrupa una partición y la escribe como una parte del dataset compactado
+    temporal, destino, indice, tam_grupo = argumentos
+    base = os.path.join(temporal, f"{indice:05d}")
+    unicas, conteos = agrupar(np.fromfile(base + ".claves", dtype=np.int64), np.fromfile(base + ".resultados", dtype=np.uint8))
+
+    ruta = os.path.join(destino, f"parte_{indice:05d}")
+    ruta_temporal = ruta + ".tmp"
+    shutil.rmtree(ruta_temporal, ignore_errors=True)
+    metadatos = {"compactado": True, "manos": int(conteos.sum())}
+    with EscritorColumnas(ruta_temporal, tam_grupo, metadatos, COLUMNAS_COMPACTAS, TIPOS_COMPACTOS) as escritor:
+        for inicio in range(0, len(unicas), tam_grupo):
+            cartas_jugador, num_rivales, comunitarias = manos_desde_claves(unicas[inicio:inicio + tam_grupo])
+            columnas = columnas_situacion(cartas_jugador, num_rivales, comunitarias)[0]
+            columnas["conteos"] = conteos[inicio:inicio + tam_grupo]
+            columnas["resultado"] = columnas["conteos"].argmax(axis=1).astype(np.uint8)
+            escritor.escribir(columnas)
+    shutil.rmtree(ruta, ignore_errors=True)
+    os.replace(ruta_temporal, ruta)
+    os.remove(base + ".claves")
+    os.remove(base + ".resultados")
+    return len(unicas), int((conteos.sum(axis=1) > 1).sum())
+
+
+def compactar(rutas, destino, num_particiones=None, procesos=None, tam_grupo=TAM_GRUPO):
+    """Compacta los fragmentos (partes, .pmd o CSV) en partes de destino y devuelve (manos, filas, filas repetidas)."""
+    fragmentos = listar_fragmentos([ruta for ruta in rutas if not ruta.endswith(".csv")])
+    fragmentos += [ruta for ruta in rutas if ruta.endswith(".csv") and os.path.exists(ruta)]
+    if not fragmentos:
+        raise ValueError(f"No se han encontrado fragmentos del dataset en {rutas}")
+    if num_particiones is None:
+        num_particiones = max(1, math.ceil(sum(_contar_manos(f) for f in fragmentos) / MANOS_POR_PARTICION))
+
+    os.makedirs(destino, exist_ok=True)
+    temporal = os.path.join(destino, "particiones.tmp")
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    num_manos = repartir(fragmentos, temporal, num_particiones)
+
+    tareas = [(temporal, destino, i, tam_grupo) for i in range(num_particiones)]
+    if procesos == 1 or num_particiones == 1:
+        resultados = [_compactar_particion(tarea) for tarea in tareas]
+    else:
+        with Pool(procesos) as pool:
+            resultados = pool.map(_compactar_particion, tareas)
+    shutil.rmtree(temporal, ignore_errors=True)
+    return num_manos, sum(r[0] for r in resultados), sum(r[1] for r in resultados)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Junta las manos iguales salvo los palos o el orden en filas con recuentos de resultados.")
+    parser.add_argument("rutas", nargs="+", help="Carpetas de partes del generador, ficheros .pmd o CSV")
+    parser.add_argument("--destino", required=True, help="Carpeta donde se escriben las partes compactadas")
+    parser.add_argument("--particiones", type=int, default=None,
+                        help=f"Número de partes (por defecto, una por cada {MANOS_POR_PARTICION:,} manos)")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos que agrupan las particiones (por defecto, todos los núcleos)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        num_manos, filas, repetidas = compactar(args.rutas, args.destino, args.particiones, args.procesos)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"{num_manos:,} manos compactadas en {filas:,} filas ({filas / max(num_manos, 1):.1%}), "
+          f"{repetidas:,} con más de una mano, en {time.perf_counter() - inicio:.1f} s")
+    print(f"Dataset compactado en: {os.path.abspath(args.destino)}")
+
+
+if __name__ == "__main__":
+    main()
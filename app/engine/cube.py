@@ -0,0 +1,313 @@
+# CUBO DE RESULTADOS PARA EL ANÁLISIS DE DATOS
+#
+# Todas las gráficas de data_analysis.ipynb son recuentos de victorias, empates y derrotas
+# agrupados por la mano inicial, el número de rivales y la mano del jugador en el flop, el turn
+# y el river. En lugar de cargar el dataset entero en un DataFrame y agruparlo en cada celda,
+# este módulo guarda esos recuentos en un cubo de NumPy:
+#
+#   conteos[mano inicial (169), num_rivales (8), mano_flop (10), mano_turn (10), mano_river (10), resultado (3)]
+#
+# y, para la gráfica de las 1326 combinaciones exactas de dos cartas, una tabla más pequeña:
+#
+#   combinaciones[carta 1 (52), carta 2 (52), num_rivales (8), resultado (3)]
+#
+# El cubo se construye en una sola pasada por bloques sobre las partes del generador, ficheros
+# .pmd o el CSV original, y ocupa lo mismo (unos 32 MB en memoria, mucho menos comprimido en
+# disco) tenga el dataset 2 o 200 millones de manos. Los recuentos se suman, así que al generar
+# partes nuevas basta con añadirlas: el cubo recuerda qué fragmentos contiene y solo procesa los
+# que faltan. Cada gráfica del notebook se responde sumando ejes del cubo en milisegundos.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.cube ../data/partes ../data/simulacion_montecarlo.pmd --cubo ../data/cubo_resultados.npz
+#   python -m engine.cube --cubo ../data/cubo_resultados.npz
+
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.cards import codigo_carta, numero_a_carta
+from engine.evaluator import NOMBRES_MANO
+from engine.preflop import NUM_MANOS_INICIALES, MAX_RIVALES, indices_manos_iniciales
+from engine.training import abrir_fragmento, listar_fragmentos
+from engine.writer import NOMBRES_PREFLOP, RESULTADOS, iterar_lotes
+
+RUTA_CUBO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'cubo_resultados.npz')
+
+EJES = ("mano", "num_rivales", "mano_flop", "mano_turn", "mano_river", "resultado")
+FORMA = (NUM_MANOS_INICIALES, MAX_RIVALES, len(NOMBRES_MANO), len(NOMBRES_MANO), len(NOMBRES_MANO), len(RESULTADOS))
+FORMA_COMBINACIONES = (52, 52, MAX_RIVALES, len(RESULTADOS))
+
+# Manos que se cuentan de cada vez (cada bloque hace un bincount sobre todo el cubo)
+TAM_BLOQUE = 1 << 20
+
+# Categorías (códigos de NOMBRES_MANO) que buscan las celdas del notebook
+TRIO = 4
+ESCALERA = (5, 9, 10)
+COLOR = (6, 9)
+ESCALERA_COLOR = (9,)
+
+
+# CONSTRUCCIÓN
+
+def _indices_cartas(codigos):
+    # Igual que engine.cards.indice_carta, para arrays
+    codigos = codigos.astype(np.int64)
+    return (codigos % 10 - 1) * 13 + codigos // 10 - 2
+
+
+def contar_columnas(columnas):
+    """Recuentos (cubo y combinaciones) de un bloque de columnas del dataset."""
+    cartas = np.asarray(columnas["cartas_jugador"])
+    rivales = np.asarray(columnas["num_rivales"]).astype(np.int64) - 1
+    resultado = np.asarray(columnas["resultado"]).astype(np.int64)
+
+    claves = indices_manos_iniciales(cartas)
+    for eje in ("num_rivales", "mano_flop", "mano_turn", "mano_river"):
+        valores = rivales if eje == "num_rivales" else np.asarray(columnas[eje]).astype(np.int64) - 1
+        claves = claves * FORMA[EJES.index(eje)] + valores
+    claves = claves * FORMA[-1] + resultado
+    conteos = np.bincount(claves, minlength=np.prod(FORMA)).reshape(FORMA)
+
+    # Las dos cartas ordenadas, así [A♠, A♦] y [A♦, A♠] son la misma combinación
+    indices = np.sort(_indices_cartas(cartas), axis=1)
+    claves = ((indices[:, 0] * 52 + indices[:, 1]) * MAX_RIVALES + rivales) * FORMA[-1] + resultado
+    combinaciones = np.bincount(claves, minlength=np.prod(FORMA_COMBINACIONES)).reshape(FORMA_COMBINACIONES)
+    return conteos, combinaciones
+
+
+def _bloques_csv(ruta, tam_bloque):
+    import pandas as pd
+
+    from engine.dataset import columnas_desde_csv
+
+    for df in pd.read_csv(ruta, chunksize=tam_bloque):
+        yield columnas_desde_csv(df)
+
+
+def contar_fragmento(fragmento, tam_bloque=TAM_BLOQUE):
+    """Recuentos y número de manos de un fragmento (parte del generador, .pmd o CSV)."""
+    if fragmento.endswith(".csv"):
+        bloques = _bloques_csv(fragmento, tam_bloque)
+    else:
+        bloques = iterar_lotes(abrir_fragmento(fragmento), tam_bloque)
+
+    conteos = np.zeros(FORMA, dtype=np.int64)
+    combinaciones = np.zeros(FORMA_COMBINACIONES, dtype=np.int64)
+    for bloque in bloques:
+        conteos_bloque, combinaciones_bloque = contar_columnas(bloque)
+        conteos += conteos_bloque
+        combinaciones += combinaciones_bloque
+    return fragmento, conteos, combinaciones
+
+
+class CuboResultados:
+    """Recuentos de resultados por mano inicial, rivales y mano en cada calle, ampliable por fragmentos."""
+
+    def __init__(self):
+        self.conteos = np.zeros(FORMA, dtype=np.int64)
+        self.combinaciones = np.zeros(FORMA_COMBINACIONES, dtype=np.int64)
+        # Fragmento (ruta absoluta) -> número de manos que aportó
+        self.fragmentos = {}
+
+    @property
+    def num_manos(self):
+        return int(self.conteos.sum())
+
+    def sumar(self, fragmento, conteos, combinaciones):
+        """Añade los recuentos de un fragmento que todavía no esté en el cubo."""
+        fragmento = os.path.abspath(fragmento)
+        if fragmento in self.fragmentos:
+            raise ValueError(f"El fragmento ya está en el cubo: {fragmento}")
+        self.conteos += conteos
+        self.combinaciones += combinaciones
+        self.fragmentos[fragmento] = int(conteos.sum())
+
+    def fusionar(self, otro):
+        """Suma otro cubo construido con fragmentos distintos."""
+        repetidos = self.fragmentos.keys() & otro.fragmentos.keys()
+        if repetidos:
+            raise ValueError(f"Fragmentos en los dos cubos: {sorted(repetidos)[:3]}")
+        self.conteos += otro.conteos
+        self.combinaciones += otro.combinaciones
+        self.fragmentos.update(otro.fragmentos)
+        return self
+
+    def actualizar(self, rutas, procesos=None, tam_bloque=TAM_BLOQUE):
+        """Cuenta los fragmentos de rutas que faltan en el cubo y devuelve cuántos se han añadido."""
+        fragmentos = listar_fragmentos([ruta for ruta in rutas if not ruta.endswith(".csv")])
+        fragmentos += [ruta for ruta in rutas if ruta.endswith(".csv") and os.path.exists(ruta)]
+        nuevos = [fragmento for fragmento in fragmentos if os.path.abspath(fragmento) not in self.fragmentos]
+
+        procesos = min(procesos or os.cpu_count(), len(nuevos))
+        if procesos <= 1:
+            for fragmento in nuevos:
+                self.sumar(*contar_fragmento(fragmento, tam_bloque))
+        else:
+            with Pool(procesos) as pool:
+                for resultado in pool.starmap(contar_fragmento, [(fragmento, tam_bloque) for fragmento in nuevos]):
+                    self.sumar(*resultado)
+        return len(nuevos)
+
+    def guardar(self, ruta=RUTA_CUBO):
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        np.savez_compressed(ruta, conteos=self.conteos, combinaciones=self.combinaciones,
+                            fragmentos=np.array(json.dumps(self.fragmentos)))
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_CUBO):
+        cubo = cls()
+        with np.load(ruta) as datos:
+            if datos["conteos"].shape != FORMA:
+                raise ValueError(f"El cubo {ruta} tiene otra forma: {datos['conteos'].shape}")
+            cubo.conteos = datos["conteos"]
+            cubo.combinaciones = datos["combinaciones"]
+            cubo.fragmentos = json.loads(str(datos["fragmentos"]))
+        return cubo
+
+    # CONSULTA
+
+    def marginal(self, *ejes):
+        """Recuentos con los ejes indicados (más el resultado), sumando el resto."""
+        otros = tuple(i for i, eje in enumerate(EJES[:-1]) if eje not in ejes)
+        return self.conteos.sum(axis=otros)
+
+
+def cargar_o_construir(rutas, ruta=RUTA_CUBO, procesos=None):
+    """Carga el cubo guardado (si existe), le añade los fragmentos nuevos de rutas y lo guarda."""
+    cubo = CuboResultados.cargar(ruta) if os.path.exists(ruta) else CuboResultados()
+    if cubo.actualizar(rutas, procesos):
+        cubo.guardar(ruta)
+    return cubo
+
+
+# GRÁFICAS DEL NOTEBOOK
+
+def _tipos_manos_iniciales():
+    # 0 = Carta Alta Offsuit, 1 = Carta Alta Suited y 2 = Pareja Offsuit, como mano_preflop
+    fila, columna = np.divmod(np.arange(NUM_MANOS_INICIALES), 13)
+    return np.where(fila == columna, 2, np.where(fila < columna, 1, 0))
+
+
+def _suited_connectors():
+    fila, columna = np.divmod(np.arange(NUM_MANOS_INICIALES), 13)
+    return (fila < columna) & (columna - fila == 1)
+
+
+def tasa_victoria_preflop(cubo):
+    """Tasa de victoria por tipo de mano preflop (gráfica 1.1)."""
+    import pandas as pd
+
+    por_mano = cubo.marginal("mano")
+    tipos = _tipos_manos_iniciales()
+    filas = []
+    for tipo, nombre in sorted(NOMBRES_PREFLOP.items(), key=lambda item: item[1]):
+        conteos = por_mano[tipos == tipo].sum(axis=0)
+        filas.append((nombre, conteos[2] / conteos.sum()))
+    return pd.DataFrame(filas, columns=["Tipo de Mano Preflop", "Tasa de Victoria"])
+
+
+def trio_por_calle(cubo):
+    """Probabilidad (%) de que una pareja preflop conecte un trío en cada calle (gráfica 1.2)."""
+    import pandas as pd
+
+    calles = cubo.marginal("mano", "mano_flop", "mano_turn", "mano_river")[_tipos_manos_iniciales() == 2].sum(axis=(0, -1))
+    flop, turn, river = np.ix_(*[np.arange(1, len(NOMBRES_MANO) + 1)] * 3)
+    trio_flop = flop == TRIO
+    trio_turn = (turn == TRIO) & ~trio_flop
+    trio_river = (river == TRIO) & ~trio_flop & ~trio_turn
+
+    total = calles.sum()
+    tasas = [(calles * mascara).sum() / total * 100
+             for mascara in (trio_flop, trio_turn, trio_river, trio_flop | trio_turn | trio_river)]
+    return pd.DataFrame({"Etapa": ["Flop", "Turn", "River", "Total"], "Probabilidad (%)": tasas})
+
+
+def proyectos_suited_connectors(cubo):
+    """Probabilidad (%) de que un suited connector acabe en escalera, color o escalera de color (gráfica 1.3)."""
+    import pandas as pd
+
+    river = cubo.marginal("mano", "mano_river")[_suited_connectors()].sum(axis=(0, -1))
+    total = river.sum()
+    categorias = [ESCALERA, COLOR, ESCALERA_COLOR, tuple(set(ESCALERA) | set(COLOR))]
+    tasas = [river[[categoria - 1 for categoria in grupo]].sum() / total * 100 for grupo in categorias]
+    return pd.DataFrame({"Categoría": ["Escalera", "Color", "Escalera de Color", "Cualquier Proyecto"],
+                         "Probabilidad (%)": tasas})
+
+
+def tasa_victoria_combinaciones(cubo):
+    """Tasa de victoria (%) de cada combinación exacta de dos cartas, como las normaliza el notebook (gráfica 1.4)."""
+    import pandas as pd
+
+    conteos = cubo.combinaciones.sum(axis=2)
+    totales = conteos.sum(axis=-1)
+    primera, segunda = np.nonzero(totales)
+    cartas = [str(sorted([numero_a_carta(codigo_carta(a)), numero_a_carta(codigo_carta(b))]))
+              for a, b in zip(primera.tolist(), segunda.tolist())]
+    tasas = conteos[primera, segunda, 2] / totales[primera, segunda] * 100
+    return pd.DataFrame({"Cartas": cartas, "Win Rate": tasas}).sort_values("Cartas", ignore_index=True)
+
+
+def tasa_victoria_esperada(cubo):
+    """Media de 100 / (num_rivales + 1) sobre todas las manos (recta de referencia de la gráfica 1.4)."""
+    por_rivales = cubo.marginal("num_rivales").sum(axis=-1)
+    return float((por_rivales * 100 / np.arange(2, MAX_RIVALES + 2)).sum() / por_rivales.sum())
+
+
+def distribucion_mano_river(cubo):
+    """Proporción (%) de cada tipo de mano final, de más a menos frecuente (gráfica 2.1)."""
+    import pandas as pd
+
+    river = cubo.marginal("mano_river").sum(axis=-1)
+    orden = [i for i in np.argsort(-river, kind="stable") if river[i]]
+    return pd.DataFrame({"Tipo de Mano": [NOMBRES_MANO[i + 1] for i in orden],
+                         "Proporción (%)": river[orden] / river.sum() * 100})
+
+
+def tasa_victoria_mano_river(cubo):
+    """Tasa de victoria (%) por tipo de mano final, de mayor a menor (gráfica 2.2)."""
+    import pandas as pd
+
+    river = cubo.marginal("mano_river")
+    totales = river.sum(axis=-1)
+    presentes = np.flatnonzero(totales)
+    tabla = pd.DataFrame({"mano_river": [NOMBRES_MANO[i + 1] for i in presentes],
+                          "Win Rate": river[presentes, 2] / totales[presentes] * 100})
+    return tabla.sort_values(by="Win Rate", ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye o amplía el cubo de resultados del análisis de datos.")
+    parser.add_argument("rutas", nargs="*", help="Partes del generador, ficheros .pmd o CSV del dataset original")
+    parser.add_argument("--cubo", default=RUTA_CUBO, help="Fichero .npz del cubo (se amplía si ya existe)")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    cubo = CuboResultados.cargar(args.cubo) if os.path.exists(args.cubo) else CuboResultados()
+    try:
+        nuevos = cubo.actualizar(args.rutas, args.procesos)
+    except (KeyError, ValueError) as error:
+        parser.error(f"Entrada no válida: {error}")
+    if nuevos:
+        cubo.guardar(args.cubo)
+        print(f"{nuevos} fragmentos añadidos en {time.perf_counter() - inicio:.1f} s")
+    if not cubo.num_manos:
+        parser.error("El cubo está vacío: indica las partes, ficheros .pmd o CSV del dataset")
+    print(f"Cubo: {os.path.abspath(args.cubo)} ({cubo.num_manos:,} manos de {len(cubo.fragmentos)} fragmentos)\n")
+
+    inicio = time.perf_counter()
+    for titulo, tabla in (("Tasa de victoria por tipo de mano preflop", tasa_victoria_preflop(cubo)),
+                          ("Trío con pareja preflop por calle", trio_por_calle(cubo)),
+                          ("Proyectos con suited connectors", proyectos_suited_connectors(cubo)),
+                          ("Tipos de mano final", distribucion_mano_river(cubo)),
+                          ("Tasa de victoria por tipo de mano final", tasa_victoria_mano_river(cubo))):
+        print(f"{titulo}:\n{tabla.to_string(index=False, float_format=lambda x: f'{x:.4f}')}\n")
+    print(f"Consultas respondidas en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
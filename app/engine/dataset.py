@@ -0,0 +1,218 @@
+# FORMATO BINARIO DEL DATASET (.pmd)
+#
+# El CSV original guarda las cartas como listas de Python en texto ("['10♣', 'Q♦']") y hay que
+# aplicar ast.literal_eval/eval a cada celda para usarlas. El formato .pmd guarda cada columna
+# como un bloque contiguo de uint8 que se puede mapear en memoria y usar directamente como
+# array de NumPy, sin copiar ni interpretar nada.
+#
+# Estructura del fichero (enteros en little-endian):
+#
+#   offset  tamaño  contenido
+#   0       4       b"PMDS"
+#   4       2       versión del formato (uint16, actualmente 1)
+#   6       4       longitud L de la cabecera (uint32)
+#   10      L       cabecera en JSON (UTF-8), rellenada con espacios hasta múltiplo de 64 bytes
+#   ...             columnas, cada una empezando en un offset múltiplo de 64
+#
+# La cabecera contiene:
+#   - "num_manos": número de filas
+#   - "semilla": semilla maestra con la que se generó (null si viene de un CSV)
+#   - "columnas": lista de {"nombre", "dtype", "forma", "offset"}; la columna ocupa
+#     num_manos * prod(forma) bytes a partir de offset, en orden C (fila a fila)
+#   - "codigos": significado de los códigos enteros de las columnas categóricas
+#
+# Columnas (todas uint8):
+#   - cartas: código valor * 10 + palo (palo 1 = ♠, 2 = ♣, 3 = ♦, 4 = ♥), una por byte.
+#     cartas_jugador (2), flop (3), turn, river y la mejor mano en cada fase
+#     cartas_flop, cartas_turn y cartas_river (5, en el orden en que aparecen en la mano)
+#   - num_rivales: 1..8
+#   - mano_preflop: 0 = Carta Alta Offsuit, 1 = Carta Alta Suited, 2 = Pareja Offsuit
+#   - mano_flop, mano_turn, mano_river: 1 = Carta Alta ... 10 = Escalera Real
+#   - resultado: 0 = Derrota, 1 = Empate, 2 = Victoria
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.dataset ../data/simulacion_montecarlo.csv ../data/simulacion_montecarlo.pmd
+#   python -m engine.dataset ../data/simulacion_montecarlo.pmd
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+from engine.evaluator import NOMBRES_MANO
+from engine.writer import COLUMNAS, NOMBRES_PREFLOP, RESULTADOS, EscritorColumnas, TAM_GRUPO
+
+MAGIA = b"PMDS"
+VERSION = 1
+ALINEACION = 64
+
+
+def _alinear(offset):
+    return -(-offset // ALINEACION) * ALINEACION
+
+
+def _cabecera(num_manos, semilla):
+    # Los offsets dependen de la longitud de la cabecera, que a su vez los incluye: reservamos
+    # primero sitio de sobra y después colocamos las columnas a partir de ahí
+    columnas = [{"nombre": nombre, "dtype": "uint8", "forma": [ancho] if ancho > 1 else [], "offset": 0}
+                for nombre, ancho in COLUMNAS.items()]
+    cabecera = {
+        "num_manos": num_manos,
+        "semilla": semilla,
+        "columnas": columnas,
+        "codigos": {
+            "mano_preflop": NOMBRES_PREFLOP,
+            "mano_flop": NOMBRES_MANO,
+            "mano_turn": NOMBRES_MANO,
+            "mano_river": NOMBRES_MANO,
+            "resultado": RESULTADOS,
+        },
+    }
+    inicio = _alinear(10 + len(json.dumps(cabecera, ensure_ascii=False).encode("utf-8")) + 32 * len(columnas))
+    offset = inicio
+    for columna in columnas:
+        columna["offset"] = offset
+        offset = _alinear(offset + num_manos * COLUMNAS[columna["nombre"]])
+    texto = json.dumps(cabecera, ensure_ascii=False).encode("utf-8")
+    return cabecera, texto.ljust(inicio - 10, b" ")
+
+
+def carpetas_de_columnas(ruta):
+    """Carpetas de columnas dentro de ruta: ella misma o las partes del generador."""
+    if os.path.exists(os.path.join(ruta, "columnas.json")):
+        return [ruta]
+    return sorted(os.path.dirname(p) for p in glob.glob(os.path.join(ruta, "parte_*", "columnas.json")))
+
+
+def escribir_dataset(ruta, directorios, semilla=None):
+    """Une una o varias carpetas de columnas (engine.writer) en un único fichero .pmd."""
+    esquemas = []
+    for directorio in directorios:
+        with open(os.path.join(directorio, "columnas.json"), encoding="utf-8") as f:
+            esquemas.append(json.load(f))
+    num_manos = sum(esquema["num_manos"] for esquema in esquemas)
+    if semilla is None and esquemas:
+        semilla = esquemas[0].get("semilla")
+    cabecera, texto = _cabecera(num_manos, semilla)
+
+    # Copiamos cada columna de cada carpeta de forma secuencial, sin cargarlas en memoria
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(MAGIA + struct.pack("<HI", VERSION, len(texto)) + texto)
+        for columna in cabecera["columnas"]:
+            f.write(b"\0" * (columna["offset"] - f.tell()))
+            for directorio in directorios:
+                with open(os.path.join(directorio, f"{columna['nombre']}.bin"), "rb") as origen:
+                    shutil.copyfileobj(origen, f)
+    os.replace(temporal, ruta)
+    return cabecera
+
+
+def leer_cabecera(ruta):
+    """Lee la cabecera de un fichero .pmd."""
+    with open(ruta, "rb") as f:
+        magia, version, longitud = struct.unpack("<4sHI", f.read(10))
+        if magia != MAGIA:
+            raise ValueError(f"{ruta} no es un dataset de Poker Mind")
+        if version != VERSION:
+            raise ValueError(f"Versión de formato no soportada: {version}")
+        return json.loads(f.read(longitud).decode("utf-8"))
+
+
+def cargar_dataset(ruta):
+    """Mapea en memoria un fichero .pmd y devuelve sus columnas como arrays de NumPy (sin copia)."""
+    cabecera = leer_cabecera(ruta)
+    num_manos = cabecera["num_manos"]
+    if num_manos == 0:
+        return {c["nombre"]: np.empty([0] + c["forma"], dtype=c["dtype"]) for c in cabecera["columnas"]}
+
+    datos = np.memmap(ruta, dtype=np.uint8, mode="r")
+    columnas = {}
+    for columna in cabecera["columnas"]:
+        tamaño = num_manos * int(np.prod(columna["forma"], dtype=np.int64))
+        vista = datos[columna["offset"]:columna["offset"] + tamaño].view(columna["dtype"])
+        columnas[columna["nombre"]] = vista.reshape([num_manos] + columna["forma"])
+    return columnas
+
+
+# CONVERSIÓN DESDE EL CSV ORIGINAL
+
+# En UTF-8 los palos son E2 99 A0 (♠), E2 99 A3 (♣), E2 99 A6 (♦) y E2 99 A5 (♥). El valor es el
+# byte anterior al palo ("0" en el caso del 10)
+_PALO_BYTE = np.zeros(256, dtype=np.uint8)
+_PALO_BYTE[[0xA0, 0xA3, 0xA6, 0xA5]] = [1, 2, 3, 4]
+_VALOR_BYTE = np.zeros(256, dtype=np.uint8)
+for _caracter, _valor in zip("234567890JQKA", range(2, 15)):
+    _VALOR_BYTE[ord(_caracter)] = _valor
+
+
+def parsear_cartas(textos, num_cartas):
+    """Convierte una columna de listas en texto ("['10♣', 'Q♦']") en una matriz (N, num_cartas) de códigos."""
+    datos = np.frombuffer("".join(textos).encode("utf-8"), dtype=np.uint8)
+    palos = np.flatnonzero(datos == 0xE2)
+    if len(palos) != len(textos) * num_cartas:
+        raise ValueError(f"Se esperaban {num_cartas} cartas por fila")
+    codigos = _VALOR_BYTE[datos[palos - 1]] * 10 + _PALO_BYTE[datos[palos + 2]]
+    return codigos.reshape(len(textos), num_cartas)
+
+
+def _codificar(serie, nombres):
+    codigos = serie.map({nombre: codigo for codigo, nombre in nombres.items()})
+    if codigos.isna().any():
+        raise ValueError(f"Valores desconocidos en {serie.name}: {serie[codigos.isna()].unique()[:5]}")
+    return codigos.to_numpy(dtype=np.uint8)
+
+
+def columnas_desde_csv(df):
+    """Columnas del dataset (arrays de códigos) a partir de un bloque del CSV original."""
+    columnas = {
+        "num_rivales": df["num_rivales"].to_numpy(dtype=np.uint8),
+        "mano_preflop": _codificar(df["mano_preflop"], NOMBRES_PREFLOP),
+        "resultado": _codificar(df["resultado"], RESULTADOS),
+    }
+    for columna in ("cartas_jugador", "flop", "turn", "river", "cartas_flop", "cartas_turn", "cartas_river"):
+        cartas = parsear_cartas(df[columna].tolist(), COLUMNAS[columna])
+        columnas[columna] = cartas if COLUMNAS[columna] > 1 else cartas[:, 0]
+    for fase in ("flop", "turn", "river"):
+        columnas[f"mano_{fase}"] = _codificar(df[f"mano_{fase}"], NOMBRES_MANO)
+    return columnas
+
+
+def convertir_csv(ruta_csv, ruta, tam_bloque=500000):
+    """Convierte el CSV del dataset original al formato .pmd, leyéndolo por bloques."""
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(ruta))) as temporal:
+        with EscritorColumnas(temporal, TAM_GRUPO) as escritor:
+            for df in pd.read_csv(ruta_csv, chunksize=tam_bloque):
+                escritor.escribir(columnas_desde_csv(df))
+        return escribir_dataset(ruta, [temporal])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte el dataset de Poker Mind al formato binario .pmd.")
+    parser.add_argument("entrada", help="CSV original, carpeta de columnas o de partes, o un .pmd (para ver su cabecera)")
+    parser.add_argument("salida", nargs="?", help="Fichero .pmd de salida")
+    args = parser.parse_args()
+
+    if args.salida is None:
+        cabecera = leer_cabecera(args.entrada)
+        print(f"{args.entrada}: {cabecera['num_manos']:,} manos, semilla {cabecera['semilla']}")
+        for columna in cabecera["columnas"]:
+            print(f"  {columna['nombre']:<15} {columna['dtype']} {columna['forma']}")
+        return
+
+    if os.path.isdir(args.entrada):
+        escribir_dataset(args.salida, carpetas_de_columnas(args.entrada))
+    else:
+        convertir_csv(args.entrada, args.salida)
+    print(f"Dataset guardado en: {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# DESTILACIÓN DEL MODELO EN REDES PEQUEÑAS Y CUANTIZACIÓN INT8
+#
+# El modelo de la App (17 -> 1024 -> 512 -> 256 -> 128 -> 3, unos 700.000 parámetros) es mucho
+# mayor de lo que piden 17 features, y su coste se nota en la predicción de la siguiente carta y
+# al puntuar datasets enteros. Este módulo entrena redes pequeñas (alumnos) que imitan las
+# probabilidades del modelo actual (el profesor) en lugar de los resultados de cada mano, que
+# son mucho más ruidosos: el profesor ya ha promediado millones de manos parecidas.
+#
+#   - Las features se leen de una muestra de filas de los fragmentos del dataset (como en
+#     engine.training) y el profesor las etiqueta una sola vez. La pérdida mezcla la entropía
+#     cruzada con las probabilidades del profesor, suavizadas con la temperatura, y la de los
+#     resultados reales (alfa es el peso de la primera).
+#   - Los alumnos se entrenan con NumPy (Adam y LeakyReLU, como el profesor), sin TensorFlow.
+#     Se guarda el de menor divergencia con el profesor en validación, en el formato .npz de
+#     engine.inference y con el escalado integrado en la primera capa, así que la App,
+#     engine.batch_predictor y engine.benchmark los cargan como el modelo actual.
+#   - Cada modelo, el profesor incluido, se guarda también con los pesos en int8.
+#
+# El informe compara todos los modelos con las filas de validación: precisión, acuerdo con el
+# profesor, log loss, Brier, error de calibración (ECE), divergencia KL con el profesor,
+# latencia de una predicción, filas/s en lotes y tamaño del fichero, y marca los de la frontera
+# de Pareto entre log loss, filas/s y tamaño.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.distillation ../data/partes --alumnos 128x64 64x32 32x16 --informe ../informe_alumnos.json
+#   python -m engine.batch_predictor --modelo models/alumno_64x32_int8.npz ../data/manos.pmd ../predicciones.csv
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from engine.benchmark import latencias, rendimiento
+from engine.features import FEATURES, matriz_features
+from engine.inference import RUTA_MODELO, ModeloNumpy, cargar_modelo, cuantizar_modelo, guardar_pesos
+from engine.training import TAM_BLOQUE, abrir_fragmento, listar_fragmentos
+
+CARPETA_MODELOS = os.path.dirname(RUTA_MODELO)
+
+ALUMNOS = ((128, 64), (64, 32), (32, 16))
+
+# Pendiente de la parte negativa de la LeakyReLU, la misma que en el profesor
+PENDIENTE = 0.1
+
+TAM_LOTE = 512
+TAM_LOTE_PROFESOR = 65536
+
+# Cubetas de probabilidad del error de calibración
+CUBETAS_CALIBRACION = 15
+
+# Filas de los lotes con los que se mide el rendimiento
+FILAS_RENDIMIENTO = 8192
+
+# Criterios de la frontera de Pareto: (medida del informe, mayor es mejor)
+CRITERIOS_PARETO = (("log_loss", False), ("filas_s", True), ("tamano_kb", False))
+
+
+# DATOS
+
+def muestra_features(fragmentos, num_filas, semilla=42, tam_bloque=TAM_BLOQUE):
+    """Features sin escalar (N, 17) y resultados (N,) de num_filas filas al azar de los fragmentos, en orden aleatorio."""
+    tamanos = [len(abrir_fragmento(fragmento)["resultado"]) for fragmento in fragmentos]
+    total = sum(tamanos)
+    rng = np.random.default_rng(semilla)
+    elegidas = np.sort(rng.choice(total, min(num_filas, total), replace=False))
+
+    X, y = [], []
+    inicio = 0
+    for fragmento, tamano in zip(fragmentos, tamanos):
+        filas = elegidas[(elegidas >= inicio) & (elegidas < inicio + tamano)] - inicio
+        inicio += tamano
+        if not len(filas):
+            continue
+        columnas = abrir_fragmento(fragmento)
+        for bloque in range(0, len(filas), tam_bloque):
+            indices = filas[bloque:bloque + tam_bloque]
+            X.append(matriz_features({c: v[indices] for c, v in columnas.items()}).astype(np.float32))
+            y.append(np.asarray(columnas["resultado"][indices], dtype=np.int64))
+
+    orden = rng.permutation(len(elegidas))
+    return np.concatenate(X)[orden], np.concatenate(y)[orden]
+
+
+def etiquetar(modelo, X, tam_lote=TAM_LOTE_PROFESOR):
+    """Probabilidades (N, 3) del modelo para todas las filas, por lotes."""
+    return np.concatenate([modelo.predecir(X[inicio:inicio + tam_lote]) for inicio in range(0, len(X), tam_lote)])
+
+
+def _softmax(logits):
+    logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return logits / logits.sum(axis=1, keepdims=True)
+
+
+def suavizar(probabilidades, temperatura):
+    """Probabilidades con los logits divididos por la temperatura (más planas si es mayor que 1)."""
+    if temperatura == 1:
+        return probabilidades
+    return _softmax(np.log(np.clip(probabilidades, 1e-12, None)) / temperatura).astype(np.float32)
+
+
+# RED DEL ALUMNO
+
+class Alumno:
+    """Red 17 -> capas ocultas -> 3 con LeakyReLU y softmax, entrenada con NumPy sobre las features escaladas."""
+
+    def __init__(self, capas_ocultas, num_features=len(FEATURES), semilla=0):
+        rng = np.random.default_rng(semilla)
+        tamanos = [num_features, *capas_ocultas, 3]
+        self.capas_ocultas = tuple(capas_ocultas)
+        self.pesos = [(rng.standard_normal((entrada, salida)) * np.sqrt(2 / entrada)).astype(np.float32)
+                      for entrada, salida in zip(tamanos[:-1], tamanos[1:])]
+        self.sesgos = [np.zeros(salida, dtype=np.float32) for salida in tamanos[1:]]
+
+    @property
+    def nombre(self):
+        return "alumno_" + "x".join(str(n) for n in self.capas_ocultas)
+
+    def _adelante(self, X):
+        # Entradas de cada capa y logits
+        entradas = [X]
+        h = X
+        for pesos, sesgo in zip(self.pesos[:-1], self.sesgos[:-1]):
+            h = h @ pesos + sesgo
+            h = np.where(h > 0, h, h * PENDIENTE)
+            entradas.append(h)
+        return entradas, h @ self.pesos[-1] + self.sesgos[-1]
+
+    def predecir(self, X):
+        return _softmax(self._adelante(X)[1])
+
+    def gradientes(self, X, blandas, y, alfa, temperatura):
+        """Pérdida del lote y gradientes de pesos y sesgos.
+
+        alfa * T² * CE(profesor a temperatura T, alumno a temperatura T) + (1 - alfa) * CE(resultado, alumno).
+        """
+        entradas, logits = self._adelante(X)
+        n = len(X)
+        alumno_t = _softmax(logits / temperatura)
+        alumno = _softmax(logits) if temperatura != 1 else alumno_t
+        filas = np.arange(n)
+        perdida = (alfa * temperatura ** 2 * -(blandas * np.log(np.clip(alumno_t, 1e-12, None))).sum(axis=1).mean()
+                   + (1 - alfa) * -np.log(np.clip(alumno[filas, y], 1e-12, None)).mean())
+
+        # Derivada respecto a los logits: T * (q_T - p_T) para la parte blanda y q - 1(y) para la dura
+        delta = alfa * temperatura * (alumno_t - blandas)
+        duras = alumno.copy()
+        duras[filas, y] -= 1
+        delta = (delta + (1 - alfa) * duras) / n
+
+        grad_pesos, grad_sesgos = [], []
+        for i in range(len(self.pesos) - 1, -1, -1):
+            grad_pesos.append(entradas[i].T @ delta)
+            grad_sesgos.append(delta.sum(axis=0))
+            if i:
+                delta = (delta @ self.pesos[i].T) * np.where(entradas[i] > 0, 1, PENDIENTE).astype(np.float32)
+        return float(perdida), grad_pesos[::-1], grad_sesgos[::-1]
+
+    def copia_pesos(self):
+        return [w.copy() for w in self.pesos], [b.copy() for b in self.sesgos]
+
+    def guardar(self, ruta, escala, minimo, int8=False):
+        """Guarda la red para ModeloNumpy, con el escalado integrado en la primera capa."""
+        # (x * s + m) @ W + b = x @ (s * W) + (m @ W + b)
+        pesos, sesgos = list(self.pesos), list(self.sesgos)
+        pesos[0], sesgos[0] = escala[:, None] * pesos[0], minimo @ pesos[0] + sesgos[0]
+        return guardar_pesos(ruta, pesos, sesgos, [PENDIENTE] * (len(pesos) - 1), FEATURES, int8)
+
+
+def divergencia_kl(profesor, alumno):
+    """Divergencia KL media del profesor al alumno, por fila."""
+    profesor = np.clip(profesor, 1e-12, None)
+    return float((profesor * (np.log(profesor) - np.log(np.clip(alumno, 1e-12, None)))).sum(axis=1).mean())
+
+
+def entrenar_alumno(capas_ocultas, X, blandas, y, X_validacion, profesor_validacion, epocas=20, tam_lote=TAM_LOTE,
+                    tasa=0.002, alfa=0.9, temperatura=1.0, paciencia=4, semilla=42):
+    """Entrena un alumno y devuelve (alumno con los mejores pesos, escala, mínimo).
+
+    El escalado es un MinMaxScaler ajustado con X. Tras cada época se mide la divergencia KL con el
+    profesor en validación: la tasa se reduce a la mitad tras dos épocas sin mejorar y el
+    entrenamiento se detiene tras paciencia.
+    """
+    minimo_x, maximo_x = X.min(axis=0), X.max(axis=0)
+    rango = np.where(maximo_x > minimo_x, maximo_x - minimo_x, 1)
+    escala, minimo = (1 / rango).astype(np.float32), (-minimo_x / rango).astype(np.float32)
+    X_validacion = X_validacion * escala + minimo
+
+    alumno = Alumno(capas_ocultas, X.shape[1], semilla)
+    parametros = alumno.pesos + alumno.sesgos
+    momentos = [np.zeros_like(p) for p in parametros]
+    varianzas = [np.zeros_like(p) for p in parametros]
+    beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+    paso = 0
+
+    rng = np.random.default_rng(semilla)
+    mejor, mejores_pesos, sin_mejorar = np.inf, alumno.copia_pesos(), 0
+    for epoca in range(epocas):
+        inicio = time.perf_counter()
+        orden = rng.permutation(len(X))
+        perdidas = []
+        for lote in range(0, len(orden) - tam_lote + 1, tam_lote):
+            indices = orden[lote:lote + tam_lote]
+            perdida, grad_pesos, grad_sesgos = alumno.gradientes(X[indices] * escala + minimo, blandas[indices], y[indices],
+                                                                  alfa, temperatura)
+            perdidas.append(perdida)
+
+            # Adam
+            paso += 1
+            correccion = tasa * np.sqrt(1 - beta2 ** paso) / (1 - beta1 ** paso)
+            for parametro, gradiente, m, v in zip(parametros, grad_pesos + grad_sesgos, momentos, varianzas):
+                m *= beta1
+                m += (1 - beta1) * gradiente
+                v *= beta2
+                v += (1 - beta2) * gradiente * gradiente
+                parametro -= correccion * m / (np.sqrt(v) + epsilon)
+
+        kl = divergencia_kl(profesor_validacion, alumno.predecir(X_validacion))
+        print(f"{alumno.nombre}: época {epoca + 1}/{epocas}, pérdida {np.mean(perdidas):.4f}, "
+              f"KL de validación {kl:.5f} ({time.perf_counter() - inicio:.1f} s)")
+        if kl < mejor:
+            mejor, mejores_pesos, sin_mejorar = kl, alumno.copia_pesos(), 0
+        else:
+            sin_mejorar += 1
+            if sin_mejorar >= paciencia:
+                break
+            if sin_mejorar % 2 == 0:
+                tasa /= 2
+
+    alumno.pesos, alumno.sesgos = mejores_pesos
+    return alumno, escala, minimo
+
+
+# INFORME
+
+def error_calibracion(probabilidades, y, num_cubetas=CUBETAS_CALIBRACION):
+    """ECE por clases: diferencia media, ponderada por filas, entre la probabilidad y la frecuencia real en cada cubeta."""
+    errores = []
+    for clase in range(probabilidades.shape[1]):
+        p = probabilidades[:, clase]
+        acierto = y == clase
+        cubetas = np.minimum((p * num_cubetas).astype(np.int64), num_cubetas - 1)
+        diferencia = np.bincount(cubetas, p, num_cubetas) - np.bincount(cubetas, acierto, num_cubetas)
+        errores.append(np.abs(diferencia).sum() / len(p))
+    return float(np.mean(errores))
+
+
+def metricas(probabilidades, y, profesor):
+    """Precisión, acuerdo con el profesor, log loss, Brier, ECE y divergencia KL con el profesor."""
+    filas = np.arange(len(y))
+    reales = np.zeros_like(probabilidades)
+    reales[filas, y] = 1
+    return {
+        "precision": float((probabilidades.argmax(axis=1) == y).mean()),
+        "acuerdo_profesor": float((probabilidades.argmax(axis=1) == profesor.argmax(axis=1)).mean()),
+        "log_loss": float(-np.log(np.clip(probabilidades[filas, y], 1e-12, None)).mean()),
+        "brier": float(((probabilidades - reales) ** 2).sum(axis=1).mean()),
+        "ece": error_calibracion(probabilidades, y),
+        "kl_profesor": divergencia_kl(profesor, probabilidades),
+    }
+
+
+def medir_modelo(modelo, X, repeticiones=500):
+    """Latencia de una predicción (p50 y p99, ms) y filas/s en lotes de FILAS_RENDIMIENTO."""
+    fila = X[:1]
+    una = latencias(lambda: modelo.predecir(fila), repeticiones)
+    lote = X[:FILAS_RENDIMIENTO]
+    return {
+        "latencia_p50_ms": una["p50"]["valor"],
+        "latencia_p99_ms": una["p99"]["valor"],
+        "filas_s": rendimiento(lambda: modelo.predecir(lote), len(lote), "filas/s")["valor"],
+    }
+
+
+def evaluar_modelo(nombre, ruta, X, y, profesor):
+    """Entrada del informe de un modelo .npz."""
+    modelo = ModeloNumpy(ruta)
+    return {
+        "nombre": nombre,
+        "ruta": os.path.abspath(ruta),
+        "int8": modelo.int8,
+        "parametros": int(sum(w.size + b.size for w, b in zip(modelo.pesos, modelo.sesgos))),
+        "tamano_kb": os.path.getsize(ruta) / 1024,
+        **metricas(etiquetar(modelo, X), y, profesor),
+        **medir_modelo(modelo, X),
+    }
+
+
+def frontera_pareto(modelos, criterios=CRITERIOS_PARETO):
+    """Marca los modelos que ningún otro iguala o mejora en todos los criterios y mejora en alguno."""
+    def valores(modelo):
+        return [modelo[nombre] * (-1 if mayor_es_mejor else 1) for nombre, mayor_es_mejor in criterios]
+
+    for modelo in modelos:
+        propios = valores(modelo)
+        modelo["pareto"] = not any(
+            all(o <= p for o, p in zip(valores(otro), propios)) and any(o < p for o, p in zip(valores(otro), propios))
+            for otro in modelos)
+    return modelos
+
+
+# DESTILACIÓN
+
+def destilar(rutas, alumnos=ALUMNOS, ruta_profesor=None, destino=CARPETA_MODELOS, num_filas=2000000, validacion=0.1,
+             epocas=20, tam_lote=TAM_LOTE, alfa=0.9, temperatura=1.0, semilla=42):
+    """Entrena los alumnos, los guarda en destino (float32 e int8) y devuelve el informe comparativo."""
+    fragmentos = listar_fragmentos(rutas)
+    if not fragmentos:
+        raise ValueError(f"No se han encontrado fragmentos del dataset en {rutas}")
+    ruta_profesor = ruta_profesor or RUTA_MODELO
+    profesor = cargar_modelo() if ruta_profesor == RUTA_MODELO else ModeloNumpy(ruta_profesor)
+    os.makedirs(destino, exist_ok=True)
+
+    # Las filas de validación son las últimas de la muestra, que ya está barajada
+    inicio = time.perf_counter()
+    X, y = muestra_features(fragmentos, num_filas, semilla)
+    num_validacion = max(1, int(len(y) * validacion))
+    X, X_validacion = X[:-num_validacion], X[-num_validacion:]
+    y, y_validacion = y[:-num_validacion], y[-num_validacion:]
+    blandas = suavizar(etiquetar(profesor, X), temperatura)
+    profesor_validacion = etiquetar(profesor, X_validacion)
+    print(f"{len(y):,} filas de entrenamiento y {len(y_validacion):,} de validación etiquetadas por el profesor "
+          f"en {time.perf_counter() - inicio:.1f} s")
+
+    ruta_int8 = os.path.join(destino, os.path.splitext(os.path.basename(ruta_profesor))[0] + "_int8.npz")
+    modelos = [("profesor", ruta_profesor), ("profesor_int8", cuantizar_modelo(ruta_profesor, ruta_int8))]
+    for capas_ocultas in alumnos:
+        alumno, escala, minimo = entrenar_alumno(capas_ocultas, X, blandas, y, X_validacion, profesor_validacion,
+                                                 epocas, tam_lote, alfa=alfa, temperatura=temperatura, semilla=semilla)
+        ruta = os.path.join(destino, alumno.nombre + ".npz")
+        modelos.append((alumno.nombre, alumno.guardar(ruta, escala, minimo)))
+        modelos.append((alumno.nombre + "_int8", alumno.guardar(ruta[:-4] + "_int8.npz", escala, minimo, int8=True)))
+
+    informe = [evaluar_modelo(nombre, ruta, X_validacion, y_validacion, profesor_validacion) for nombre, ruta in modelos]
+    return {
+        "filas_entrenamiento": len(y),
+        "filas_validacion": len(y_validacion),
+        "alfa": alfa,
+        "temperatura": temperatura,
+        "modelos": frontera_pareto(informe),
+    }
+
+
+def _capas(texto):
+    # "128x64" -> (128, 64)
+    try:
+        return tuple(int(n) for n in texto.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Capas no válidas: {texto} (por ejemplo, 128x64)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Destila el modelo en redes pequeñas, las cuantiza a int8 y las compara.")
+    parser.add_argument("rutas", nargs="+", help="Carpetas de partes del generador, carpetas de columnas o ficheros .pmd")
+    parser.add_argument("--alumnos", nargs="+", type=_capas, default=ALUMNOS, help="Capas ocultas de cada alumno (128x64 ...)")
+    parser.add_argument("--profesor", default=None, help="Modelo .npz del profesor (por defecto, el de la App)")
+    parser.add_argument("--destino", default=CARPETA_MODELOS, help="Carpeta donde se guardan los modelos")
+    parser.add_argument("--filas", type=int, default=2000000, help="Filas de la muestra del dataset")
+    parser.add_argument("--validacion", type=float, default=0.1, help="Fracción de la muestra para validación")
+    parser.add_argument("--epocas", type=int, default=20, help="Número máximo de épocas")
+    parser.add_argument("--tam-lote", type=int, default=TAM_LOTE, help="Tamaño del lote")
+    parser.add_argument("--alfa", type=float, default=0.9, help="Peso de las probabilidades del profesor frente a los resultados")
+    parser.add_argument("--temperatura", type=float, default=1.0, help="Temperatura de las probabilidades del profesor")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla de la muestra y del entrenamiento")
+    parser.add_argument("--informe", default=None, help="Fichero JSON donde se guarda el informe")
+    args = parser.parse_args()
+
+    try:
+        informe = destilar(args.rutas, args.alumnos, args.profesor, args.destino, args.filas, args.validacion,
+                           args.epocas, args.tam_lote, args.alfa, args.temperatura, args.semilla)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print(f"\n{'modelo':<22} {'parám.':>9} {'KB':>7} {'precisión':>9} {'acuerdo':>8} {'log loss':>9} {'Brier':>7} "
+          f"{'ECE':>7} {'KL':>8} {'p50 ms':>7} {'filas/s':>11}")
+    for modelo in informe["modelos"]:
+        print(f"{modelo['nombre'] + (' *' if modelo['pareto'] else ''):<22} {modelo['parametros']:>9,} {modelo['tamano_kb']:>7,.0f} "
+              f"{modelo['precision']:>9.4f} {modelo['acuerdo_profesor']:>8.4f} {modelo['log_loss']:>9.4f} {modelo['brier']:>7.4f} "
+              f"{modelo['ece']:>7.4f} {modelo['kl_profesor']:>8.5f} {modelo['latencia_p50_ms']:>7.3f} {modelo['filas_s']:>11,.0f}")
+    print("* frontera de Pareto entre log loss, filas/s y tamaño")
+
+    if args.informe:
+        with open(args.informe, "w", encoding="utf-8") as fichero:
+            json.dump(informe, fichero, indent=2)
+        print(f"Informe guardado en: {os.path.abspath(args.informe)}")
+
+
+if __name__ == "__main__":
+    main()
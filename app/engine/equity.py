@@ -0,0 +1,321 @@
+# EQUITY EXACTA Y POR MONTE CARLO
+#
+# Calcula la probabilidad de victoria, empate y derrota de una mano contra num_rivales rivales
+# con cartas desconocidas, con la misma definición de resultado que el dataset: derrota si algún
+# rival tiene mejor mano, empate si el mejor rival la iguala y victoria en otro caso.
+#
+# Si hay pocas combinaciones (en el river contra un rival solo hay C(45, 2) = 990 manos posibles)
+# se enumeran todas: para cada tablero posible se evalúan una sola vez todas las parejas de
+# cartas restantes y después se recorren los conjuntos de manos disjuntas de los rivales
+# consultando esas fuerzas, sin volver a evaluar. Si la enumeración no cabe en el presupuesto de
+# tiempo se usa Monte Carlo, que se detiene al alcanzar el error pedido o el máximo de
+# simulaciones e indica el error obtenido (semiamplitud del intervalo de confianza del 95 %).
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.equity --jugador A♠ K♠ --mesa Q♠ J♠ 2♦ 7♣ --rivales 2
+
+import argparse
+import itertools
+import math
+import os
+from functools import lru_cache
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas
+from engine.cache import CacheResultados, clave_canonica
+from engine.cards import BARAJA, carta_a_numero
+from engine.profiling import medir
+
+_BARAJA = np.array(BARAJA, dtype=np.uint8)
+
+# Velocidades aproximadas en un núcleo, para estimar el coste antes de calcular
+EVALUACIONES_POR_SEGUNDO = 1500000
+COMPARACIONES_POR_SEGUNDO = 30000000
+
+# Límites de memoria de la enumeración exacta
+MAX_EMPAREJAMIENTOS = 4000000
+TAM_BLOQUE = 4000000
+
+# A partir de este tiempo estimado (en segundos) merece la pena repartir el trabajo entre procesos
+MIN_TIEMPO_PARALELO = 0.5
+
+Z_95 = 1.96
+
+
+def _codigos(cartas):
+    # Acepta códigos numéricos o en texto ("141"), como los usa la App
+    return np.asarray(cartas, dtype=np.int64).astype(np.uint8).reshape(-1)
+
+
+def resultado_equity(victorias, empates, total, exacta, error):
+    """Diccionario de resultado con el mismo formato que la predicción del modelo en la App."""
+    probabilidades = {
+        "Derrota": float((total - victorias - empates) / total),
+        "Empate": float(empates / total),
+        "Victoria": float(victorias / total),
+    }
+    return {
+        **probabilidades,
+        "Clase": max(probabilidades, key=probabilidades.get),
+        "Exacta": exacta,
+        "Error": error,
+        "Manos": int(total),
+    }
+
+
+# COSTE DE LA ENUMERACIÓN
+
+def _doble_factorial(n):
+    return math.prod(range(n, 0, -2))
+
+
+def combinaciones_exactas(num_comunitarias, num_rivales):
+    """Tableros posibles, manos a evaluar y comparaciones de la enumeración exacta."""
+    desconocidas = 50 - num_comunitarias
+    faltan = 5 - num_comunitarias
+    tableros = math.comb(desconocidas, faltan)
+    restantes = desconocidas - faltan
+    emparejamientos = math.comb(restantes, 2 * num_rivales) * _doble_factorial(2 * num_rivales - 1)
+    evaluaciones = tableros * (math.comb(restantes, 2) + 1)
+    return tableros, evaluaciones, tableros * emparejamientos * num_rivales
+
+
+def estimar_tiempo(num_comunitarias, num_rivales, procesos=1):
+    """Segundos estimados de la enumeración exacta (infinito si no cabe en memoria)."""
+    tableros, evaluaciones, comparaciones = combinaciones_exactas(num_comunitarias, num_rivales)
+    if comparaciones // (tableros * num_rivales) > MAX_EMPAREJAMIENTOS:
+        return math.inf
+    return (evaluaciones / EVALUACIONES_POR_SEGUNDO + comparaciones / COMPARACIONES_POR_SEGUNDO) / procesos
+
+
+# ENUMERACIÓN EXACTA
+
+@lru_cache(maxsize=None)
+def _combinaciones(n, k):
+    # Todas las combinaciones de k posiciones entre n, en orden lexicográfico
+    return np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n), k)),
+                       dtype=np.int8, count=math.comb(n, k) * k).reshape(math.comb(n, k), k)
+
+
+@lru_cache(maxsize=None)
+def _emparejamientos(n, num_rivales):
+    # Conjuntos de num_rivales parejas disjuntas entre n cartas, como índices de la pareja en
+    # _combinaciones(n, 2). Se eligen las 2 * num_rivales cartas y después cómo se reparten
+    indice_pareja = np.zeros((n, n), dtype=np.int32)
+    parejas = _combinaciones(n, 2)
+    indice_pareja[parejas[:, 0], parejas[:, 1]] = np.arange(len(parejas))
+
+    def repartos(posiciones):
+        if not posiciones:
+            yield []
+            return
+        primera, resto = posiciones[0], posiciones[1:]
+        for i, segunda in enumerate(resto):
+            for reparto in repartos(resto[:i] + resto[i + 1:]):
+                yield [(primera, segunda)] + reparto
+
+    cartas = _combinaciones(n, 2 * num_rivales).astype(np.intp)
+    return np.concatenate([
+        np.stack([indice_pareja[cartas[:, a], cartas[:, b]] for a, b in reparto], axis=1)
+        for reparto in repartos(list(range(2 * num_rivales)))
+    ])
+
+
+def _contar_exacto(argumentos):
+    cartas_jugador, comunitarias, num_rivales, tableros, emparejamientos = argumentos
+    desconocidas = _BARAJA[~np.isin(_BARAJA, np.concatenate([cartas_jugador, comunitarias]))]
+    faltan = 5 - len(comunitarias)
+    restantes = len(desconocidas) - faltan
+    parejas = _combinaciones(restantes, 2).astype(np.intp)
+    sets = _emparejamientos(restantes, num_rivales)[slice(*emparejamientos)]
+    indices_tablero = _combinaciones(len(desconocidas), faltan)[slice(*tableros)].astype(np.intp)
+
+    # Repartimos los tableros en bloques para acotar la memoria
+    por_bloque = max(1, min(TAM_BLOQUE // max(1, len(sets) * num_rivales), TAM_BLOQUE // 8 // len(parejas)))
+    victorias = empates = 0
+    for inicio in range(0, len(indices_tablero), por_bloque):
+        bloque = indices_tablero[inicio:inicio + por_bloque]
+        num_tableros = len(bloque)
+
+        # Cartas que quedan para los rivales en cada tablero
+        libres = np.ones((num_tableros, len(desconocidas)), dtype=bool)
+        libres[np.arange(num_tableros)[:, None], bloque] = False
+        mazo = desconocidas[np.nonzero(libres)[1].reshape(num_tableros, restantes)]
+        tablero = np.concatenate([np.broadcast_to(comunitarias, (num_tableros, len(comunitarias))), desconocidas[bloque]], axis=1)
+
+        fuerza_jugador = evaluar_fuerzas(np.concatenate([np.broadcast_to(cartas_jugador, (num_tableros, 2)), tablero], axis=1))
+
+        # Fuerza de cada pareja posible en cada tablero
+        manos = np.concatenate([
+            mazo[:, parejas[:, 0], None], mazo[:, parejas[:, 1], None],
+            np.broadcast_to(tablero[:, None, :], (num_tableros, len(parejas), 5))], axis=2)
+        fuerzas = evaluar_fuerzas(manos.reshape(-1, 7)).reshape(num_tableros, len(parejas))
+
+        mejor_rival = fuerzas[:, sets].max(axis=2)
+        victorias += int((mejor_rival < fuerza_jugador[:, None]).sum())
+        empates += int((mejor_rival == fuerza_jugador[:, None]).sum())
+    return victorias, empates, len(indices_tablero) * len(sets)
+
+
+def _repartir(total, partes):
+    limites = np.linspace(0, total, partes + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+
+
+@medir("equity.exacta")
+def equity_exacta(cartas_jugador, comunitarias, num_rivales, procesos=1):
+    """Probabilidades exactas enumerando todos los tableros y manos posibles de los rivales."""
+    cartas_jugador, comunitarias = _codigos(cartas_jugador), _codigos(comunitarias)
+    tableros, _, comparaciones = combinaciones_exactas(len(comunitarias), num_rivales)
+    emparejamientos = comparaciones // (tableros * num_rivales)
+
+    # Repartimos los tableros entre los procesos o, si hay pocos (river), los conjuntos de manos
+    if tableros >= procesos:
+        tareas = [(t, (0, emparejamientos)) for t in _repartir(tableros, procesos)]
+    else:
+        tareas = [((0, tableros), e) for e in _repartir(emparejamientos, procesos)]
+    tareas = [(cartas_jugador, comunitarias, num_rivales, t, e) for t, e in tareas]
+
+    if len(tareas) > 1:
+        with Pool(procesos) as pool:
+            conteos = pool.map(_contar_exacto, tareas)
+    else:
+        conteos = [_contar_exacto(tareas[0])]
+    victorias, empates, total = np.sum(conteos, axis=0)
+    return resultado_equity(victorias, empates, total, True, 0.0)
+
+
+# MONTE CARLO
+
+def _simular(argumentos):
+    cartas_jugador, comunitarias, num_rivales, num_simulaciones, semilla = argumentos
+    rng = np.random.default_rng(semilla)
+    desconocidas = _BARAJA[~np.isin(_BARAJA, np.concatenate([cartas_jugador, comunitarias]))]
+    faltan = 5 - len(comunitarias)
+
+    # Repartimos el resto del tablero y las manos de los rivales sin reemplazamiento
+    reparto = desconocidas[rng.permuted(np.tile(np.arange(len(desconocidas), dtype=np.uint8), (num_simulaciones, 1)), axis=1)]
+    tablero = np.concatenate([np.broadcast_to(comunitarias, (num_simulaciones, len(comunitarias))), reparto[:, :faltan]], axis=1)
+    rivales = reparto[:, faltan:faltan + 2 * num_rivales].reshape(num_simulaciones, num_rivales, 2)
+
+    fuerza_jugador = evaluar_fuerzas(np.concatenate([np.broadcast_to(cartas_jugador, (num_simulaciones, 2)), tablero], axis=1))
+    manos_rivales = np.concatenate([rivales, np.broadcast_to(tablero[:, None, :], (num_simulaciones, num_rivales, 5))], axis=2)
+    mejor_rival = evaluar_fuerzas(manos_rivales.reshape(-1, 7)).reshape(num_simulaciones, num_rivales).max(axis=1)
+    return int((mejor_rival < fuerza_jugador).sum()), int((mejor_rival == fuerza_jugador).sum()), num_simulaciones
+
+
+def _error(victorias, empates, total):
+    # Semiamplitud del intervalo de confianza del 95 % de la probabilidad menos precisa
+    probabilidades = np.array([victorias, empates, total - victorias - empates]) / total
+    return float(Z_95 * np.sqrt(probabilidades * (1 - probabilidades) / total).max())
+
+
+def equity_montecarlo(cartas_jugador, comunitarias, num_rivales, max_simulaciones=200000,
+                      error_objetivo=0.005, semilla=None, procesos=1, tam_lote=50000):
+    """Probabilidades estimadas por Monte Carlo hasta alcanzar error_objetivo o max_simulaciones."""
+    cartas_jugador, comunitarias = _codigos(cartas_jugador), _codigos(comunitarias)
+    semillas = np.random.SeedSequence(semilla)
+    victorias = empates = total = 0
+
+    pool = Pool(procesos) if procesos > 1 else None
+    try:
+        while total < max_simulaciones:
+            # Una ronda de lotes (uno por proceso), cada uno con su propia semilla
+            lotes = [min(tam_lote, max_simulaciones - total - i * tam_lote) for i in range(procesos)]
+            tareas = [(cartas_jugador, comunitarias, num_rivales, lote, hija)
+                      for lote, hija in zip(lotes, semillas.spawn(procesos)) if lote > 0]
+            conteos = pool.map(_simular, tareas) if pool else [_simular(tarea) for tarea in tareas]
+            for v, e, n in conteos:
+                victorias, empates, total = victorias + v, empates + e, total + n
+            if _error(victorias, empates, total) <= error_objetivo:
+                break
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return resultado_equity(victorias, empates, total, False, _error(victorias, empates, total))
+
+
+# EQUITY SEGÚN EL PRESUPUESTO
+
+# Caché compartida por todas las consultas del proceso (solo en memoria)
+cache_equity = CacheResultados()
+
+
+def calcular_equity(cartas_jugador, comunitarias, num_rivales, presupuesto=0.25, procesos=None,
+                    error_objetivo=0.005, semilla=None, cache=cache_equity):
+    """Equity exacta si su coste estimado cabe en el presupuesto (segundos) y Monte Carlo si no.
+
+    Antes del flop se consulta la tabla de engine.preflop. Los resultados se guardan en cache
+    por situación canónica, así que las consultas repetidas o iguales salvo los palos no se
+    vuelven a calcular (cache=None para no usarla).
+    """
+    if cache is None:
+        return _calcular_equity(cartas_jugador, comunitarias, num_rivales, presupuesto, procesos, error_objetivo, semilla)
+
+    # Un resultado de Monte Carlo guardado solo sirve si es tan preciso como el que se pide
+    clave = clave_canonica(cartas_jugador, comunitarias, num_rivales)
+    resultado = cache.obtener(clave)
+    if resultado is not None and resultado["Error"] <= error_objetivo:
+        return resultado
+    resultado = _calcular_equity(cartas_jugador, comunitarias, num_rivales, presupuesto, procesos, error_objetivo, semilla)
+    return cache.guardar(clave, resultado)
+
+
+def _calcular_equity(cartas_jugador, comunitarias, num_rivales, presupuesto, procesos, error_objetivo, semilla):
+    procesos = procesos or os.cpu_count() or 1
+    num_comunitarias = len(comunitarias)
+
+    # Antes del flop la tabla precalculada da la respuesta al instante
+    from engine.preflop import equity_preflop, MAX_RIVALES, RUTA_TABLA
+    if num_comunitarias == 0 and num_rivales <= MAX_RIVALES and os.path.exists(RUTA_TABLA):
+        return equity_preflop(*_codigos(cartas_jugador), num_rivales)
+
+    # Solo usamos varios procesos cuando el cálculo es lo bastante largo para compensar
+    tiempo = estimar_tiempo(num_comunitarias, num_rivales)
+    if tiempo <= presupuesto * procesos:
+        procesos = procesos if tiempo > MIN_TIEMPO_PARALELO else 1
+        return equity_exacta(cartas_jugador, comunitarias, num_rivales, procesos)
+
+    max_simulaciones = int(presupuesto * procesos * EVALUACIONES_POR_SEGUNDO / (num_rivales + 1))
+    procesos = procesos if presupuesto > MIN_TIEMPO_PARALELO else 1
+    return equity_montecarlo(cartas_jugador, comunitarias, num_rivales, max(max_simulaciones, 10000),
+                             error_objetivo, semilla, procesos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula la equity de una mano contra rivales con cartas desconocidas.")
+    parser.add_argument("--jugador", nargs=2, required=True, help="Cartas del jugador (por ejemplo A♠ K♠)")
+    parser.add_argument("--mesa", nargs="*", default=[], help="Cartas comunitarias (0, 3, 4 o 5)")
+    parser.add_argument("--rivales", type=int, default=1, help="Número de rivales")
+    parser.add_argument("--presupuesto", type=float, default=1.0, help="Segundos disponibles para el cálculo")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla de Monte Carlo")
+    parser.add_argument("--cache", metavar="RUTA", help="Base de datos SQLite donde se guardan los resultados entre ejecuciones")
+    args = parser.parse_args()
+
+    if len(args.mesa) not in (0, 3, 4, 5):
+        parser.error("La mesa debe tener 0, 3, 4 o 5 cartas")
+    try:
+        jugador = [carta_a_numero(carta) for carta in args.jugador]
+        mesa = [carta_a_numero(carta) for carta in args.mesa]
+    except KeyError as error:
+        parser.error(f"Carta no válida: {error}")
+    if len(set(jugador + mesa)) != len(jugador + mesa):
+        parser.error("Hay cartas repetidas")
+
+    with CacheResultados(ruta=args.cache) as cache:
+        resultado = calcular_equity(jugador, mesa, args.rivales, args.presupuesto, args.procesos, semilla=args.semilla, cache=cache)
+        if args.cache:
+            print(f"Caché: {cache.estadisticas()}")
+    print(f"Derrota: {resultado['Derrota']:.2%} | Empate: {resultado['Empate']:.2%} | Victoria: {resultado['Victoria']:.2%}")
+    if resultado["Exacta"]:
+        print(f"Exacta ({resultado['Manos']:,} combinaciones)")
+    else:
+        print(f"Monte Carlo ({resultado['Manos']:,} simulaciones, error ±{resultado['Error']:.2%} al 95 %)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# EVALUADOR RÁPIDO DE MANOS
+#
+# Sustituye al recorrido de las 21 combinaciones de 5 cartas con clasificar_mano.
+# Cada carta se guarda como un entero con tres campos de bits que se suman en una sola pasada:
+#   - bits 0..15: número de cartas de cada palo (4 bits por palo), para detectar el color
+#   - bits 16..79: una máscara de 13 bits por palo con los valores presentes (bit i = valor i + 2)
+#   - bits 80..: clave en base 5 con cuántas cartas hay de cada valor
+# Con tablas precalculadas sobre esos campos se obtiene un entero comparable con la fuerza
+# de la mejor mano de 5, 6 o 7 cartas:
+#
+#   fuerza = categoria << 20 | v1 << 16 | v2 << 12 | v3 << 8 | v4 << 4 | v5
+#
+# donde categoria va de 1 (Carta Alta) a 10 (Escalera Real) y v1..v5 son los valores que
+# deciden el desempate (por ejemplo en un Full House v1 es el trío y v2 la pareja).
+
+from collections import Counter
+from itertools import product
+
+from engine.cards import BARAJA
+
+NOMBRES_MANO = {
+    1: "Carta Alta",
+    2: "Pareja",
+    3: "Doble Pareja",
+    4: "Trío",
+    5: "Escalera",
+    6: "Color",
+    7: "Full House",
+    8: "Póker",
+    9: "Escalera de Color",
+    10: "Escalera Real",
+}
+
+# Cuántas cartas de cada valor forman la mano según su categoría (escaleras aparte)
+PATRONES = {
+    1: (1, 1, 1, 1, 1),
+    2: (2, 1, 1, 1),
+    3: (2, 2, 1),
+    4: (3, 1, 1),
+    6: (1, 1, 1, 1, 1),
+    7: (3, 2),
+    8: (4, 1),
+}
+
+
+# TABLAS POR MÁSCARA DE VALORES (una entrada por cada máscara de 13 bits)
+
+def _crear_tablas_mascara():
+    top5 = [0] * 8192
+    escalera = [0] * 8192
+    num_bits = [0] * 8192
+
+    # Escaleras de mayor a menor; la rueda (A-2-3-4-5) usa el As como 1
+    escaleras = [(top, sum(1 << (v - 2) for v in range(top - 4, top + 1))) for top in range(14, 5, -1)]
+    escaleras.append((5, (1 << 12) | 0b1111))
+
+    for mascara in range(8192):
+        valores = [bit + 2 for bit in range(12, -1, -1) if mascara >> bit & 1]
+        num_bits[mascara] = len(valores)
+        empaquetado = 0
+        for i, valor in enumerate(valores[:5]):
+            empaquetado |= valor << (16 - 4 * i)
+        top5[mascara] = empaquetado
+        for top, patron in escaleras:
+            if mascara & patron == patron:
+                escalera[mascara] = top
+                break
+
+    return top5, escalera, num_bits
+
+
+TOP5, ESCALERA, NUM_BITS = _crear_tablas_mascara()
+
+
+def _evaluar_color(mascara):
+    # Fuerza de un color (o escalera de color) con los valores de la máscara del palo
+    top = ESCALERA[mascara]
+    if top:
+        return (10 if top == 14 else 9) << 20 | top << 16
+    return 6 << 20 | TOP5[mascara]
+
+
+def _evaluar_sin_color(m1, m2, m3, m4):
+    # Valores presentes en al menos 1, 2, 3 y 4 palos
+    rangos = m1 | m2 | m3 | m4
+    parejas = (m1 & m2) | (m3 & m4) | ((m1 | m2) & (m3 | m4))
+    trios = (m1 & m2 & (m3 | m4)) | (m3 & m4 & (m1 | m2))
+    poker = m1 & m2 & m3 & m4
+
+    if poker:
+        valor = TOP5[poker] >> 16
+        return 8 << 20 | valor << 16 | (TOP5[rangos & ~(1 << (valor - 2))] >> 16) << 12
+
+    if trios:
+        trio = TOP5[trios] >> 16
+        resto = parejas & ~(1 << (trio - 2))
+        if resto:
+            return 7 << 20 | trio << 16 | (TOP5[resto] >> 16) << 12
+
+    top = ESCALERA[rangos]
+    if top:
+        return 5 << 20 | top << 16
+
+    if trios:
+        return 4 << 20 | trio << 16 | (TOP5[rangos & ~(1 << (trio - 2))] >> 12) << 8
+
+    if parejas:
+        valores = TOP5[parejas]
+        alta = valores >> 16
+        if NUM_BITS[parejas] >= 2:
+            baja = (valores >> 12) & 15
+            kicker = TOP5[rangos & ~((1 << (alta - 2)) | (1 << (baja - 2)))] >> 16
+            return 3 << 20 | alta << 16 | baja << 12 | kicker << 8
+        return 2 << 20 | alta << 16 | (TOP5[rangos & ~(1 << (alta - 2))] >> 8) << 4
+
+    return 1 << 20 | TOP5[rangos]
+
+
+def evaluar_mascaras(m1, m2, m3, m4):
+    """Fuerza de la mejor mano a partir de las máscaras de valores de cada palo."""
+    # Con 7 cartas o menos un color no puede coincidir con un Póker o un Full House
+    for mascara in (m1, m2, m3, m4):
+        if NUM_BITS[mascara] >= 5:
+            return _evaluar_color(mascara)
+    return _evaluar_sin_color(m1, m2, m3, m4)
+
+
+# TABLAS POR MANO
+
+def _crear_tablas_mano():
+    # Palo con color (o -1) para cada combinación posible de contadores de palo
+    palo_color = [-1] * 65536
+    for contadores in product(range(8), repeat=4):
+        if sum(contadores) <= 7 and max(contadores) >= 5:
+            palo = contadores.index(max(contadores))
+            palo_color[sum(cuenta << (4 * i) for i, cuenta in enumerate(contadores))] = palo
+
+    # Fuerza de la mano si hay color, según la máscara de valores de ese palo
+    color = [_evaluar_color(mascara) if NUM_BITS[mascara] >= 5 else 0 for mascara in range(8192)]
+
+    # Fuerza de la mano sin color para cada multiconjunto de 5 a 7 valores (como mucho 4 de cada uno).
+    # Los vamos construyendo carta a carta: la k-ésima copia de cada valor va al palo k
+    potencias = [5 ** bit for bit in range(13)]
+    sin_color = {}
+    nivel = {0: (0, 0, 0, 0)}
+    for n in range(1, 8):
+        siguiente = {}
+        for clave, (m1, m2, m3, m4) in nivel.items():
+            for bit in range(13):
+                b = 1 << bit
+                if not m1 & b:
+                    siguiente[clave + potencias[bit]] = (m1 | b, m2, m3, m4)
+                elif not m2 & b:
+                    siguiente[clave + potencias[bit]] = (m1, m2 | b, m3, m4)
+                elif not m3 & b:
+                    siguiente[clave + potencias[bit]] = (m1, m2, m3 | b, m4)
+                elif not m4 & b:
+                    siguiente[clave + potencias[bit]] = (m1, m2, m3, m4 | b)
+        nivel = siguiente
+        if n >= 5:
+            for clave, mascaras in nivel.items():
+                sin_color[clave] = _evaluar_sin_color(*mascaras)
+
+    return palo_color, color, sin_color
+
+
+_PALO_COLOR, _COLOR, _SIN_COLOR = _crear_tablas_mano()
+
+# Entero de cada carta con sus tres campos, aceptando el código numérico o en texto
+_CARTAS = {}
+for _codigo in BARAJA:
+    _palo, _bit = _codigo % 10 - 1, _codigo // 10 - 2
+    _CARTAS[_codigo] = _CARTAS[str(_codigo)] = (5 ** _bit) << 80 | 1 << (16 + 16 * _palo + _bit) | 1 << (4 * _palo)
+
+
+# FUNCIONES PARA EVALUAR LA MEJOR MANO POSIBLE
+
+def evaluar_mano(cartas):
+    """Devuelve un entero comparable con la fuerza de la mejor mano de 5, 6 o 7 cartas."""
+    mano = sum(map(_CARTAS.__getitem__, cartas))
+    palo = _PALO_COLOR[mano & 0xFFFF]
+    if palo >= 0:
+        return _COLOR[mano >> (16 + 16 * palo) & 0x1FFF]
+    return _SIN_COLOR[mano >> 80]
+
+
+def categoria(fuerza):
+    """Categoría de la mano (1 = Carta Alta ... 10 = Escalera Real)."""
+    return fuerza >> 20
+
+
+def nombre_mano(fuerza):
+    """Nombre de la mano a partir de su fuerza."""
+    return NOMBRES_MANO[fuerza >> 20]
+
+
+def valores_mano(fuerza):
+    """Valores de desempate codificados en la fuerza, de mayor a menor importancia."""
+    return [fuerza >> desplazamiento & 15 for desplazamiento in (16, 12, 8, 4, 0) if fuerza >> desplazamiento & 15]
+
+
+def indices_mejor_mano(cartas, fuerza=None):
+    """Posiciones (en el orden de entrada) de las 5 cartas que forman la mejor mano."""
+    codigos = [int(carta) for carta in cartas]
+    if fuerza is None:
+        fuerza = evaluar_mano(codigos)
+    cat = fuerza >> 20
+
+    if cat in (5, 9, 10):
+        top = fuerza >> 16 & 15
+        necesarias = {valor: 1 for valor in range(top - 4, top + 1)}
+        if top == 5:
+            del necesarias[1]
+            necesarias[14] = 1
+    else:
+        necesarias = dict(zip(valores_mano(fuerza), PATRONES[cat]))
+
+    palo = None
+    if cat in (6, 9, 10):
+        palo = Counter(codigo % 10 for codigo in codigos).most_common(1)[0][0]
+
+    # Entre cartas equivalentes nos quedamos con las primeras, igual que max() sobre combinations()
+    indices = []
+    for i, codigo in enumerate(codigos):
+        valor = codigo // 10
+        if necesarias.get(valor) and (palo is None or codigo % 10 == palo):
+            necesarias[valor] -= 1
+            indices.append(i)
+    return indices
+
+
+def obtener_mejor_mano(cartas):
+    """Devuelve la clasificación de la mejor mano de 5 cartas y las cartas que la forman."""
+    fuerza = evaluar_mano(cartas)
+    mejor_mano = tuple(cartas[i] for i in indices_mejor_mano(cartas, fuerza))
+    return (fuerza >> 20, valores_mano(fuerza), NOMBRES_MANO[fuerza >> 20]), mejor_mano
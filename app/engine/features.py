@@ -0,0 +1,156 @@
+# FEATURES DEL MODELO
+#
+# Construye la matriz de 17 columnas con la que se entrena y se usa el modelo a partir de las
+# columnas del dataset (engine.writer / engine.dataset), con operaciones vectorizadas y tablas de
+# consulta en lugar de apply/literal_eval por fila. El generador, el notebook de entrenamiento y
+# HandScreen.predict_hand usan estas mismas funciones, así que las entradas del modelo no pueden
+# diferir entre el entrenamiento y la App. matriz_features pasa siempre las cartas a su forma
+# canónica (palos renombrados y cartas del jugador y del flop ordenadas), tanto al entrenar con
+# cualquier dataset como al predecir, así que dos manos iguales salvo los palos o el orden
+# tienen las mismas features y reciben la misma predicción.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.features ../data/simulacion_montecarlo.pmd ../data/features.npz
+#   python -m engine.features ../data/simulacion_montecarlo.csv ../data/simulacion_montecarlo_procesado.csv
+
+import argparse
+import os
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_lote, cartas_mejores_manos, indices_mejores_manos
+from engine.cache import cartas_canonicas
+from engine.profiling import medir
+
+FEATURES = [
+    "carta_1", "carta_2", "num_rivales", "mano_preflop",
+    "flop_1", "flop_2", "flop_3", "mano_flop", "turn", "mano_turn",
+    "river", "mano_river",
+    "carta_final_1", "carta_final_2", "carta_final_3",
+    "carta_final_4", "carta_final_5"
+]
+
+# Código de cada categoría de mano (1 = Carta Alta ... 10 = Escalera Real) en las columnas
+# mano_flop, mano_turn y mano_river del modelo. El notebook de entrenamiento buscaba la clave
+# "Full" en lugar de "Full House", así que el modelo publicado (y su scaler) vio los Full House
+# como -1; lo mantenemos para que las entradas coincidan con las del entrenamiento.
+CODIGOS_MANO_MODELO = np.array([-1, 0, 1, 2, 3, 4, 5, -1, 7, 8, 9], dtype=np.int16)
+
+
+@medir("features.columnas")
+def columnas_situacion(cartas_jugador, num_rivales, comunitarias):
+    """Columnas del dataset (salvo el resultado) y fuerza final del jugador para cada mano.
+
+    cartas_jugador es (N, 2), num_rivales (N,) y comunitarias (N, 5), con la codificación
+    valor * 10 + palo.
+    """
+    cartas_jugador = np.asarray(cartas_jugador, dtype=np.uint8).reshape(-1, 2)
+    comunitarias = np.asarray(comunitarias, dtype=np.uint8).reshape(len(cartas_jugador), 5)
+
+    # Mano preflop: pareja, o carta alta suited/offsuit
+    valores, palos = cartas_jugador // 10, cartas_jugador % 10
+    mano_preflop = np.where(valores[:, 0] == valores[:, 1], 2, palos[:, 0] == palos[:, 1])
+
+    columnas = {
+        "cartas_jugador": cartas_jugador,
+        "num_rivales": np.broadcast_to(np.asarray(num_rivales, dtype=np.uint8), len(cartas_jugador)),
+        "mano_preflop": mano_preflop.astype(np.uint8),
+        "flop": comunitarias[:, :3],
+        "turn": comunitarias[:, 3],
+        "river": comunitarias[:, 4],
+    }
+
+    # Mejor mano del jugador en cada fase
+    for fase, num_comunitarias in (("flop", 3), ("turn", 4), ("river", 5)):
+        mano = np.concatenate([cartas_jugador, comunitarias[:, :num_comunitarias]], axis=1)
+        categorias, fuerzas, indices = evaluar_lote(mano)
+        columnas[f"mano_{fase}"] = categorias
+        columnas[f"cartas_{fase}"] = cartas_mejores_manos(mano, indices)
+    return columnas, fuerzas
+
+
+def columnas_canonicas(columnas):
+    """Columnas del dataset con las cartas en su forma canónica (engine.cache.cartas_canonicas).
+
+    Las categorías de cada fase no cambian al renombrar los palos y ordenar las cartas; las cinco
+    cartas finales se vuelven a elegir sobre las cartas canónicas, como en columnas_situacion.
+    """
+    cartas_jugador = np.asarray(columnas["cartas_jugador"], dtype=np.uint8)
+    comunitarias = np.concatenate([np.asarray(columnas["flop"], dtype=np.uint8), np.asarray(columnas["turn"], dtype=np.uint8)[:, None],
+                                   np.asarray(columnas["river"], dtype=np.uint8)[:, None]], axis=1)
+    jugador, canonicas = cartas_canonicas(cartas_jugador, comunitarias)
+    cambiadas = np.flatnonzero((jugador != cartas_jugador).any(axis=1) | (canonicas != comunitarias).any(axis=1))
+    if not len(cambiadas):
+        return columnas
+
+    cartas_river = np.array(columnas["cartas_river"], dtype=np.uint8)
+    mano = np.concatenate([jugador[cambiadas], canonicas[cambiadas]], axis=1)
+    cartas_river[cambiadas] = cartas_mejores_manos(mano, indices_mejores_manos(mano))
+    return {**columnas, "cartas_jugador": jugador, "flop": canonicas[:, :3], "turn": canonicas[:, 3],
+            "river": canonicas[:, 4], "cartas_river": cartas_river}
+
+
+def matriz_features(columnas):
+    """Matriz (N, 17) de features del modelo a partir de las columnas del dataset, con las cartas canónicas."""
+    columnas = columnas_canonicas(columnas)
+    num_manos = len(columnas["num_rivales"])
+    X = np.empty((num_manos, len(FEATURES)), dtype=np.int16)
+    X[:, 0:2] = columnas["cartas_jugador"]
+    X[:, 2] = columnas["num_rivales"]
+    X[:, 3] = columnas["mano_preflop"]
+    X[:, 4:7] = columnas["flop"]
+    X[:, 7] = CODIGOS_MANO_MODELO[columnas["mano_flop"]]
+    X[:, 8] = columnas["turn"]
+    X[:, 9] = CODIGOS_MANO_MODELO[columnas["mano_turn"]]
+    X[:, 10] = columnas["river"]
+    X[:, 11] = CODIGOS_MANO_MODELO[columnas["mano_river"]]
+    X[:, 12:17] = columnas["cartas_river"]
+    return X
+
+
+@medir("features.mano")
+def features_mano(cartas_jugador, num_rivales, comunitarias):
+    """Features de una o varias manos a partir de las cartas (códigos numéricos o en texto)."""
+    cartas_jugador = np.asarray(cartas_jugador, dtype=np.int64).astype(np.uint8)
+    comunitarias = np.asarray(comunitarias, dtype=np.int64).astype(np.uint8)
+    # Pasamos antes las cartas a su forma canónica para que matriz_features no tenga que volver a
+    # elegir las cartas finales
+    cartas_jugador, comunitarias = cartas_canonicas(cartas_jugador, comunitarias)
+    return matriz_features(columnas_situacion(cartas_jugador, num_rivales, comunitarias)[0])
+
+
+def cargar_features(ruta, tam_bloque=500000):
+    """Features (X) y resultado (y) de un dataset en formato .pmd o CSV."""
+    from engine.dataset import cargar_dataset, columnas_desde_csv
+
+    if not ruta.endswith(".csv"):
+        columnas = cargar_dataset(ruta)
+        return matriz_features(columnas), np.asarray(columnas["resultado"])
+
+    import pandas as pd
+
+    bloques = [columnas_desde_csv(df) for df in pd.read_csv(ruta, chunksize=tam_bloque)]
+    return (np.concatenate([matriz_features(columnas) for columnas in bloques]),
+            np.concatenate([columnas["resultado"] for columnas in bloques]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye la matriz de features del modelo a partir del dataset.")
+    parser.add_argument("entrada", help="Dataset en formato .pmd o CSV")
+    parser.add_argument("salida", help="Fichero .npz (X, y) o .csv (dataset procesado)")
+    args = parser.parse_args()
+
+    X, y = cargar_features(args.entrada)
+    if args.salida.endswith(".csv"):
+        import pandas as pd
+
+        df = pd.DataFrame(X, columns=FEATURES)
+        df["resultado"] = y
+        df.to_csv(args.salida, index=False)
+    else:
+        np.savez(args.salida, X=X, y=y, columnas=np.array(FEATURES))
+    print(f"Features guardadas en: {os.path.abspath(args.salida)} ({len(X):,} filas)")
+
+
+if __name__ == "__main__":
+    main()
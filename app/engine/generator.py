@@ -0,0 +1,207 @@
+# GENERADOR DEL DATASET MEDIANTE SIMULACIONES DE MONTE CARLO
+#
+# Versión paralela de simulacion_montecarlo (notebooks/dataset.ipynb). El trabajo se divide en
+# partes de tamaño fijo que se reparten entre un pool de procesos. Cada parte tiene su propio
+# generador aleatorio derivado de la semilla maestra (SeedSequence con el índice de la parte),
+# por lo que el resultado no depende del número de procesos ni del orden en el que terminan.
+# Cada parte se simula por lotes de tamaño fijo que se van escribiendo en disco con
+# engine.writer, así que la memoria no crece con el número de manos. Cada parte se da por
+# terminada al renombrar su carpeta y, si la ejecución se interrumpe, al relanzarla solo se
+# generan las partes que faltan.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.generator --manos 50000000 --destino ../data/partes --procesos 32
+#   python -m engine.generator --destino ../data/partes --unir ../data/simulacion_montecarlo.pmd
+
+import argparse
+import json
+import os
+import shutil
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas
+from engine.cards import BARAJA
+from engine.dataset import escribir_dataset
+from engine.features import columnas_situacion
+from engine.profiling import contar, tramo, volcar_proceso
+from engine.writer import EscritorColumnas, EscritorCSV, leer_columnas, iterar_lotes, TAM_GRUPO
+
+MAX_RIVALES = 8
+
+_BARAJA = np.array(BARAJA, dtype=np.uint8)
+
+
+# SIMULACIÓN
+
+def simular_manos(rng, num_manos):
+    """Simula num_manos manos completas y devuelve sus columnas como arrays de NumPy."""
+    # Barajamos cada fila por separado y repartimos: jugador, 8 rivales y 5 comunitarias
+    mazos = rng.permuted(np.tile(np.arange(52, dtype=np.uint8), (num_manos, 1)), axis=1)
+    cartas = _BARAJA[mazos[:, :2 + 2 * MAX_RIVALES + 5]]
+    cartas_jugador = cartas[:, :2]
+    rivales = cartas[:, 2:2 + 2 * MAX_RIVALES].reshape(num_manos, MAX_RIVALES, 2)
+    comunitarias = cartas[:, 2 + 2 * MAX_RIVALES:]
+    num_rivales = rng.integers(1, MAX_RIVALES + 1, num_manos).astype(np.uint8)
+    columnas, fuerza_jugador = columnas_situacion(cartas_jugador, num_rivales, comunitarias)
+
+    # Solo evaluamos los rivales que están en la mesa
+    activos = np.arange(MAX_RIVALES) < num_rivales[:, None]
+    manos_rivales = np.concatenate(
+        [rivales[activos], np.repeat(comunitarias, num_rivales.astype(np.intp), axis=0)], axis=1)
+    fuerzas_rivales = np.full((num_manos, MAX_RIVALES), -1, dtype=np.int32)
+    fuerzas_rivales[activos] = evaluar_fuerzas(manos_rivales)
+    mejor_rival = fuerzas_rivales.max(axis=1)
+
+    # Derrota si algún rival tiene mejor mano, empate si alguno la iguala y victoria en otro caso
+    columnas["resultado"] = np.select(
+        [mejor_rival > fuerza_jugador, mejor_rival == fuerza_jugador], [0, 1], 2).astype(np.uint8)
+    return columnas
+
+
+# GENERACIÓN POR PARTES
+
+def _ruta_parte(destino, indice):
+    return os.path.join(destino, f"parte_{indice:05d}")
+
+
+def generar_parte(destino, indice, num_manos, semilla, tam_lote=TAM_GRUPO):
+    """Genera y guarda una parte del dataset con su propio generador aleatorio."""
+    ruta = _ruta_parte(destino, indice)
+    rng = np.random.default_rng(np.random.SeedSequence(semilla, spawn_key=(indice,)))
+
+    # Escribimos en una carpeta temporal y la renombramos para que nunca quede una parte a medias
+    temporal = ruta + ".tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    with EscritorColumnas(temporal, tam_lote, metadatos={"semilla": semilla, "parte": indice}) as escritor:
+        for inicio in range(0, num_manos, tam_lote):
+            with tramo("generador.lote"):
+                columnas = simular_manos(rng, min(tam_lote, num_manos - inicio))
+            with tramo("generador.escritura"):
+                escritor.escribir(columnas)
+            contar("generador.manos", min(tam_lote, num_manos - inicio))
+    os.replace(temporal, ruta)
+    return indice
+
+
+def _generar_parte(argumentos):
+    indice = generar_parte(*argumentos)
+    volcar_proceso()
+    return indice
+
+
+def _comprobar_manifiesto(destino, manifiesto):
+    # Una ejecución solo se puede reanudar con los mismos parámetros
+    ruta = os.path.join(destino, "manifiesto.json")
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            anterior = json.load(f)
+        if anterior != manifiesto:
+            raise ValueError(f"{destino} contiene una ejecución con otros parámetros: {anterior}")
+    else:
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, indent=2)
+
+
+def generar_dataset(num_manos, destino, semilla=42, procesos=None, manos_por_parte=1000000, tam_lote=TAM_GRUPO):
+    """Genera num_manos manos repartidas en partes, reanudando las que ya estén guardadas."""
+    os.makedirs(destino, exist_ok=True)
+    _comprobar_manifiesto(destino, {
+        "num_manos": num_manos, "semilla": semilla, "manos_por_parte": manos_por_parte, "tam_lote": tam_lote})
+
+    num_partes = -(-num_manos // manos_por_parte)
+    pendientes = [
+        (destino, indice, min(manos_por_parte, num_manos - indice * manos_por_parte), semilla, tam_lote)
+        for indice in range(num_partes)
+        if not os.path.exists(_ruta_parte(destino, indice))
+    ]
+    if len(pendientes) < num_partes:
+        print(f"Reanudando: {num_partes - len(pendientes)} de {num_partes} partes ya generadas")
+
+    inicio = time.perf_counter()
+    with Pool(procesos) as pool:
+        for hechas, indice in enumerate(pool.imap_unordered(_generar_parte, pendientes), start=1):
+            print(f"Parte {indice} guardada ({hechas}/{len(pendientes)}, {time.perf_counter() - inicio:.1f} s)")
+
+    print(f"Dataset guardado en: {destino}")
+    return [_ruta_parte(destino, indice) for indice in range(num_partes)]
+
+
+def comprobar_partes(destino):
+    """Partes completas según el manifiesto y lista de problemas (partes que faltan o con otro número de manos)."""
+    with open(os.path.join(destino, "manifiesto.json"), encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    num_manos, manos_por_parte = manifiesto["num_manos"], manifiesto["manos_por_parte"]
+
+    partes, problemas = [], []
+    for indice in range(-(-num_manos // manos_por_parte)):
+        ruta = _ruta_parte(destino, indice)
+        esperadas = min(manos_por_parte, num_manos - indice * manos_por_parte)
+        if not os.path.exists(ruta):
+            problemas.append(f"falta {os.path.basename(ruta)}")
+            continue
+        encontradas = len(leer_columnas(ruta)["resultado"])
+        if encontradas != esperadas:
+            problemas.append(f"{os.path.basename(ruta)} tiene {encontradas:,} manos y se esperaban {esperadas:,}")
+        else:
+            partes.append(ruta)
+    return manifiesto, partes, problemas
+
+
+def unir_partes(destino, salida, tam_lote=TAM_GRUPO, parcial=False):
+    """Une las partes en un fichero .pmd, un CSV o una única carpeta de columnas según la extensión.
+
+    Si la generación no está completa (según el manifiesto) lanza ValueError, salvo con parcial,
+    que une solo las partes completas.
+    """
+    manifiesto, partes, problemas = comprobar_partes(destino)
+    semilla = manifiesto["semilla"]
+    if problemas:
+        resumen = "; ".join(problemas[:5]) + (f" y {len(problemas) - 5} más" if len(problemas) > 5 else "")
+        if not parcial:
+            raise ValueError(f"La generación de {destino} no está completa ({resumen}). "
+                             "Reanúdala o usa --parcial para unir solo las partes completas")
+        print(f"Uniendo {len(partes)} partes completas ({resumen})")
+
+    if salida.endswith(".pmd"):
+        escribir_dataset(salida, partes, semilla)
+        print(f"Dataset guardado en: {salida}")
+        return
+    if salida.endswith(".csv"):
+        escritor = EscritorCSV(salida)
+    else:
+        escritor = EscritorColumnas(salida, tam_lote, metadatos={"semilla": semilla})
+
+    # Copiamos bloque a bloque, sin cargar ninguna parte entera en memoria
+    with escritor:
+        for parte in partes:
+            for lote in iterar_lotes(leer_columnas(parte), tam_lote):
+                escritor.escribir(lote)
+    print(f"Dataset guardado en: {salida}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el dataset de Poker Mind mediante simulaciones de Monte Carlo.")
+    parser.add_argument("--manos", type=int, default=2000000, help="Número total de manos a simular")
+    parser.add_argument("--destino", default=os.path.join("..", "data", "partes"), help="Carpeta donde se guardan las partes")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla maestra")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--manos-por-parte", type=int, default=1000000, help="Manos que se guardan en cada parte")
+    parser.add_argument("--tam-lote", type=int, default=TAM_GRUPO, help="Manos que se simulan y escriben de cada vez")
+    parser.add_argument("--unir", metavar="SALIDA", help="Une las partes ya generadas en un .pmd, un CSV o una carpeta de columnas")
+    parser.add_argument("--parcial", action="store_true", help="Con --unir, une las partes completas aunque falten otras")
+    args = parser.parse_args()
+
+    try:
+        if args.unir:
+            unir_partes(args.destino, args.unir, args.tam_lote, args.parcial)
+        else:
+            generar_dataset(args.manos, args.destino, args.semilla, args.procesos, args.manos_por_parte, args.tam_lote)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    main()
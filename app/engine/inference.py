@@ -0,0 +1,206 @@
+# INFERENCIA DEL MODELO CON NUMPY
+#
+# La App solo necesita el paso hacia delante de la red (17 -> 1024 -> 512 -> 256 -> 128 -> 3),
+# que son unas pocas multiplicaciones de matrices. Para no cargar TensorFlow, exportamos el
+# modelo entrenado a un fichero .npz con los pesos de cada capa Dense y lo ejecutamos con NumPy.
+#
+# Al exportar se simplifica la red sin cambiar su resultado:
+#   - El MinMaxScaler (x * scale_ + min_) se integra en la primera capa Dense, así que el modelo
+#     recibe directamente las features sin escalar de engine.features.
+#   - Cada BatchNormalization (en inferencia, una transformación afín por neurona) se integra en
+#     los pesos y el sesgo de la capa Dense anterior.
+#   - Los Dropout no hacen nada en inferencia y se eliminan.
+#
+# Los pesos se pueden guardar cuantizados a int8 con una escala por neurona (cuantizar_modelo),
+# salvo los de la primera capa: el fichero ocupa cerca de la cuarta parte y ModeloNumpy los
+# vuelve a convertir a float32 al cargarlos.
+#
+# Uso (desde la carpeta app/, necesita TensorFlow solo para exportar):
+#   python -m engine.inference models/poker_model.keras models/scaler.pkl models/poker_model.npz
+#   python -m engine.inference --int8 models/poker_model.npz models/poker_model_int8.npz
+
+import argparse
+import os
+
+import numpy as np
+
+from engine.features import FEATURES
+from engine.profiling import contar, medir
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTA_MODELO = os.path.join(BASE_DIR, '..', 'models', 'poker_model.npz')
+RUTA_KERAS = os.path.join(BASE_DIR, '..', 'models', 'poker_model.keras')
+RUTA_SCALER = os.path.join(BASE_DIR, '..', 'models', 'scaler.pkl')
+
+CLASES = ['Derrota', 'Empate', 'Victoria']
+
+# Diferencia máxima admitida entre las probabilidades de Keras y las de NumPy al exportar
+TOLERANCIA = 1e-4
+
+
+# EXPORTACIÓN
+
+def _capas_densas(modelo):
+    # Recorre las capas de Keras y devuelve [(pesos, sesgo, pendiente de la activación)]
+    capas = []
+    for capa in modelo.layers:
+        tipo = type(capa).__name__
+        configuracion = capa.get_config()
+        if tipo == "Dense":
+            pesos, sesgo = (np.asarray(w, dtype=np.float64) for w in capa.get_weights())
+            activacion = configuracion.get("activation", "linear")
+            capas.append([pesos, sesgo, 0.0 if activacion == "relu" else None, activacion])
+        elif tipo == "BatchNormalization":
+            # gamma * (x - media) / sqrt(varianza + epsilon) + beta
+            if capas[-1][3] != "linear":
+                raise ValueError("Solo se puede integrar una BatchNormalization que sigue a una capa Dense sin activación")
+            gamma, beta, media, varianza = (np.asarray(w, dtype=np.float64) for w in capa.get_weights())
+            factor = gamma / np.sqrt(varianza + configuracion["epsilon"])
+            capas[-1][0] = capas[-1][0] * factor
+            capas[-1][1] = (capas[-1][1] - media) * factor + beta
+        elif tipo == "LeakyReLU":
+            capas[-1][2] = configuracion.get("negative_slope", configuracion.get("alpha"))
+        elif tipo == "ReLU":
+            capas[-1][2] = 0.0
+        elif tipo not in ("Dropout", "InputLayer"):
+            raise ValueError(f"Capa no soportada: {tipo}")
+    return capas
+
+
+def exportar_modelo(modelo, scaler, ruta=RUTA_MODELO):
+    """Exporta un modelo de Keras y su MinMaxScaler a un fichero .npz para ModeloNumpy."""
+    capas = _capas_densas(modelo)
+    if capas[-1][3] != "softmax":
+        raise ValueError("La última capa del modelo debe tener activación softmax")
+
+    # Integramos el escalado en la primera capa: (x * s + m) @ W + b = x @ (s * W) + (m @ W + b)
+    escala, minimo = np.asarray(scaler.scale_, dtype=np.float64), np.asarray(scaler.min_, dtype=np.float64)
+    pesos, sesgo = capas[0][0], capas[0][1]
+    capas[0][0], capas[0][1] = escala[:, None] * pesos, minimo @ pesos + sesgo
+
+    return guardar_pesos(ruta, [c[0] for c in capas], [c[1] for c in capas], [c[2] for c in capas[:-1]],
+                         list(getattr(scaler, "feature_names_in_", FEATURES)))
+
+
+def cuantizar_int8(pesos):
+    """Pesos int8 y escala float32 por neurona de salida (simétrica: pesos ≈ int8 * escala)."""
+    escala = np.abs(pesos).max(axis=0) / 127
+    escala[escala == 0] = 1
+    return np.round(pesos / escala).astype(np.int8), escala.astype(np.float32)
+
+
+def guardar_pesos(ruta, pesos, sesgos, pendientes, columnas=FEATURES, int8=False):
+    """Guarda las capas Dense (la última con softmax) en el formato .npz de ModeloNumpy, opcionalmente en int8.
+
+    La primera capa queda siempre en float32: lleva integrado el escalado, así que sus pesos tienen
+    magnitudes muy distintas para cada feature, y es la más pequeña.
+    """
+    arrays = {"columnas": np.array(list(columnas))}
+    for i, (capa, sesgo) in enumerate(zip(pesos, sesgos)):
+        if int8 and i > 0:
+            arrays[f"pesos_{i}"], arrays[f"escala_{i}"] = cuantizar_int8(np.asarray(capa, dtype=np.float64))
+        else:
+            arrays[f"pesos_{i}"] = np.asarray(capa, dtype=np.float32)
+        arrays[f"sesgo_{i}"] = np.asarray(sesgo, dtype=np.float32)
+    arrays["pendientes"] = np.array([p if p is not None else np.nan for p in pendientes], dtype=np.float32)
+    np.savez(ruta, **arrays)
+    return ruta
+
+
+def cuantizar_modelo(ruta, ruta_salida):
+    """Guarda una copia del modelo exportado con los pesos en int8."""
+    modelo = ModeloNumpy(ruta)
+    pendientes = [None if np.isnan(p) else p for p in modelo.pendientes]
+    return guardar_pesos(ruta_salida, modelo.pesos, modelo.sesgos, pendientes, modelo.columnas, int8=True)
+
+
+def comprobar_exportacion(modelo, scaler, ruta=RUTA_MODELO, num_filas=2000, semilla=0):
+    """Diferencia máxima entre model.predict y ModeloNumpy en filas aleatorias dentro del rango del scaler."""
+    rng = np.random.default_rng(semilla)
+    X = rng.uniform(scaler.data_min_, scaler.data_max_, (num_filas, len(scaler.data_min_))).round()
+    esperado = modelo.predict(scaler.transform(X), verbose=0)
+    return float(np.abs(ModeloNumpy(ruta).predecir(X) - esperado).max())
+
+
+def exportar_desde_ficheros(ruta_keras, ruta_scaler, ruta=RUTA_MODELO):
+    """Carga el modelo de Keras y el scaler, los exporta y comprueba que el resultado coincide."""
+    import joblib
+    from keras.models import load_model  # type: ignore
+
+    modelo = load_model(ruta_keras)
+    scaler = joblib.load(ruta_scaler)
+    exportar_modelo(modelo, scaler, ruta)
+    diferencia = comprobar_exportacion(modelo, scaler, ruta)
+    if diferencia > TOLERANCIA:
+        os.remove(ruta)
+        raise ValueError(f"El modelo exportado no coincide con el de Keras (diferencia máxima {diferencia:.2e})")
+    return diferencia
+
+
+# INFERENCIA
+
+class ModeloNumpy:
+    """Paso hacia delante del modelo exportado, con NumPy y sin TensorFlow."""
+
+    def __init__(self, ruta=RUTA_MODELO):
+        with np.load(ruta) as datos:
+            self.columnas = list(datos["columnas"])
+            num_capas = sum(1 for nombre in datos.files if nombre.startswith("pesos_"))
+            # Los pesos int8 se convierten a float32 con su escala por neurona
+            self.int8 = any(nombre.startswith("escala_") for nombre in datos.files)
+            self.pesos = [datos[f"pesos_{i}"].astype(np.float32) * datos[f"escala_{i}"] if f"escala_{i}" in datos.files
+                          else datos[f"pesos_{i}"] for i in range(num_capas)]
+            self.sesgos = [datos[f"sesgo_{i}"] for i in range(num_capas)]
+            self.pendientes = [float(p) for p in datos["pendientes"]]
+
+    @medir("modelo.predecir")
+    def predecir(self, X):
+        """Probabilidades (N, 3) de derrota, empate y victoria para las features sin escalar (N, 17)."""
+        h = np.asarray(X, dtype=np.float32).reshape(-1, len(self.columnas))
+        contar("modelo.filas", len(h))
+        for pesos, sesgo, pendiente in zip(self.pesos[:-1], self.sesgos[:-1], self.pendientes):
+            h = h @ pesos + sesgo
+            if not np.isnan(pendiente):
+                h = np.where(h > 0, h, h * pendiente)
+
+        # Softmax de la última capa
+        h = h @ self.pesos[-1] + self.sesgos[-1]
+        h = np.exp(h - h.max(axis=1, keepdims=True))
+        return h / h.sum(axis=1, keepdims=True)
+
+    def predict(self, X, verbose=0):
+        # Misma interfaz que model.predict de Keras
+        return self.predecir(X)
+
+
+def cargar_modelo(ruta=RUTA_MODELO, ruta_keras=RUTA_KERAS, ruta_scaler=RUTA_SCALER):
+    """Carga el modelo exportado, exportándolo antes si falta o si el de Keras o el scaler son más recientes."""
+    # Sin el scaler no se puede exportar, así que se usa el modelo ya exportado si lo hay
+    if os.path.exists(ruta_keras) and os.path.exists(ruta_scaler):
+        if not os.path.exists(ruta) or os.path.getmtime(ruta) < max(os.path.getmtime(ruta_keras), os.path.getmtime(ruta_scaler)):
+            exportar_desde_ficheros(ruta_keras, ruta_scaler, ruta)
+    elif os.path.exists(ruta_keras) and not os.path.exists(ruta):
+        raise ValueError(f"No se puede exportar {ruta_keras} sin el scaler ({ruta_scaler}) y no hay un modelo exportado en {ruta}")
+    return ModeloNumpy(ruta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el modelo de Keras a pesos de NumPy (.npz) para la App.")
+    parser.add_argument("modelo", nargs="?", default=RUTA_KERAS, help="Modelo de Keras (.keras)")
+    parser.add_argument("scaler", nargs="?", default=RUTA_SCALER, help="MinMaxScaler guardado con joblib (.pkl)")
+    parser.add_argument("salida", nargs="?", default=RUTA_MODELO, help="Fichero .npz de salida")
+    parser.add_argument("--int8", nargs=2, metavar=("NPZ", "SALIDA"), help="Guarda en SALIDA una copia del modelo NPZ con los pesos en int8")
+    args = parser.parse_args()
+
+    if args.int8:
+        entrada, salida = args.int8
+        cuantizar_modelo(entrada, salida)
+        print(f"Modelo int8 guardado en: {os.path.abspath(salida)} ({os.path.getsize(salida) / 1024:,.0f} KB)")
+        return
+
+    diferencia = exportar_desde_ficheros(args.modelo, args.scaler, args.salida)
+    print(f"Modelo exportado en: {os.path.abspath(args.salida)} (diferencia máxima con Keras: {diferencia:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# TABLA DE EQUITY PREFLOP
+#
+# Antes del flop la mano del jugador solo depende de los valores de sus dos cartas y de si son
+# del mismo palo, así que hay 169 manos iniciales distintas (13 parejas, 78 suited y 78 offsuit).
+# Este módulo calcula offline la probabilidad de victoria y empate de cada una contra 1..8
+# rivales y la guarda en una tabla pequeña (models/equity_preflop.npz) que la App consulta al
+# instante, sin modelo ni simulación.
+#
+# Las manos se ordenan como en la matriz habitual de 13 x 13 (de As a 2): la diagonal son las
+# parejas, por encima quedan las suited y por debajo las offsuit. En cada simulación se reparten
+# el tablero y las manos de 8 rivales, y el resultado contra r rivales se obtiene con los r
+# primeros, así que cada reparto sirve para las 8 columnas de la tabla.
+#
+# Con --error la tabla se calcula por estratos (mano inicial x número de rivales) y cada mano deja
+# de simularse cuando todas sus casillas alcanzan ese error (semiamplitud del intervalo de
+# confianza del 95 %), en lugar de simular el mismo número de manos para todas. Además, los
+# asientos de los rivales son intercambiables: en lugar de usar los r primeros rivales del
+# reparto, cada reparto aporta la probabilidad exacta de ganar o empatar contra r rivales elegidos
+# al azar entre los repartidos, que tiene la misma media y menos varianza (Rao-Blackwell), y el
+# error se calcula con la varianza observada en cada estrato. Las manos fuertes contra muchos
+# rivales o las débiles contra pocos convergen con muchas menos simulaciones.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.preflop --simulaciones 1000000
+#   python -m engine.preflop --error 0.001
+#   python -m engine.preflop --mano A♠ K♠ --rivales 3
+
+import argparse
+import math
+import os
+import time
+from functools import lru_cache
+from multiprocessing import Pool
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas
+from engine.cards import BARAJA, VALORES_TEXTO, carta_a_numero
+from engine.equity import resultado_equity, Z_95
+
+RUTA_TABLA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'equity_preflop.npz')
+
+MAX_RIVALES = 8
+NUM_MANOS_INICIALES = 169
+
+# Las probabilidades se guardan como uint16 en unidades de 1 / ESCALA
+ESCALA = 65535
+
+_BARAJA = np.array(BARAJA, dtype=np.uint8)
+
+
+# MANOS INICIALES
+
+def indice_mano_inicial(carta_1, carta_2):
+    """Posición (0..168) de la mano inicial en la matriz 13 x 13."""
+    carta_1, carta_2 = int(carta_1), int(carta_2)
+    alta, baja = max(carta_1 // 10, carta_2 // 10), min(carta_1 // 10, carta_2 // 10)
+    if carta_1 % 10 == carta_2 % 10:
+        return (14 - alta) * 13 + (14 - baja)
+    return (14 - baja) * 13 + (14 - alta)
+
+
+def indices_manos_iniciales(cartas):
+    """Versión vectorizada de indice_mano_inicial para una matriz (N, 2) de códigos."""
+    cartas = np.asarray(cartas, dtype=np.int64).reshape(-1, 2)
+    valores, palos = cartas // 10, cartas % 10
+    alta, baja = 14 - valores.max(axis=1), 14 - valores.min(axis=1)
+    suited = palos[:, 0] == palos[:, 1]
+    return np.where(suited, alta * 13 + baja, baja * 13 + alta)
+
+
+def nombre_mano_inicial(indice):
+    """Nombre de la mano inicial ("AA", "AKs", "72o"...)."""
+    fila, columna = divmod(indice, 13)
+    alta, baja = VALORES_TEXTO[14 - min(fila, columna)], VALORES_TEXTO[14 - max(fila, columna)]
+    alta, baja = alta.replace('10', 'T'), baja.replace('10', 'T')
+    if fila == columna:
+        return alta + baja
+    return alta + baja + ('s' if fila < columna else 'o')
+
+
+def mano_representativa(indice):
+    """Dos cartas concretas (códigos) de la mano inicial."""
+    fila, columna = divmod(indice, 13)
+    if fila <= columna:
+        # Pareja (palos distintos) o suited (mismo palo)
+        return (14 - fila) * 10 + 1, (14 - columna) * 10 + (2 if fila == columna else 1)
+    return (14 - columna) * 10 + 1, (14 - fila) * 10 + 2
+
+
+# CÁLCULO DE LA TABLA
+
+def _simular_mano_inicial(argumentos):
+    indice, num_simulaciones, semilla = argumentos
+    rng = np.random.default_rng(semilla)
+    jugador = np.array(mano_representativa(indice), dtype=np.uint8)
+    desconocidas = _BARAJA[~np.isin(_BARAJA, jugador)]
+
+    # Tablero y manos de los 8 rivales
+    reparto = desconocidas[rng.permuted(np.tile(np.arange(len(desconocidas), dtype=np.uint8), (num_simulaciones, 1)), axis=1)]
+    tablero = reparto[:, :5]
+    rivales = reparto[:, 5:5 + 2 * MAX_RIVALES].reshape(num_simulaciones, MAX_RIVALES, 2)
+
+    fuerza_jugador = evaluar_fuerzas(np.concatenate([np.broadcast_to(jugador, (num_simulaciones, 2)), tablero], axis=1))
+    manos_rivales = np.concatenate([rivales, np.broadcast_to(tablero[:, None, :], (num_simulaciones, MAX_RIVALES, 5))], axis=2)
+    fuerzas_rivales = evaluar_fuerzas(manos_rivales.reshape(-1, 7)).reshape(num_simulaciones, MAX_RIVALES)
+
+    # Mejor mano entre los r primeros rivales, para r = 1..8
+    mejor_rival = np.maximum.accumulate(fuerzas_rivales, axis=1)
+    victorias = (mejor_rival < fuerza_jugador[:, None]).sum(axis=0)
+    empates = (mejor_rival == fuerza_jugador[:, None]).sum(axis=0)
+    return indice, victorias, empates
+
+
+def calcular_tabla(num_simulaciones=1000000, semilla=42, procesos=None, tam_lote=50000):
+    """Victorias y empates (169, 8, 2) de cada mano inicial contra 1..8 rivales, por Monte Carlo."""
+    tareas = [
+        (indice, min(tam_lote, num_simulaciones - inicio), np.random.SeedSequence(semilla, spawn_key=(indice, inicio // tam_lote)))
+        for indice in range(NUM_MANOS_INICIALES)
+        for inicio in range(0, num_simulaciones, tam_lote)
+    ]
+    conteos = np.zeros((NUM_MANOS_INICIALES, MAX_RIVALES, 2), dtype=np.int64)
+
+    inicio = time.perf_counter()
+    with Pool(procesos) as pool:
+        for hechas, (indice, victorias, empates) in enumerate(pool.imap_unordered(_simular_mano_inicial, tareas), start=1):
+            conteos[indice, :, 0] += victorias
+            conteos[indice, :, 1] += empates
+            if hechas % 100 == 0 or hechas == len(tareas):
+                print(f"{hechas}/{len(tareas)} lotes ({time.perf_counter() - inicio:.1f} s)")
+    return conteos
+
+
+# CÁLCULO ESTRATIFICADO CON PARADA POR CONVERGENCIA
+
+# Combinaciones C(n, k) para repartir los asientos de los rivales
+_COMBINACIONES = np.array([[math.comb(n, k) for k in range(MAX_RIVALES + 1)] for n in range(MAX_RIVALES + 1)], dtype=np.float64)
+
+
+def probabilidades_asientos(fuerza_jugador, fuerzas_rivales):
+    """Probabilidades (N, R, 3) de derrota, empate y victoria contra r = 1..R rivales elegidos al azar de los R repartidos."""
+    num_rivales = fuerzas_rivales.shape[1]
+    mejores = (fuerzas_rivales > fuerza_jugador[:, None]).sum(axis=1)
+    iguales = (fuerzas_rivales == fuerza_jugador[:, None]).sum(axis=1)
+
+    # Victoria si los r rivales están entre los peores y empate si además alguno iguala al jugador
+    r = np.arange(1, num_rivales + 1)
+    total = _COMBINACIONES[num_rivales, r]
+    victoria = _COMBINACIONES[(num_rivales - mejores - iguales)[:, None], r] / total
+    empate = _COMBINACIONES[(num_rivales - mejores)[:, None], r] / total - victoria
+    return np.stack([1 - victoria - empate, empate, victoria], axis=2)
+
+
+def _simular_estrato(argumentos):
+    indice, num_simulaciones, num_rivales, semilla = argumentos
+    rng = np.random.default_rng(semilla)
+    jugador = np.array(mano_representativa(indice), dtype=np.uint8)
+    desconocidas = _BARAJA[~np.isin(_BARAJA, jugador)]
+
+    # Solo se reparten los rivales que necesitan los estratos sin terminar de esta mano
+    reparto = desconocidas[rng.permuted(np.tile(np.arange(len(desconocidas), dtype=np.uint8), (num_simulaciones, 1)), axis=1)]
+    tablero = reparto[:, :5]
+    rivales = reparto[:, 5:5 + 2 * num_rivales].reshape(num_simulaciones, num_rivales, 2)
+
+    fuerza_jugador = evaluar_fuerzas(np.concatenate([np.broadcast_to(jugador, (num_simulaciones, 2)), tablero], axis=1))
+    manos_rivales = np.concatenate([rivales, np.broadcast_to(tablero[:, None, :], (num_simulaciones, num_rivales, 5))], axis=2)
+    fuerzas_rivales = evaluar_fuerzas(manos_rivales.reshape(-1, 7)).reshape(num_simulaciones, num_rivales)
+
+    probabilidades = probabilidades_asientos(fuerza_jugador, fuerzas_rivales)
+    return indice, num_simulaciones, probabilidades.sum(axis=0), (probabilidades ** 2).sum(axis=0)
+
+
+def errores_estratos(sumas, cuadrados, simulaciones):
+    """Semiamplitud (169, 8) del intervalo de confianza del 95 % de la probabilidad menos precisa de cada estrato."""
+    n = np.maximum(simulaciones, 1)[..., None]
+    varianza = np.maximum(cuadrados / n - (sumas / n) ** 2, 0)
+    return Z_95 * np.sqrt(varianza / n).max(axis=-1)
+
+
+def calcular_tabla_estratificada(error_objetivo=0.001, semilla=42, procesos=None, min_simulaciones=20000,
+                                 max_simulaciones=1000000, tam_lote=50000):
+    """Victorias y empates esperados (169, 8, 2), simulaciones (169, 8) y errores (169, 8) por estratos.
+
+    Cada ronda simula un lote más de las manos con algún estrato por encima de error_objetivo,
+    hasta max_simulaciones. El lote se ajusta a las simulaciones que faltan según la varianza
+    observada, y cada lote tiene su semilla (mano y ronda), así que el resultado no depende del
+    número de procesos.
+    """
+    sumas = np.zeros((NUM_MANOS_INICIALES, MAX_RIVALES, 3))
+    cuadrados = np.zeros((NUM_MANOS_INICIALES, MAX_RIVALES, 3))
+    simulaciones = np.zeros((NUM_MANOS_INICIALES, MAX_RIVALES), dtype=np.int64)
+    rivales = np.arange(1, MAX_RIVALES + 1)
+
+    inicio = time.perf_counter()
+    with Pool(procesos) as pool:
+        ronda = 0
+        while True:
+            errores = errores_estratos(sumas, cuadrados, simulaciones)
+            pendientes = ((errores > error_objetivo) | (simulaciones < min_simulaciones)) & (simulaciones < max_simulaciones)
+            if not pendientes.any():
+                break
+
+            tareas = []
+            for indice in np.flatnonzero(pendientes.any(axis=1)):
+                # Simulaciones que faltan para el estrato más lejano, si la varianza se mantiene
+                hechas = int(simulaciones[indice].max())
+                necesarias = int(np.ceil(hechas * (errores[indice] / error_objetivo).max() ** 2)) if hechas else min_simulaciones
+                lote = int(np.clip(necesarias - hechas, min_simulaciones // 4, tam_lote))
+                lote = min(lote, max_simulaciones - hechas)
+                num_rivales = int(rivales[pendientes[indice]].max())
+                tareas.append((int(indice), lote, num_rivales, np.random.SeedSequence(semilla, spawn_key=(int(indice), ronda))))
+
+            for indice, n, suma, cuadrado in pool.imap_unordered(_simular_estrato, tareas):
+                r = suma.shape[0]
+                sumas[indice, :r] += suma
+                cuadrados[indice, :r] += cuadrado
+                simulaciones[indice, :r] += n
+            ronda += 1
+            print(f"Ronda {ronda}: {len(tareas)} manos simuladas, {int(pendientes.sum())} estratos pendientes, "
+                  f"{int(simulaciones[:, 0].sum()):,} repartos ({time.perf_counter() - inicio:.1f} s)")
+
+    return sumas[..., [2, 1]], simulaciones, errores_estratos(sumas, cuadrados, simulaciones)
+
+
+def guardar_tabla(conteos, num_simulaciones, semilla, ruta=RUTA_TABLA, errores=None):
+    """Guarda la tabla con las probabilidades en uint16 (las simulaciones y los errores pueden ser por estrato)."""
+    probabilidades = np.rint(conteos / np.asarray(num_simulaciones)[..., None] * ESCALA).astype(np.uint16)
+    extra = {} if errores is None else {"errores": errores.astype(np.float32)}
+    np.savez(ruta, probabilidades=probabilidades, simulaciones=num_simulaciones, semilla=semilla,
+             manos=np.array([nombre_mano_inicial(i) for i in range(NUM_MANOS_INICIALES)]), **extra)
+
+
+# CONSULTA
+
+@lru_cache(maxsize=None)
+def cargar_tabla(ruta=RUTA_TABLA):
+    """Probabilidades (169, 8, 2) de victoria y empate, simulaciones (169, 8) y errores (169, 8) o None de la tabla."""
+    with np.load(ruta) as datos:
+        probabilidades = datos["probabilidades"] / ESCALA
+        simulaciones = np.broadcast_to(datos["simulaciones"], probabilidades.shape[:2])
+        errores = datos["errores"].astype(np.float64) if "errores" in datos else None
+        return probabilidades, simulaciones, errores
+
+
+def equity_preflop(carta_1, carta_2, num_rivales):
+    """Equity de la mano inicial contra num_rivales rivales, consultando la tabla."""
+    probabilidades, simulaciones, errores = cargar_tabla()
+    estrato = indice_mano_inicial(carta_1, carta_2), num_rivales - 1
+    victoria, empate = probabilidades[estrato]
+    derrota = max(0.0, 1 - victoria - empate)
+    simulaciones = int(simulaciones[estrato])
+    if errores is not None:
+        error = errores[estrato]
+    else:
+        error = Z_95 * np.sqrt(np.array([victoria, empate, derrota]) * (1 - np.array([victoria, empate, derrota])) / simulaciones).max()
+    return resultado_equity(victoria * simulaciones, empate * simulaciones, simulaciones, False, float(error))
+
+
+def equity_preflop_lote(cartas, num_rivales):
+    """Probabilidades (N, 3) de derrota, empate y victoria para una matriz (N, 2) de cartas."""
+    probabilidades, _, _ = cargar_tabla()
+    filas = probabilidades[indices_manos_iniciales(cartas), np.asarray(num_rivales) - 1]
+    return np.column_stack([1 - filas.sum(axis=1), filas[:, 1], filas[:, 0]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula o consulta la tabla de equity preflop de las 169 manos iniciales.")
+    parser.add_argument("--simulaciones", type=int, default=1000000, help="Simulaciones por mano inicial (máximo con --error)")
+    parser.add_argument("--error", type=float, default=None,
+                        help="Calcula por estratos hasta este error (IC 95 %%) en cada mano y número de rivales")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla maestra")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--salida", default=RUTA_TABLA, help="Fichero .npz de la tabla")
+    parser.add_argument("--mano", nargs=2, help="Consulta la equity de dos cartas (por ejemplo A♠ K♠) en lugar de calcular la tabla")
+    parser.add_argument("--rivales", type=int, default=1, help="Número de rivales de la consulta")
+    args = parser.parse_args()
+
+    if args.mano:
+        if not 1 <= args.rivales <= MAX_RIVALES:
+            parser.error(f"El número de rivales debe estar entre 1 y {MAX_RIVALES}")
+        try:
+            cartas = [carta_a_numero(carta) for carta in args.mano]
+        except KeyError as error:
+            parser.error(f"Carta no válida: {error}")
+        if cartas[0] == cartas[1]:
+            parser.error("Hay cartas repetidas")
+        resultado = equity_preflop(*cartas, args.rivales)
+        print(f"{nombre_mano_inicial(indice_mano_inicial(*cartas))} contra {args.rivales} rivales: "
+              f"Derrota: {resultado['Derrota']:.2%} | Empate: {resultado['Empate']:.2%} | Victoria: {resultado['Victoria']:.2%}")
+        return
+
+    if args.error:
+        conteos, simulaciones, errores = calcular_tabla_estratificada(args.error, args.semilla, args.procesos,
+                                                                      max_simulaciones=args.simulaciones)
+        guardar_tabla(conteos, simulaciones, args.semilla, args.salida, errores)
+        print(f"{int(simulaciones[:, 0].sum()):,} repartos (sin estratos: {args.simulaciones * NUM_MANOS_INICIALES:,}), "
+              f"error máximo {errores.max():.4f}")
+    else:
+        conteos = calcular_tabla(args.simulaciones, args.semilla, args.procesos)
+        guardar_tabla(conteos, args.simulaciones, args.semilla, args.salida)
+    print(f"Tabla guardada en: {os.path.abspath(args.salida)}")
+
+
+if __name__ == "__main__":
+    main()
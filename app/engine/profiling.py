@@ -0,0 +1,359 @@
+# PERFILADO CON TRAMOS Y CONTADORES
+#
+# Instrumentación ligera para ver en qué se va el tiempo de la App y de los procesos por lotes.
+# El código marca tramos con nombre (with tramo("modelo.predecir"): o el decorador medir) y
+# contadores (contar("evaluador.manos", n)). Mientras el perfilado está desactivado, tramo
+# devuelve siempre el mismo objeto vacío y contar no hace nada, así que el coste es el de una
+# llamada a función.
+#
+# Se activa con la variable de entorno POKERMIND_PERFIL (ruta del fichero de salida) o con
+# activar(ruta), por ejemplo con la opción --perfil de la App. Al terminar se guarda, para cada
+# tramo, el número de llamadas, el tiempo total y el propio (sin los tramos anidados), los
+# percentiles y un histograma de duraciones:
+#   - .json: tramos, histogramas y contadores.
+#   - .prof: formato de cProfile/pstats, con cada tramo como una función y sus tramos padre como
+#     llamadores, para verlo con python -m pstats o con snakeviz.
+# Los procesos hijos (pools del generador o del entrenamiento) guardan sus tramos en ficheros
+# parciales que el proceso principal suma a la salida al terminar.
+#
+# Uso (desde la carpeta app/):
+#   python app.py --perfil ../perfil.json
+#   POKERMIND_PERFIL=../perfil.prof python -m engine.generator --manos 1000000 --destino ../data/partes
+#   python -m engine.profiling ../perfil.json
+
+import argparse
+import atexit
+import functools
+import glob
+import json
+import marshal
+import os
+import threading
+import time
+from collections import defaultdict
+
+VARIABLE = "POKERMIND_PERFIL"
+VARIABLE_PID = "POKERMIND_PERFIL_PID"
+
+_activo = False
+_ruta = None
+_pid_principal = None
+_bloqueo = threading.Lock()
+_local = threading.local()
+_tramos = {}
+_contadores = defaultdict(int)
+
+
+# HISTOGRAMAS
+
+def _cubeta(ns):
+    # Cuatro cubetas por potencia de 2 (25 % de resolución)
+    bits = ns.bit_length()
+    if bits < 3:
+        return ns
+    return (bits - 2) * 4 + ((ns >> (bits - 3)) & 3)
+
+
+def _limite_cubeta(cubeta):
+    # Duración mínima (ns) de la cubeta
+    if cubeta < 4:
+        return cubeta
+    return (4 + cubeta % 4) << (cubeta // 4 - 1)
+
+
+class _Estadistica:
+    def __init__(self):
+        self.llamadas = 0
+        self.total = 0
+        self.propio = 0
+        self.minimo = None
+        self.maximo = 0
+        self.cubetas = defaultdict(int)
+        # Tramo padre -> [llamadas, total, propio]
+        self.padres = defaultdict(lambda: [0, 0, 0])
+
+    def registrar(self, duracion, propio, padre, recursivo):
+        self.llamadas += 1
+        self.propio += propio
+        # En los tramos anidados dentro de sí mismos solo cuenta el tiempo del más externo
+        if not recursivo:
+            self.total += duracion
+        self.minimo = duracion if self.minimo is None else min(self.minimo, duracion)
+        self.maximo = max(self.maximo, duracion)
+        self.cubetas[_cubeta(duracion)] += 1
+        if padre is not None:
+            llamadas = self.padres[padre]
+            llamadas[0] += 1
+            llamadas[1] += 0 if recursivo else duracion
+            llamadas[2] += propio
+
+    def percentil(self, p):
+        objetivo = p * self.llamadas
+        acumuladas = 0
+        for cubeta in sorted(self.cubetas):
+            acumuladas += self.cubetas[cubeta]
+            if acumuladas >= objetivo:
+                # Límite superior de la cubeta, acotado por las duraciones mínima y máxima
+                return min(max(_limite_cubeta(cubeta + 1), self.minimo or 0), self.maximo)
+        return self.maximo
+
+    def a_dict(self):
+        return {
+            "llamadas": self.llamadas,
+            "total_ms": self.total / 1e6,
+            "propio_ms": self.propio / 1e6,
+            "media_ms": self.total / self.llamadas / 1e6 if self.llamadas else 0.0,
+            "min_ms": (self.minimo or 0) / 1e6,
+            "max_ms": self.maximo / 1e6,
+            "p50_ms": self.percentil(0.5) / 1e6,
+            "p90_ms": self.percentil(0.9) / 1e6,
+            "p99_ms": self.percentil(0.99) / 1e6,
+            "histograma": [[_limite_cubeta(cubeta) / 1e6, n] for cubeta, n in sorted(self.cubetas.items())],
+            "padres": {padre: {"llamadas": n, "total_ms": total / 1e6, "propio_ms": propio / 1e6}
+                       for padre, (n, total, propio) in self.padres.items()},
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        estadistica = cls()
+        estadistica.llamadas = datos["llamadas"]
+        estadistica.total = round(datos["total_ms"] * 1e6)
+        estadistica.propio = round(datos["propio_ms"] * 1e6)
+        estadistica.minimo = round(datos["min_ms"] * 1e6)
+        estadistica.maximo = round(datos["max_ms"] * 1e6)
+        for limite, n in datos["histograma"]:
+            estadistica.cubetas[_cubeta(round(limite * 1e6))] += n
+        for padre, llamadas in datos["padres"].items():
+            estadistica.padres[padre] = [llamadas["llamadas"], round(llamadas["total_ms"] * 1e6), round(llamadas["propio_ms"] * 1e6)]
+        return estadistica
+
+    def sumar(self, otra):
+        self.llamadas += otra.llamadas
+        self.total += otra.total
+        self.propio += otra.propio
+        if otra.minimo is not None:
+            self.minimo = otra.minimo if self.minimo is None else min(self.minimo, otra.minimo)
+        self.maximo = max(self.maximo, otra.maximo)
+        for cubeta, n in otra.cubetas.items():
+            self.cubetas[cubeta] += n
+        for padre, llamadas in otra.padres.items():
+            self.padres[padre] = [a + b for a, b in zip(self.padres[padre], llamadas)]
+
+
+# TRAMOS Y CONTADORES
+
+class _TramoVacio:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        return False
+
+
+_VACIO = _TramoVacio()
+
+
+class _Tramo:
+    __slots__ = ("nombre", "inicio", "hijos")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        pila = getattr(_local, "pila", None)
+        if pila is None:
+            pila = _local.pila = []
+        pila.append(self)
+        self.hijos = 0
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        duracion = time.perf_counter_ns() - self.inicio
+        pila = _local.pila
+        pila.pop()
+        padre = pila[-1] if pila else None
+        if padre is not None:
+            padre.hijos += duracion
+        recursivo = any(tramo.nombre == self.nombre for tramo in pila)
+        with _bloqueo:
+            estadistica = _tramos.get(self.nombre)
+            if estadistica is None:
+                estadistica = _tramos[self.nombre] = _Estadistica()
+            estadistica.registrar(duracion, duracion - self.hijos, padre.nombre if padre else None, recursivo)
+        return False
+
+
+def tramo(nombre):
+    """Contexto que mide el tiempo del bloque con ese nombre (no hace nada si el perfilado está desactivado)."""
+    return _Tramo(nombre) if _activo else _VACIO
+
+
+def medir(nombre):
+    """Decorador que mide cada llamada a la función como un tramo."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return funcion(*args, **kwargs)
+            with _Tramo(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def contar(nombre, cantidad=1):
+    """Suma cantidad al contador (no hace nada si el perfilado está desactivado)."""
+    if _activo:
+        with _bloqueo:
+            _contadores[nombre] += cantidad
+
+
+def activo():
+    return _activo
+
+
+# ACTIVACIÓN Y SALIDA
+
+def activar(ruta=None):
+    """Activa el perfilado; si se indica ruta, los resultados se guardan ahí al terminar el proceso."""
+    global _activo, _ruta, _pid_principal
+    _activo = True
+    if ruta and _ruta is None:
+        _ruta = os.path.abspath(ruta)
+        # Los procesos hijos heredan la salida y el proceso principal por el entorno
+        os.environ[VARIABLE] = _ruta
+        os.environ.setdefault(VARIABLE_PID, str(os.getpid()))
+        _pid_principal = int(os.environ[VARIABLE_PID])
+        atexit.register(_al_salir)
+
+
+def desactivar():
+    global _activo
+    _activo = False
+
+
+def reiniciar():
+    """Borra los tramos y contadores registrados."""
+    with _bloqueo:
+        _tramos.clear()
+        _contadores.clear()
+
+
+def resumen():
+    """Tramos (ordenados por tiempo total) y contadores registrados."""
+    with _bloqueo:
+        tramos = {nombre: estadistica.a_dict()
+                  for nombre, estadistica in sorted(_tramos.items(), key=lambda item: -item[1].total)}
+        return {"tramos": tramos, "contadores": dict(sorted(_contadores.items()))}
+
+
+def _cargar_resumen(datos):
+    with _bloqueo:
+        for nombre, tramo_datos in datos["tramos"].items():
+            estadistica = _Estadistica.desde_dict(tramo_datos)
+            if nombre in _tramos:
+                _tramos[nombre].sumar(estadistica)
+            else:
+                _tramos[nombre] = estadistica
+        for nombre, cantidad in datos["contadores"].items():
+            _contadores[nombre] += cantidad
+
+
+def _es_hijo():
+    return _pid_principal is not None and os.getpid() != _pid_principal
+
+
+def volcar_proceso():
+    """En un proceso hijo, guarda lo registrado hasta ahora en su fichero parcial (llamar al terminar cada tarea)."""
+    if _activo and _ruta and _es_hijo():
+        ruta = f"{_ruta}.{os.getpid()}.parcial"
+        with open(ruta + ".tmp", "w", encoding="utf-8") as fichero:
+            json.dump(resumen(), fichero)
+        os.replace(ruta + ".tmp", ruta)
+
+
+def _estadisticas_pstats(tramos):
+    # Cada tramo es una "función" y sus tramos padre, los llamadores: (cc, nc, tt, ct, llamadores) en segundos
+    def clave(nombre):
+        return ("tramo", 0, nombre)
+
+    estadisticas = {}
+    for nombre, datos in tramos.items():
+        llamadores = {clave(padre): (llamadas["llamadas"], llamadas["llamadas"], llamadas["propio_ms"] / 1000, llamadas["total_ms"] / 1000)
+                      for padre, llamadas in datos["padres"].items()}
+        estadisticas[clave(nombre)] = (datos["llamadas"], datos["llamadas"], datos["propio_ms"] / 1000,
+                                       datos["total_ms"] / 1000, llamadores)
+    return estadisticas
+
+
+def guardar(ruta):
+    """Guarda los tramos y contadores en JSON o, si la ruta termina en .prof o .pstats, en formato pstats."""
+    datos = resumen()
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    if ruta.endswith((".prof", ".pstats")):
+        with open(ruta, "wb") as fichero:
+            marshal.dump(_estadisticas_pstats(datos["tramos"]), fichero)
+    else:
+        with open(ruta, "w", encoding="utf-8") as fichero:
+            json.dump(datos, fichero, indent=2, ensure_ascii=False)
+    return datos
+
+
+def _despues_de_fork():
+    # Un proceso hijo empieza sin los tramos del padre (si no, se sumarían dos veces al final)
+    global _bloqueo, _local
+    _bloqueo = threading.Lock()
+    _local = threading.local()
+    _tramos.clear()
+    _contadores.clear()
+
+
+os.register_at_fork(after_in_child=_despues_de_fork)
+
+
+def _al_salir():
+    if _es_hijo():
+        volcar_proceso()
+        return
+
+    # Sumamos lo que han guardado los procesos hijos
+    for parcial in glob.glob(glob.escape(_ruta) + ".*.parcial"):
+        with open(parcial, encoding="utf-8") as fichero:
+            _cargar_resumen(json.load(fichero))
+        os.remove(parcial)
+    guardar(_ruta)
+    print(f"Perfil guardado en: {_ruta}")
+
+
+if os.environ.get(VARIABLE):
+    activar(os.environ[VARIABLE])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Muestra los tramos y contadores de un perfil guardado.")
+    parser.add_argument("perfil", help="Fichero .json o .prof guardado con POKERMIND_PERFIL o --perfil")
+    parser.add_argument("--tramos", type=int, default=30, help="Número de tramos que se muestran")
+    args = parser.parse_args()
+
+    if args.perfil.endswith((".prof", ".pstats")):
+        import pstats
+        pstats.Stats(args.perfil).sort_stats("cumulative").print_stats(args.tramos)
+        return
+
+    with open(args.perfil, encoding="utf-8") as fichero:
+        datos = json.load(fichero)
+    print(f"{'tramo':<36} {'llamadas':>9} {'total ms':>11} {'propio ms':>11} {'p50 ms':>9} {'p99 ms':>9}")
+    for nombre, tramo_datos in list(datos["tramos"].items())[:args.tramos]:
+        print(f"{nombre:<36} {tramo_datos['llamadas']:>9,} {tramo_datos['total_ms']:>11.1f} {tramo_datos['propio_ms']:>11.1f} "
+              f"{tramo_datos['p50_ms']:>9.3f} {tramo_datos['p99_ms']:>9.3f}")
+    if datos["contadores"]:
+        print("\nContadores:")
+        for nombre, cantidad in datos["contadores"].items():
+            print(f"  {nombre}: {cantidad:,}")
+
+
+if __name__ == "__main__":
+    main()
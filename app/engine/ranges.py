@@ -0,0 +1,341 @@
+# EQUITY CONTRA RANGOS DE MANOS
+#
+# El generador y la App suponen que los rivales tienen dos cartas cualesquiera. Este módulo
+# calcula la equity contra un rango: un array de 1326 pesos, uno por cada combinación de dos
+# cartas (COMBINACIONES), que se puede construir a partir de texto ("QQ+, AKs, AQo:0.5") o de
+# pesos por mano inicial. Las combinaciones que usan cartas conocidas (las del jugador, la mesa
+# o cartas muertas) se quitan del rango.
+#
+# Para cada tablero se calcula una sola vez la fuerza de las 1326 combinaciones en cada posible
+# final del tablero (FuerzasTablero): todos los finales si son pocos (1081 con el flop, 46 con
+# el turn, 1 en el river) o una muestra si no (preflop). Con esas fuerzas ordenadas, la equity de
+# todas las combinaciones contra un rango es una suma acumulada de los pesos del rango en cada
+# final, y las combinaciones del rival que comparten carta con la del jugador se descuentan con
+# la misma suma restringida a las 51 combinaciones de cada carta. Así se obtiene a la vez la
+# equity de cada combinación contra el rango y la de un rango contra otro, sin muestrear repartos.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.ranges --jugador A♠ K♠ --rango "QQ+, AKs, AQo" --mesa Q♠ J♠ 2♦
+#   python -m engine.ranges --rango-jugador "TT+, AK" --rango "22+, A2s+, KTs+, QTs+, JTs, ATo+, KJo+" --mesa Q♠ J♠ 2♦
+
+import argparse
+import itertools
+import math
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas
+from engine.cards import BARAJA, carta_a_numero, indice_carta, numero_a_carta
+from engine.equity import Z_95, resultado_equity
+from engine.preflop import NUM_MANOS_INICIALES, indices_manos_iniciales
+
+# Combinaciones de dos cartas, con las cartas ordenadas por su índice en la baraja
+COMBINACIONES = np.array(list(itertools.combinations(BARAJA, 2)), dtype=np.uint8)
+NUM_COMBINACIONES = len(COMBINACIONES)
+
+# Mano inicial (0..168) de cada combinación
+MANO_INICIAL = indices_manos_iniciales(COMBINACIONES)
+
+# Finales del tablero por encima de este número se muestrean en lugar de enumerarse
+MAX_TABLEROS = 2000
+
+# Tableros con las fuerzas calculadas que se conservan en memoria
+MAX_TABLEROS_CACHE = 4
+
+_INDICE_COMBINACION = np.full((52, 52), -1, dtype=np.int64)
+for _i, (_a, _b) in enumerate(COMBINACIONES):
+    _INDICE_COMBINACION[indice_carta(_a), indice_carta(_b)] = _INDICE_COMBINACION[indice_carta(_b), indice_carta(_a)] = _i
+
+# Combinaciones que contienen cada carta (52, 51) y posición de cada combinación en las listas de sus dos cartas
+_CARTAS_COMBINACION = np.vectorize(indice_carta)(COMBINACIONES)
+COMBINACIONES_CARTA = np.array([np.flatnonzero((_CARTAS_COMBINACION == carta).any(axis=1)) for carta in range(52)])
+_POSICION_EN_CARTA = np.array([[np.flatnonzero(COMBINACIONES_CARTA[carta] == i)[0] for carta in cartas]
+                               for i, cartas in enumerate(_CARTAS_COMBINACION)])
+
+# Máscara de bits de las cartas de cada combinación
+_MASCARA_COMBINACION = (np.uint64(1) << _CARTAS_COMBINACION.astype(np.uint64)).sum(axis=1, dtype=np.uint64)
+
+
+def _mascara(cartas):
+    return np.uint64(sum(1 << indice_carta(carta) for carta in cartas))
+
+
+def indice_combinacion(carta_1, carta_2):
+    """Posición (0..1325) de la combinación de dos cartas en COMBINACIONES."""
+    return int(_INDICE_COMBINACION[indice_carta(carta_1), indice_carta(carta_2)])
+
+
+# RANGOS
+
+_ORDEN_VALORES = "23456789TJQKA"
+_MANO = re.compile(r"^([2-9TJQKA])([2-9TJQKA])([so]?)(\+?)$")
+
+
+def _valor(caracter):
+    return _ORDEN_VALORES.index(caracter) + 2
+
+
+def _manos_iniciales_texto(mano):
+    # Manos iniciales (169) de una expresión como "TT+", "ATs+", "KQo" o "AK"
+    coincidencia = _MANO.match(mano)
+    if not coincidencia:
+        raise ValueError(f"Mano no válida en el rango: {mano}")
+    alta, baja, tipo, mas = _valor(coincidencia[1]), _valor(coincidencia[2]), coincidencia[3], coincidencia[4]
+    alta, baja = max(alta, baja), min(alta, baja)
+    if alta == baja:
+        if tipo:
+            raise ValueError(f"Una pareja no puede ser suited u offsuit: {mano}")
+        valores = range(alta, 15) if mas else [alta]
+        return [(14 - valor) * 13 + (14 - valor) for valor in valores]
+
+    # Con "+" sube la carta baja hasta una por debajo de la alta (ATs+ = ATs, AJs, AQs, AKs)
+    bajas = range(baja, alta) if mas else [baja]
+    indices = []
+    for valor in bajas:
+        if tipo in ("", "s"):
+            indices.append((14 - alta) * 13 + (14 - valor))
+        if tipo in ("", "o"):
+            indices.append((14 - valor) * 13 + (14 - alta))
+    return indices
+
+
+def rango_desde_manos_iniciales(pesos):
+    """Rango (1326,) a partir de los pesos de las 169 manos iniciales."""
+    pesos = np.asarray(pesos, dtype=np.float64)
+    if pesos.shape != (NUM_MANOS_INICIALES,):
+        raise ValueError(f"Se esperaban {NUM_MANOS_INICIALES} pesos")
+    return pesos[MANO_INICIAL]
+
+
+def rango_desde_texto(texto):
+    """Rango (1326,) a partir de texto: "QQ+, AKs, ATs+, KQo:0.5, A♠5♠" (peso 1 si no se indica)."""
+    rango = np.zeros(NUM_COMBINACIONES)
+    for parte in texto.replace(" ", "").split(","):
+        if not parte:
+            continue
+        mano, _, peso = parte.partition(":")
+        peso = float(peso) if peso else 1.0
+        if mano[-1] in "♠♣♦♥":
+            # Combinación concreta, por ejemplo A♠5♠ o 10♦10♣
+            cartas = re.findall(r"(?:10|[2-9JQKA])[♠♣♦♥]", mano)
+            if len(cartas) != 2 or "".join(cartas) != mano or cartas[0] == cartas[1]:
+                raise ValueError(f"Combinación no válida en el rango: {mano}")
+            rango[indice_combinacion(*(carta_a_numero(carta) for carta in cartas))] = peso
+        else:
+            manos = np.zeros(NUM_MANOS_INICIALES, dtype=bool)
+            manos[_manos_iniciales_texto(mano.replace("10", "T"))] = True
+            rango[manos[MANO_INICIAL]] = peso
+    return rango
+
+
+def quitar_bloqueadas(rango, cartas):
+    """Copia del rango sin las combinaciones que usan alguna de las cartas conocidas."""
+    rango = np.array(rango, dtype=np.float64)
+    rango[(_MASCARA_COMBINACION & _mascara(cartas)) != 0] = 0
+    return rango
+
+
+def nombre_combinacion(indice):
+    """Nombre de la combinación ("A♠ K♠")."""
+    return " ".join(numero_a_carta(carta) for carta in COMBINACIONES[indice])
+
+
+# FUERZAS POR TABLERO
+
+def _ordenar(fuerzas):
+    # Para cada fila, posiciones (planas) de sus elementos ordenados y, para cada elemento, posición
+    # (plana, en la fila con un elemento más de la suma acumulada) del primero mayor o igual y del primero mayor
+    filas, columnas = fuerzas.shape
+    orden = np.argsort(fuerzas, axis=1, kind="stable")
+    claves = fuerzas.astype(np.int64) + 1 + (np.arange(filas, dtype=np.int64) << 26)[:, None]
+    ordenadas = np.take_along_axis(claves, orden, axis=1).ravel()
+    filas = np.arange(filas, dtype=np.int64)[:, None]
+    menores = np.searchsorted(ordenadas, claves, "left") + filas
+    menores_o_iguales = np.searchsorted(ordenadas, claves, "right") + filas
+    # Índices planos en int32: la mitad de memoria y np.take sigue siendo rápido
+    return (orden + filas * columnas).astype(np.int32), menores.astype(np.int32), menores_o_iguales.astype(np.int32)
+
+
+def _acumular(pesos, orden, menores, menores_o_iguales):
+    # Suma de los pesos de la fila con fuerza menor e igual a la de cada elemento
+    acumulados = np.zeros(pesos.shape[:-1] + (pesos.shape[-1] + 1,))
+    np.cumsum(np.take(pesos, orden), axis=-1, out=acumulados[..., 1:])
+    menor = np.take(acumulados, menores)
+    return menor, np.take(acumulados, menores_o_iguales) - menor
+
+
+class FuerzasTablero:
+    """Fuerza de las 1326 combinaciones en cada final de un tablero (enumerado o muestreado)."""
+
+    def __init__(self, comunitarias, muertas=(), max_tableros=MAX_TABLEROS, semilla=0):
+        comunitarias = [int(carta) for carta in comunitarias]
+        conocidas = set(comunitarias) | {int(carta) for carta in muertas}
+        restantes = np.array([carta for carta in BARAJA if carta not in conocidas], dtype=np.uint8)
+        faltan = 5 - len(comunitarias)
+
+        # Todos los finales del tablero si son pocos y, si no, una muestra sin repetición por fila
+        self.exacta = math.comb(len(restantes), faltan) <= max_tableros
+        if self.exacta:
+            finales = list(itertools.combinations(restantes, faltan))
+            finales = np.array(finales, dtype=np.uint8).reshape(len(finales), faltan)
+        else:
+            rng = np.random.default_rng(semilla)
+            posiciones = rng.permuted(np.tile(np.arange(len(restantes)), (max_tableros, 1)), axis=1)[:, :faltan]
+            finales = restantes[posiciones]
+        self.tableros = np.concatenate([np.broadcast_to(np.array(comunitarias, dtype=np.uint8), (len(finales), 5 - faltan)),
+                                        finales], axis=1)
+
+        # Solo se evalúan las combinaciones que no usan cartas del tablero ni cartas muertas
+        mascaras = (np.uint64(1) << np.vectorize(indice_carta)(self.tableros).astype(np.uint64)).sum(axis=1, dtype=np.uint64)
+        mascaras |= _mascara(muertas)
+        self.validas = (_MASCARA_COMBINACION[None, :] & mascaras[:, None]) == 0
+        self.validas_pesos = self.validas.astype(np.float64)
+        filas, columnas = np.nonzero(self.validas)
+        self.fuerzas = np.full(self.validas.shape, -1, dtype=np.int32)
+        self.fuerzas[filas, columnas] = evaluar_fuerzas(np.concatenate([COMBINACIONES[columnas], self.tableros[filas]], axis=1))
+
+        self.orden, self.menores, self.menores_o_iguales = _ordenar(self.fuerzas)
+        fuerzas_carta = self.fuerzas[:, COMBINACIONES_CARTA].reshape(len(self.tableros) * 52, 51)
+        self.orden_carta, self.menores_carta, self.menores_o_iguales_carta = (
+            array.reshape(len(self.tableros), 52, 51) for array in _ordenar(fuerzas_carta))
+
+    def conteos(self, rango_rival):
+        """Pesos del rango rival que pierden, empatan y ganan contra cada combinación (1326, 3), sumados en los finales."""
+        pesos = np.where(self.validas, rango_rival[None, :], 0.0)
+        pesos_carta = pesos[:, COMBINACIONES_CARTA]
+
+        # Las combinaciones imposibles en un final tienen fuerza -1 y peso 0, así que sus sumas de
+        # pesos menores e iguales son 0 y se pueden sumar todos los finales antes de seguir
+        menor, igual = (valores.sum(axis=0) for valores in _acumular(pesos, self.orden, self.menores, self.menores_o_iguales))
+        menor_carta, igual_carta = (valores.sum(axis=0) for valores in
+                                    _acumular(pesos_carta, self.orden_carta, self.menores_carta, self.menores_o_iguales_carta))
+
+        # Combinaciones rivales que comparten una carta con la del jugador (la propia se cuenta dos veces)
+        primera, segunda = (_CARTAS_COMBINACION[:, 0], _POSICION_EN_CARTA[:, 0]), (_CARTAS_COMBINACION[:, 1], _POSICION_EN_CARTA[:, 1])
+        propia = pesos.sum(axis=0)
+        menor -= menor_carta[primera] + menor_carta[segunda]
+        igual -= igual_carta[primera] + igual_carta[segunda] - propia
+
+        # El total solo cuenta los finales en los que la combinación del jugador es posible
+        totales = self.validas_pesos.T @ np.column_stack([pesos.sum(axis=1), pesos_carta.sum(axis=2)])
+        indices = np.arange(NUM_COMBINACIONES)
+        total = totales[:, 0] - totales[indices, 1 + primera[0]] - totales[indices, 1 + segunda[0]] + propia
+        return np.stack([total - menor - igual, igual, menor], axis=1)
+
+
+_tableros = OrderedDict()
+
+
+def fuerzas_tablero(comunitarias, muertas=(), max_tableros=MAX_TABLEROS, semilla=0):
+    """FuerzasTablero del tablero, reutilizando las últimas calculadas."""
+    clave = (tuple(sorted(int(carta) for carta in comunitarias)), tuple(sorted(int(carta) for carta in muertas)), max_tableros, semilla)
+    if clave in _tableros:
+        _tableros.move_to_end(clave)
+    else:
+        _tableros[clave] = FuerzasTablero(comunitarias, muertas, max_tableros, semilla)
+        if len(_tableros) > MAX_TABLEROS_CACHE:
+            _tableros.popitem(last=False)
+    return _tableros[clave]
+
+
+# EQUITY
+
+def _resultado(conteos, exacta, num_tableros):
+    derrotas, empates, victorias = conteos
+    total = conteos.sum()
+    if total <= 0:
+        raise ValueError("El rango rival no tiene combinaciones posibles")
+    probabilidades = conteos / total
+    # Con finales muestreados, error aproximado como si cada final fuera una observación independiente
+    error = 0.0 if exacta else float(Z_95 * np.sqrt(probabilidades * (1 - probabilidades) / num_tableros).max())
+    return resultado_equity(victorias, empates, total, exacta, error)
+
+
+def equity_combinaciones(rango_rival, comunitarias=(), muertas=(), max_tableros=MAX_TABLEROS):
+    """Probabilidades (1326, 3) de derrota, empate y victoria de cada combinación contra el rango (NaN si no es posible)."""
+    tablero = fuerzas_tablero(comunitarias, muertas, max_tableros)
+    conteos = tablero.conteos(quitar_bloqueadas(rango_rival, list(comunitarias) + list(muertas)))
+    total = conteos.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, conteos / total, np.nan)
+
+
+def equity_contra_rango(cartas_jugador, rango_rival, comunitarias=(), muertas=(), max_tableros=MAX_TABLEROS):
+    """Equity de las cartas del jugador contra un rango, con el formato de engine.equity."""
+    tablero = fuerzas_tablero(comunitarias, muertas, max_tableros)
+    combinacion = indice_combinacion(*cartas_jugador)
+    rango = quitar_bloqueadas(rango_rival, list(cartas_jugador) + list(comunitarias) + list(muertas))
+
+    # Una sola fila de la matriz: basta comparar la fuerza del jugador con las del rango en cada final
+    finales = tablero.validas[:, combinacion]
+    fuerzas, fuerza_jugador = tablero.fuerzas[finales], tablero.fuerzas[finales, combinacion][:, None]
+    pesos = np.where(tablero.validas[finales], rango[None, :], 0.0)
+    conteos = np.array([(pesos * (fuerzas > fuerza_jugador)).sum(), (pesos * (fuerzas == fuerza_jugador)).sum(),
+                        (pesos * (fuerzas < fuerza_jugador)).sum()])
+    return _resultado(conteos, tablero.exacta, len(tablero.tableros))
+
+
+def equity_rango_contra_rango(rango_jugador, rango_rival, comunitarias=(), muertas=(), max_tableros=MAX_TABLEROS):
+    """Equity de un rango contra otro, ponderando cada pareja de combinaciones compatibles por sus pesos."""
+    tablero = fuerzas_tablero(comunitarias, muertas, max_tableros)
+    conocidas = list(comunitarias) + list(muertas)
+    conteos = tablero.conteos(quitar_bloqueadas(rango_rival, conocidas))
+    conteos = (quitar_bloqueadas(rango_jugador, conocidas)[:, None] * conteos).sum(axis=0)
+    return _resultado(conteos, tablero.exacta, len(tablero.tableros))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula la equity de una mano o un rango contra el rango de un rival.")
+    jugador = parser.add_mutually_exclusive_group(required=True)
+    jugador.add_argument("--jugador", nargs=2, help="Cartas del jugador (por ejemplo A♠ K♠)")
+    jugador.add_argument("--rango-jugador", help="Rango del jugador (por ejemplo \"TT+, AK\")")
+    parser.add_argument("--rango", required=True, help="Rango del rival (por ejemplo \"QQ+, AKs, AQo:0.5\")")
+    parser.add_argument("--mesa", nargs="*", default=[], help="Cartas comunitarias (0, 3, 4 o 5)")
+    parser.add_argument("--muertas", nargs="*", default=[], help="Otras cartas conocidas que no pueden salir")
+    parser.add_argument("--tableros", type=int, default=MAX_TABLEROS, help="Finales del tablero muestreados si no se enumeran")
+    parser.add_argument("--mejores", type=int, default=0, help="Muestra las N combinaciones con más equity contra el rango")
+    args = parser.parse_args()
+
+    if len(args.mesa) not in (0, 3, 4, 5):
+        parser.error("La mesa debe tener 0, 3, 4 o 5 cartas")
+    try:
+        mesa = [carta_a_numero(carta) for carta in args.mesa]
+        muertas = [carta_a_numero(carta) for carta in args.muertas]
+        cartas = [carta_a_numero(carta) for carta in args.jugador] if args.jugador else []
+        rango = rango_desde_texto(args.rango)
+        rango_jugador = rango_desde_texto(args.rango_jugador) if args.rango_jugador else None
+    except (KeyError, ValueError) as error:
+        parser.error(f"Entrada no válida: {error}")
+    if len(set(cartas + mesa + muertas)) != len(cartas + mesa + muertas):
+        parser.error("Hay cartas repetidas")
+
+    inicio = time.perf_counter()
+    fuerzas_tablero(mesa, muertas, args.tableros)
+    preparacion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    try:
+        if args.jugador:
+            resultado = equity_contra_rango(cartas, rango, mesa, muertas, args.tableros)
+        else:
+            resultado = equity_rango_contra_rango(rango_jugador, rango, mesa, muertas, args.tableros)
+    except ValueError as error:
+        parser.error(str(error))
+    consulta = time.perf_counter() - inicio
+
+    print(f"Derrota: {resultado['Derrota']:.2%} | Empate: {resultado['Empate']:.2%} | Victoria: {resultado['Victoria']:.2%}")
+    finales = "todos los finales" if resultado["Exacta"] else f"finales muestreados, error ±{resultado['Error']:.2%} al 95 %"
+    print(f"Tablero preparado en {preparacion * 1000:.0f} ms ({finales}), consulta en {consulta * 1000:.1f} ms")
+
+    if args.mejores:
+        equities = equity_combinaciones(rango, mesa, muertas, args.tableros)
+        puntuacion = np.nan_to_num(equities[:, 2] + equities[:, 1] / 2, nan=-1)
+        for indice in np.argsort(-puntuacion, kind="stable")[:args.mejores]:
+            print(f"  {nombre_combinacion(indice)}: Victoria {equities[indice, 2]:.2%} | Empate {equities[indice, 1]:.2%}")
+
+
+if __name__ == "__main__":
+    main()
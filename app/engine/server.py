@@ -0,0 +1,397 @@
+# SERVIDOR LOCAL DE PREDICCIONES
+#
+# Servidor HTTP mínimo (asyncio, sin dependencias) que carga una sola vez el modelo exportado a
+# NumPy, el mismo que usa HandScreen.predict_hand, y responde a las herramientas que necesitan
+# predicciones. Se puede escuchar en un puerto local o en un socket Unix.
+#
+# Las peticiones no se predicen una a una: se dejan en una cola y un único consumidor las junta
+# en microlotes (hasta max_lote situaciones o hasta que pasa la ventana de espera desde la
+# primera), construye las features de todo el lote y llama una vez al modelo en un hilo aparte,
+# así que con muchas peticiones simultáneas el rendimiento se acerca al de predecir por lotes.
+# La cola tiene un tamaño máximo: si está llena, la petición se rechaza con 503 en lugar de
+# acumular trabajo sin límite (y con 413 si la petición sola no cabe en la cola). Si falla la
+# predicción de un lote, sus peticiones se predicen una a una para que una entrada errónea no
+# haga fallar a las demás, y la que falla recibe un 500.
+#
+# Peticiones:
+#   POST /predecir  {"cartas_jugador": ["A♠", "K♠"], "num_rivales": 2, "comunitarias": ["Q♠", "J♠", "2♦", "7♣", "9♥"]}
+#                   o {"situaciones": [{...}, {...}]} para varias a la vez
+#   GET  /metricas  profundidad de la cola, tamaño de los lotes y percentiles de latencia
+#   GET  /salud
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.server --puerto 8765 --espera-ms 2 --max-lote 1024
+#   python -m engine.server --socket /tmp/poker_mind.sock
+#   python -m engine.server --prueba-carga 5000 --concurrencia 64
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from engine.cards import BARAJA, carta_a_numero
+from engine.features import features_mano
+from engine.inference import CLASES, RUTA_MODELO, ModeloNumpy, cargar_modelo
+
+MAX_RIVALES = 8
+
+# Latencias que se guardan para calcular los percentiles
+MAX_LATENCIAS = 10000
+
+
+class Saturado(Exception):
+    """La cola de predicciones está llena."""
+
+
+class PeticionInvalida(ValueError):
+    """La petición no tiene el formato esperado."""
+
+
+class DemasiadoGrande(PeticionInvalida):
+    """La petición tiene más situaciones de las que caben en la cola."""
+
+
+# MICROLOTES
+
+class MicroLotes:
+    """Junta las situaciones de peticiones simultáneas en lotes y las predice con una sola llamada al modelo."""
+
+    def __init__(self, modelo, max_lote=1024, espera_ms=2.0, max_cola=8192):
+        self.modelo = modelo
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+        self.max_cola = max_cola
+        self.cola = deque()
+        self.en_cola = 0
+        self.hay_trabajo = asyncio.Event()
+        self.tarea = None
+
+        # Métricas
+        self.lotes = 0
+        self.situaciones = 0
+        self.rechazadas = 0
+        self.max_en_cola = 0
+        self.latencias = deque(maxlen=MAX_LATENCIAS)
+        self.tamanos = deque(maxlen=MAX_LATENCIAS)
+        self.inicio = time.perf_counter()
+
+    def iniciar(self):
+        self.tarea = asyncio.get_running_loop().create_task(self._consumir())
+
+    async def detener(self):
+        if self.tarea is not None:
+            self.tarea.cancel()
+            try:
+                await self.tarea
+            except asyncio.CancelledError:
+                pass
+
+    async def predecir(self, cartas_jugador, num_rivales, comunitarias):
+        """Probabilidades (N, 3) de N situaciones, esperando a que se predigan con su lote."""
+        num_filas = len(cartas_jugador)
+        if num_filas > self.max_cola:
+            raise DemasiadoGrande(f"La petición tiene {num_filas} situaciones y el máximo es {self.max_cola}")
+        if self.en_cola + num_filas > self.max_cola:
+            self.rechazadas += 1
+            raise Saturado()
+
+        futuro = asyncio.get_running_loop().create_future()
+        self.cola.append((cartas_jugador, num_rivales, comunitarias, futuro, time.perf_counter()))
+        self.en_cola += num_filas
+        self.max_en_cola = max(self.max_en_cola, self.en_cola)
+        self.hay_trabajo.set()
+        return await futuro
+
+    async def _consumir(self):
+        bucle = asyncio.get_running_loop()
+        while True:
+            await self.hay_trabajo.wait()
+
+            # Ventana de espera desde la primera petición para que se junten más
+            if self.en_cola < self.max_lote and self.espera > 0:
+                await asyncio.sleep(self.espera)
+
+            peticiones, filas = [], 0
+            while self.cola and filas < self.max_lote:
+                peticion = self.cola.popleft()
+                peticiones.append(peticion)
+                filas += len(peticion[0])
+            self.en_cola -= filas
+            if not self.cola:
+                self.hay_trabajo.clear()
+
+            try:
+                probabilidades = await bucle.run_in_executor(None, self._predecir_lote, peticiones)
+            except Exception as error:
+                await self._predecir_por_separado(peticiones, error)
+                continue
+
+            fin = time.perf_counter()
+            self.lotes += 1
+            self.situaciones += filas
+            self.tamanos.append(filas)
+            inicio = 0
+            for cartas_jugador, _, _, futuro, llegada in peticiones:
+                if not futuro.done():
+                    futuro.set_result(probabilidades[inicio:inicio + len(cartas_jugador)])
+                inicio += len(cartas_jugador)
+                self.latencias.append(fin - llegada)
+
+    async def _predecir_por_separado(self, peticiones, error):
+        # Si falla un lote, cada petición se predice sola para que solo fallen las que tienen el error
+        bucle = asyncio.get_running_loop()
+        for peticion in peticiones:
+            futuro = peticion[3]
+            try:
+                if len(peticiones) == 1:
+                    raise error
+                resultado = await bucle.run_in_executor(None, self._predecir_lote, [peticion])
+            except Exception as error_peticion:
+                if not futuro.done():
+                    futuro.set_exception(error_peticion)
+            else:
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+    def _predecir_lote(self, peticiones):
+        # Features de todas las situaciones del lote y una sola llamada al modelo
+        cartas_jugador = np.concatenate([peticion[0] for peticion in peticiones])
+        num_rivales = np.concatenate([peticion[1] for peticion in peticiones])
+        comunitarias = np.concatenate([peticion[2] for peticion in peticiones])
+        return self.modelo.predecir(features_mano(cartas_jugador, num_rivales, comunitarias))
+
+    def metricas(self):
+        """Profundidad de la cola, lotes, situaciones por segundo y percentiles de latencia (ms)."""
+        latencias = np.array(self.latencias) * 1000
+        percentiles = {f"p{p}": float(np.percentile(latencias, p)) if len(latencias) else 0.0 for p in (50, 90, 99)}
+        return {
+            "en_cola": self.en_cola,
+            "max_en_cola": self.max_en_cola,
+            "lotes": self.lotes,
+            "situaciones": self.situaciones,
+            "rechazadas": self.rechazadas,
+            "situaciones_por_lote": float(np.mean(self.tamanos)) if self.tamanos else 0.0,
+            "situaciones_por_segundo": self.situaciones / (time.perf_counter() - self.inicio),
+            "latencia_ms": percentiles,
+        }
+
+
+# PETICIONES
+
+_CODIGOS_VALIDOS = set(BARAJA)
+
+
+def _codigo(carta):
+    # Acepta códigos (141 o "141") o cartas en texto ("A♠")
+    codigo = int(carta) if isinstance(carta, int) or str(carta).isdigit() else carta_a_numero(carta)
+    if codigo not in _CODIGOS_VALIDOS:
+        raise ValueError(f"carta desconocida: {carta}")
+    return codigo
+
+
+def situaciones_desde_json(datos):
+    """Arrays (cartas_jugador, num_rivales, comunitarias) de una petición con una o varias situaciones."""
+    situaciones = datos.get("situaciones", [datos]) if isinstance(datos, dict) else None
+    if not situaciones:
+        raise PeticionInvalida("Se esperaba un objeto con una situación o con la lista 'situaciones'")
+
+    cartas_jugador, num_rivales, comunitarias = [], [], []
+    for situacion in situaciones:
+        try:
+            jugador = [_codigo(carta) for carta in situacion["cartas_jugador"]]
+            mesa = [_codigo(carta) for carta in situacion["comunitarias"]]
+            rivales = int(situacion["num_rivales"])
+        except (KeyError, TypeError, ValueError) as error:
+            raise PeticionInvalida(f"Situación no válida: {error}")
+        if len(jugador) != 2 or len(mesa) != 5:
+            raise PeticionInvalida("Cada situación necesita 2 cartas del jugador y 5 comunitarias")
+        if len(set(jugador + mesa)) != 7:
+            raise PeticionInvalida("Hay cartas repetidas")
+        if not 1 <= rivales <= MAX_RIVALES:
+            raise PeticionInvalida(f"El número de rivales debe estar entre 1 y {MAX_RIVALES}")
+        cartas_jugador.append(jugador)
+        num_rivales.append(rivales)
+        comunitarias.append(mesa)
+    return (np.array(cartas_jugador, dtype=np.uint8), np.array(num_rivales, dtype=np.uint8),
+            np.array(comunitarias, dtype=np.uint8))
+
+
+def respuesta_predicciones(probabilidades):
+    return [dict(zip(CLASES, map(float, fila)), Clase=CLASES[int(np.argmax(fila))]) for fila in probabilidades]
+
+
+# SERVIDOR HTTP
+
+_ESTADOS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+async def _responder(escritor, estado, cuerpo, cerrar=False):
+    datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+    cabeceras = [f"HTTP/1.1 {estado} {_ESTADOS[estado]}", "Content-Type: application/json; charset=utf-8",
+                 f"Content-Length: {len(datos)}"]
+    if estado == 503:
+        cabeceras.append("Retry-After: 1")
+    if cerrar:
+        cabeceras.append("Connection: close")
+    escritor.write(("\r\n".join(cabeceras) + "\r\n\r\n").encode("latin-1") + datos)
+    await escritor.drain()
+
+
+async def atender(lotes, lector, escritor):
+    """Atiende las peticiones de una conexión (con keep-alive) hasta que el cliente la cierra."""
+    try:
+        while True:
+            linea = await lector.readline()
+            if not linea:
+                break
+            metodo, ruta, _ = linea.decode("latin-1").split(" ", 2)
+            cabeceras = {}
+            while (linea := await lector.readline()) not in (b"\r\n", b"\n", b""):
+                nombre, _, valor = linea.decode("latin-1").partition(":")
+                cabeceras[nombre.strip().lower()] = valor.strip()
+            cuerpo = await lector.readexactly(int(cabeceras.get("content-length", 0)))
+            cerrar = cabeceras.get("connection", "").lower() == "close"
+
+            if metodo == "GET" and ruta == "/salud":
+                await _responder(escritor, 200, {"estado": "ok"}, cerrar)
+            elif metodo == "GET" and ruta == "/metricas":
+                await _responder(escritor, 200, lotes.metricas(), cerrar)
+            elif metodo == "POST" and ruta == "/predecir":
+                try:
+                    datos = json.loads(cuerpo or b"null")
+                    probabilidades = await lotes.predecir(*situaciones_desde_json(datos))
+                    await _responder(escritor, 200, {"predicciones": respuesta_predicciones(probabilidades)}, cerrar)
+                except DemasiadoGrande as error:
+                    await _responder(escritor, 413, {"error": str(error)}, cerrar)
+                except (PeticionInvalida, json.JSONDecodeError) as error:
+                    await _responder(escritor, 400, {"error": str(error)}, cerrar)
+                except Saturado:
+                    await _responder(escritor, 503, {"error": "Cola de predicciones llena, reintenta más tarde"}, cerrar)
+                except Exception as error:
+                    await _responder(escritor, 500, {"error": f"Error al predecir: {error}"}, cerrar)
+            else:
+                await _responder(escritor, 404, {"error": f"Ruta no encontrada: {metodo} {ruta}"}, cerrar)
+            if cerrar:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        escritor.close()
+
+
+async def iniciar_servidor(modelo, host="127.0.0.1", puerto=8765, socket=None, max_lote=1024, espera_ms=2.0, max_cola=8192):
+    """Arranca el servidor y devuelve (servidor, microlotes)."""
+    lotes = MicroLotes(modelo, max_lote, espera_ms, max_cola)
+    lotes.iniciar()
+
+    async def conexion(lector, escritor):
+        await atender(lotes, lector, escritor)
+
+    if socket:
+        if os.path.exists(socket):
+            os.remove(socket)
+        servidor = await asyncio.start_unix_server(conexion, path=socket)
+    else:
+        servidor = await asyncio.start_server(conexion, host, puerto)
+    return servidor, lotes
+
+
+# PRUEBA DE CARGA
+
+async def _cliente(host, puerto, cuerpos, resultados):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    for cuerpo in cuerpos:
+        inicio = time.perf_counter()
+        escritor.write(f"POST /predecir HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(cuerpo)}\r\n\r\n".encode() + cuerpo)
+        await escritor.drain()
+        estado = int((await lector.readline()).split()[1])
+        longitud = 0
+        while (linea := await lector.readline()) != b"\r\n":
+            if linea.lower().startswith(b"content-length"):
+                longitud = int(linea.split(b":")[1])
+        await lector.readexactly(longitud)
+        resultados.append((estado, time.perf_counter() - inicio))
+    escritor.close()
+
+
+async def prueba_carga(modelo, num_peticiones=5000, concurrencia=64, max_lote=1024, espera_ms=2.0, semilla=0):
+    """Lanza num_peticiones de una situación desde concurrencia clientes y compara con predecir por lotes."""
+    rng = np.random.default_rng(semilla)
+    cartas = np.array([valor * 10 + palo for palo in range(1, 5) for valor in range(2, 15)])
+    manos = np.array([rng.choice(cartas, 7, replace=False) for _ in range(num_peticiones)])
+    cuerpos = [json.dumps({"cartas_jugador": mano[:2].tolist(), "num_rivales": int(rng.integers(1, 9)),
+                           "comunitarias": mano[2:].tolist()}).encode() for mano in manos]
+
+    servidor, lotes = await iniciar_servidor(modelo, puerto=0, max_lote=max_lote, espera_ms=espera_ms)
+    puerto = servidor.sockets[0].getsockname()[1]
+    resultados = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*[_cliente("127.0.0.1", puerto, cuerpos[i::concurrencia], resultados) for i in range(concurrencia)])
+    tiempo = time.perf_counter() - inicio
+    metricas = lotes.metricas()
+    servidor.close()
+    await lotes.detener()
+
+    # Capacidad del modelo prediciendo directamente en lotes del mismo tamaño medio
+    X = features_mano(manos[:, :2], 3, manos[:, 2:])
+    tam = max(1, int(metricas["situaciones_por_lote"]))
+    inicio_lotes = time.perf_counter()
+    for i in range(0, len(X), tam):
+        modelo.predecir(X[i:i + tam])
+    capacidad = len(X) / (time.perf_counter() - inicio_lotes)
+
+    inicio_una = time.perf_counter()
+    for fila in X[:500]:
+        modelo.predecir(fila[None])
+    una_a_una = 500 / (time.perf_counter() - inicio_una)
+
+    latencias = np.array([latencia for _, latencia in resultados]) * 1000
+    return {
+        "peticiones_por_segundo": num_peticiones / tiempo,
+        "correctas": sum(estado == 200 for estado, _ in resultados),
+        "latencia_cliente_ms": {f"p{p}": float(np.percentile(latencias, p)) for p in (50, 90, 99)},
+        "servidor": metricas,
+        "capacidad_por_lotes": capacidad,
+        "una_a_una": una_a_una,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de predicciones del modelo con microlotes.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección en la que se escucha")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto TCP")
+    parser.add_argument("--socket", help="Escucha en un socket Unix en lugar de un puerto")
+    parser.add_argument("--modelo", default=RUTA_MODELO, help="Modelo exportado (.npz)")
+    parser.add_argument("--max-lote", type=int, default=1024, help="Situaciones máximas por llamada al modelo")
+    parser.add_argument("--espera-ms", type=float, default=2.0, help="Ventana de espera para juntar peticiones (ms)")
+    parser.add_argument("--max-cola", type=int, default=8192, help="Situaciones en cola a partir de las cuales se rechazan peticiones")
+    parser.add_argument("--prueba-carga", type=int, metavar="PETICIONES", help="Mide el rendimiento con peticiones simultáneas y termina")
+    parser.add_argument("--concurrencia", type=int, default=64, help="Clientes simultáneos de la prueba de carga")
+    args = parser.parse_args()
+
+    modelo = cargar_modelo() if args.modelo == RUTA_MODELO else ModeloNumpy(args.modelo)
+
+    if args.prueba_carga:
+        resultado = asyncio.run(prueba_carga(modelo, args.prueba_carga, args.concurrencia, args.max_lote, args.espera_ms))
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        return
+
+    async def servir():
+        servidor, _ = await iniciar_servidor(modelo, args.host, args.puerto, args.socket, args.max_lote, args.espera_ms, args.max_cola)
+        print(f"Servidor de predicciones en {args.socket or f'http://{args.host}:{args.puerto}'}")
+        async with servidor:
+            await servidor.serve_forever()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
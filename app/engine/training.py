@@ -0,0 +1,379 @@
+# ENTRENAMIENTO POR FRAGMENTOS PARA DATASETS MAYORES QUE LA MEMORIA
+#
+# El notebook poker_ai.ipynb carga el dataset entero, ajusta el MinMaxScaler con todo él y pasa
+# arrays en memoria a model.fit, lo que limita el entrenamiento a unos pocos millones de manos.
+# Este módulo entrena el mismo modelo leyendo el dataset por fragmentos (las partes que escribe
+# engine.generator o ficheros .pmd), mapeados en memoria y sin cargarlos nunca enteros:
+#
+#   - La división en entrenamiento y validación es por fragmentos y determinista: cada
+#     fragmento va a validación según un hash de su nombre y de la semilla, así que no depende
+#     del orden de los ficheros ni del número de procesos.
+#   - El scaler se ajusta en una sola pasada que calcula en paralelo el mínimo y el máximo de
+#     cada feature en cada fragmento de entrenamiento.
+#   - En cada época se barajan los bloques de todos los fragmentos, varios procesos construyen
+#     y escalan las features de los bloques siguientes mientras se entrena (prefetch) y los
+#     bloques se mezclan en un buffer de tamaño fijo antes de formar los lotes.
+#
+# La memoria depende del tamaño del buffer y de los bloques, no del número de manos.
+#
+# Cada fila se entrena con una distribución de resultados y un peso: en las partes del
+# generador, el resultado de la mano con peso 1, y en las del dataset compactado
+# (engine.compaction), las proporciones de sus recuentos con peso igual al número de manos.
+#
+# Uso (desde la carpeta app/, necesita TensorFlow):
+#   python -m engine.generator --manos 100000000 --destino ../data/partes
+#   python -m engine.training ../data/partes --epocas 50 --validacion 0.05
+#   python -m engine.compaction ../data/partes --destino ../data/compacto
+#   python -m engine.training ../data/compacto --epocas 50 --validacion 0.05
+
+import argparse
+import glob
+import math
+import multiprocessing
+import os
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from engine.dataset import cargar_dataset
+from engine.features import FEATURES, matriz_features
+from engine.inference import RUTA_KERAS, RUTA_SCALER, exportar_desde_ficheros
+from engine.profiling import tramo, volcar_proceso
+from engine.writer import leer_columnas
+
+TAM_BLOQUE = 65536
+TAM_BUFFER = 1000000
+TAM_LOTE = 1024
+
+# Bloques en cola por proceso mientras se entrena con los anteriores
+BLOQUES_POR_PROCESO = 2
+
+
+# FRAGMENTOS
+
+def listar_fragmentos(rutas):
+    """Fragmentos del dataset: carpetas de columnas (partes del generador) y ficheros .pmd."""
+    fragmentos = []
+    for patron in rutas:
+        for ruta in sorted(glob.glob(patron)) or [patron]:
+            if os.path.isdir(ruta) and os.path.exists(os.path.join(ruta, "columnas.json")):
+                fragmentos.append(ruta)
+            elif os.path.isdir(ruta):
+                fragmentos.extend(listar_fragmentos([os.path.join(ruta, "parte_*[0-9]"), os.path.join(ruta, "*.pmd")]))
+            elif ruta.endswith(".pmd") and os.path.exists(ruta):
+                fragmentos.append(ruta)
+    return fragmentos
+
+
+def abrir_fragmento(fragmento):
+    """Columnas del fragmento mapeadas en memoria."""
+    return cargar_dataset(fragmento) if fragmento.endswith(".pmd") else leer_columnas(fragmento)
+
+
+def dividir_fragmentos(fragmentos, validacion=0.1, semilla=42):
+    """Fragmentos de entrenamiento y de validación, según un hash del nombre de cada fragmento."""
+    def posicion(fragmento):
+        nombre = os.path.basename(os.path.normpath(fragmento))
+        return zlib.crc32(f"{semilla}:{nombre}".encode("utf-8")) / 2 ** 32
+
+    entrenamiento = [f for f in fragmentos if posicion(f) >= validacion]
+    validacion_ = [f for f in fragmentos if posicion(f) < validacion]
+
+    # Con pocos fragmentos, al menos uno para validación (el de menor hash)
+    if not validacion_ and validacion > 0 and len(fragmentos) > 1:
+        primero = min(fragmentos, key=posicion)
+        entrenamiento.remove(primero)
+        validacion_ = [primero]
+    return entrenamiento, validacion_
+
+
+# SCALER EN UNA PASADA
+
+def _minimo_maximo(argumentos):
+    fragmento, tam_bloque = argumentos
+    columnas = abrir_fragmento(fragmento)
+    num_filas = len(columnas["resultado"])
+    minimo = np.full(len(FEATURES), np.inf)
+    maximo = np.full(len(FEATURES), -np.inf)
+    for inicio in range(0, num_filas, tam_bloque):
+        X = matriz_features({c: v[inicio:inicio + tam_bloque] for c, v in columnas.items()})
+        minimo = np.minimum(minimo, X.min(axis=0))
+        maximo = np.maximum(maximo, X.max(axis=0))
+    return minimo, maximo, num_filas
+
+
+def ajustar_scaler(fragmentos, procesos=None, tam_bloque=TAM_BLOQUE):
+    """MinMaxScaler igual al de fit() sobre todas las filas, calculado fragmento a fragmento en paralelo."""
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
+
+    with multiprocessing.get_context("spawn").Pool(procesos) as pool:
+        resultados = pool.map(_minimo_maximo, [(fragmento, tam_bloque) for fragmento in fragmentos])
+    minimo = np.min([r[0] for r in resultados], axis=0)
+    maximo = np.max([r[1] for r in resultados], axis=0)
+
+    # Ajustar con el mínimo y el máximo da el mismo scaler que con todas las filas
+    scaler = MinMaxScaler()
+    scaler.fit(pd.DataFrame([minimo, maximo], columns=FEATURES))
+    scaler.n_samples_seen_ = sum(r[2] for r in resultados)
+    return scaler
+
+
+# FLUJO DE LOTES
+
+_escala, _minimo = None, None
+
+
+def _iniciar_proceso(escala, minimo):
+    global _escala, _minimo
+    _escala, _minimo = escala, minimo
+
+
+def etiquetas_y_pesos(columnas):
+    """Distribución de resultados (N, 3) y peso (N,) de cada fila: recuentos normalizados o el resultado con peso 1."""
+    if "conteos" in columnas:
+        conteos = np.asarray(columnas["conteos"], dtype=np.float32)
+        pesos = conteos.sum(axis=1)
+        return conteos / pesos[:, None], pesos
+    resultados = np.asarray(columnas["resultado"], dtype=np.int64)
+    return np.eye(3, dtype=np.float32)[resultados], np.ones(len(resultados), dtype=np.float32)
+
+
+def _leer_bloque(argumentos):
+    # Features escaladas (float32), etiquetas y pesos de un bloque, barajados si hay semilla
+    fragmento, inicio, fin, semilla = argumentos
+    with tramo("entrenamiento.bloque"):
+        columnas = {c: v[inicio:fin] for c, v in abrir_fragmento(fragmento).items()}
+        X = matriz_features(columnas).astype(np.float32)
+        X = X * _escala + _minimo
+        Y, pesos = etiquetas_y_pesos(columnas)
+        if semilla is not None:
+            orden = np.random.default_rng(semilla).permutation(len(pesos))
+            X, Y, pesos = X[orden], Y[orden], pesos[orden]
+    volcar_proceso()
+    return X, Y, pesos
+
+
+class FlujoLotes:
+    """Lotes (X escalado, etiquetas, pesos) de un conjunto de fragmentos, leídos y preparados en paralelo."""
+
+    def __init__(self, fragmentos, scaler, tam_lote=TAM_LOTE, barajar=True, tam_buffer=TAM_BUFFER,
+                 semilla=42, procesos=None, tam_bloque=TAM_BLOQUE):
+        self.fragmentos = fragmentos
+        self.escala = np.asarray(scaler.scale_, dtype=np.float32)
+        self.minimo = np.asarray(scaler.min_, dtype=np.float32)
+        self.tam_lote = tam_lote
+        self.barajar = barajar
+        self.tam_buffer = tam_buffer
+        self.semilla = semilla
+        self.procesos = procesos or os.cpu_count()
+        self.pool = None
+
+        self.bloques = []
+        for fragmento in fragmentos:
+            num_filas = len(abrir_fragmento(fragmento)["resultado"])
+            self.bloques.extend((fragmento, inicio, min(inicio + tam_bloque, num_filas)) for inicio in range(0, num_filas, tam_bloque))
+        self.num_filas = sum(fin - inicio for _, inicio, fin in self.bloques)
+
+    def pasos_por_epoca(self):
+        """Lotes por época: solo lotes completos al barajar y todas las filas si no."""
+        if self.barajar:
+            return self.num_filas // self.tam_lote
+        return math.ceil(self.num_filas / self.tam_lote)
+
+    def iniciar(self):
+        """Crea los procesos que preparan los bloques."""
+        if self.pool is None:
+            self.pool = multiprocessing.get_context("spawn").Pool(
+                self.procesos, initializer=_iniciar_proceso, initargs=(self.escala, self.minimo))
+
+    def _bloques(self, epoca):
+        # Bloques de la época en orden aleatorio (o en orden si no se baraja), con prefetch acotado
+        self.iniciar()
+
+        if self.barajar:
+            rng = np.random.default_rng(np.random.SeedSequence(self.semilla, spawn_key=(epoca,)))
+            orden = rng.permutation(len(self.bloques))
+            semillas = rng.integers(0, 2 ** 63, len(self.bloques))
+            tareas = [self.bloques[i] + (int(semillas[j]),) for j, i in enumerate(orden)]
+        else:
+            tareas = [bloque + (None,) for bloque in self.bloques]
+
+        pendientes = deque()
+        for tarea in tareas:
+            pendientes.append(self.pool.apply_async(_leer_bloque, (tarea,)))
+            if len(pendientes) >= self.procesos * BLOQUES_POR_PROCESO:
+                yield pendientes.popleft().get()
+        while pendientes:
+            yield pendientes.popleft().get()
+
+    def epoca(self, numero=0):
+        """Lotes de una época."""
+        if not self.barajar:
+            resto = (np.empty((0, len(FEATURES)), np.float32), np.empty((0, 3), np.float32), np.empty(0, np.float32))
+            for bloque in self._bloques(numero):
+                bloque = tuple(np.concatenate([r, b]) for r, b in zip(resto, bloque))
+                completos = len(bloque[0]) // self.tam_lote * self.tam_lote
+                for inicio in range(0, completos, self.tam_lote):
+                    yield tuple(array[inicio:inicio + self.tam_lote] for array in bloque)
+                resto = tuple(array[completos:] for array in bloque)
+            if len(resto[0]):
+                yield resto
+            return
+
+        # Buffer de mezcla: se llena con bloques de fragmentos distintos, se baraja y se reparte en
+        # lotes; lo que no llega a un lote pasa al siguiente buffer
+        rng = np.random.default_rng(np.random.SeedSequence(self.semilla, spawn_key=(numero, 1)))
+        buffer, filas = [], 0
+        bloques = self._bloques(numero)
+        terminado = False
+        while not terminado:
+            for bloque in bloques:
+                buffer.append(bloque)
+                filas += len(bloque[0])
+                if filas >= self.tam_buffer:
+                    break
+            else:
+                terminado = True
+
+            arrays = tuple(np.concatenate(partes) for partes in zip(*buffer))
+            orden = rng.permutation(len(arrays[0]))
+            completos = len(orden) // self.tam_lote * self.tam_lote
+            for inicio in range(0, completos, self.tam_lote):
+                indices = orden[inicio:inicio + self.tam_lote]
+                yield tuple(array[indices] for array in arrays)
+            buffer = [tuple(array[orden[completos:]] for array in arrays)]
+            filas = len(buffer[0][0])
+
+    def __iter__(self):
+        # Épocas sin fin, para model.fit con steps_per_epoch
+        numero = 0
+        while True:
+            yield from self.epoca(numero)
+            numero += 1
+
+    def cerrar(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+
+
+# MODELO Y ENTRENAMIENTO
+
+def crear_modelo(num_features=len(FEATURES)):
+    """La misma red que en poker_ai.ipynb."""
+    from tensorflow.keras.models import Sequential  # type: ignore
+    from tensorflow.keras.optimizers import Adam  # type: ignore
+    from tensorflow.keras.layers import Dense, Input, Dropout, BatchNormalization, LeakyReLU  # type: ignore
+    from tensorflow.keras.regularizers import l2  # type: ignore
+
+    capas = [Input(shape=(num_features,))]
+    for neuronas, dropout in ((1024, 0.3), (512, 0.3), (256, 0.2), (128, 0.1)):
+        capas += [
+            Dense(neuronas, activation=None, kernel_regularizer=l2(0.0001)),
+            BatchNormalization(),
+            LeakyReLU(negative_slope=0.1),
+            Dropout(dropout),
+        ]
+    capas.append(Dense(3, activation='softmax'))
+
+    model = Sequential(capas)
+    # Con etiquetas one-hot, categorical_crossentropy es la sparse_categorical_crossentropy del notebook
+    model.compile(optimizer=Adam(learning_rate=0.0005), loss='categorical_crossentropy',
+                  weighted_metrics=['categorical_accuracy'])
+    return model
+
+
+def _dataset_tf(flujo, epocas_infinitas):
+    import tensorflow as tf
+
+    def generador():
+        if epocas_infinitas:
+            yield from flujo
+        else:
+            while True:
+                yield from flujo.epoca(0)
+
+    firma = (tf.TensorSpec(shape=(None, len(FEATURES)), dtype=tf.float32), tf.TensorSpec(shape=(None, 3), dtype=tf.float32),
+             tf.TensorSpec(shape=(None,), dtype=tf.float32))
+    return tf.data.Dataset.from_generator(generador, output_signature=firma).prefetch(tf.data.AUTOTUNE)
+
+
+def entrenar(rutas, ruta_modelo=RUTA_KERAS, ruta_scaler=RUTA_SCALER, epocas=50, tam_lote=TAM_LOTE, validacion=0.1,
+             tam_buffer=TAM_BUFFER, procesos=None, semilla=42, exportar=True):
+    """Entrena el modelo con los fragmentos del dataset y guarda el modelo y el scaler (y el .npz de la App)."""
+    import joblib
+
+    fragmentos = listar_fragmentos(rutas)
+    if not fragmentos:
+        raise ValueError(f"No se han encontrado fragmentos del dataset en {rutas}")
+    entrenamiento, fragmentos_validacion = dividir_fragmentos(fragmentos, validacion, semilla)
+    print(f"{len(entrenamiento)} fragmentos de entrenamiento y {len(fragmentos_validacion)} de validación")
+
+    inicio = time.perf_counter()
+    scaler = ajustar_scaler(entrenamiento, procesos)
+    joblib.dump(scaler, ruta_scaler)
+    print(f"Scaler ajustado con {scaler.n_samples_seen_:,} manos en {time.perf_counter() - inicio:.1f} s")
+
+    # Los procesos que preparan los lotes se crean antes de importar TensorFlow
+    with FlujoLotes(entrenamiento, scaler, tam_lote, True, tam_buffer, semilla, procesos) as flujo, \
+            FlujoLotes(fragmentos_validacion, scaler, tam_lote, False, tam_buffer, semilla, procesos) as flujo_validacion:
+        flujo.iniciar()
+        flujo_validacion.iniciar()
+
+        from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping, ModelCheckpoint  # type: ignore
+
+        model = crear_modelo()
+        callbacks = [
+            EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True),
+            ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=3, min_lr=1e-6),
+            ModelCheckpoint(ruta_modelo, save_best_only=True, monitor='val_loss'),
+        ]
+        historia = model.fit(
+            _dataset_tf(flujo, True),
+            epochs=epocas,
+            steps_per_epoch=flujo.pasos_por_epoca(),
+            validation_data=_dataset_tf(flujo_validacion, False) if fragmentos_validacion else None,
+            validation_steps=flujo_validacion.pasos_por_epoca() if fragmentos_validacion else None,
+            callbacks=callbacks if fragmentos_validacion else [],
+        )
+    if not fragmentos_validacion:
+        model.save(ruta_modelo)
+
+    if exportar:
+        diferencia = exportar_desde_ficheros(ruta_modelo, ruta_scaler)
+        print(f"Modelo exportado para la App (diferencia máxima con Keras: {diferencia:.2e})")
+    return historia
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el modelo leyendo el dataset por fragmentos, sin cargarlo en memoria.")
+    parser.add_argument("rutas", nargs="+", help="Carpetas de partes del generador, carpetas de columnas o ficheros .pmd")
+    parser.add_argument("--modelo", default=RUTA_KERAS, help="Fichero .keras de salida")
+    parser.add_argument("--scaler", default=RUTA_SCALER, help="Fichero .pkl de salida del scaler")
+    parser.add_argument("--epocas", type=int, default=50, help="Número máximo de épocas")
+    parser.add_argument("--tam-lote", type=int, default=TAM_LOTE, help="Tamaño del lote (batch_size)")
+    parser.add_argument("--validacion", type=float, default=0.1, help="Fracción de fragmentos para validación")
+    parser.add_argument("--tam-buffer", type=int, default=TAM_BUFFER, help="Filas del buffer de mezcla")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos que preparan los lotes (por defecto, todos los núcleos)")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla de la división y del barajado")
+    parser.add_argument("--sin-exportar", action="store_true", help="No exporta el modelo a NumPy al terminar")
+    args = parser.parse_args()
+
+    try:
+        entrenar(args.rutas, args.modelo, args.scaler, args.epocas, args.tam_lote, args.validacion,
+                 args.tam_buffer, args.procesos, args.semilla, not args.sin_exportar)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    main()
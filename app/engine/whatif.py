@@ -0,0 +1,129 @@
+# PREDICCIÓN PARA CADA SIGUIENTE CARTA
+#
+# En el flop o en el turn, en lugar de esperar a que estén las 5 cartas comunitarias, calculamos
+# qué pasaría con cada una de las cartas que pueden salir a continuación. Se construyen las
+# filas de features de todas las continuaciones posibles (en el turn, una por cada river; en el
+# flop, una por cada turn y cada river) y se evalúan con el modelo en una sola llamada. El
+# resultado es la distribución media sobre todas las continuaciones y, para cada siguiente
+# carta, sus probabilidades y si mejora o empeora la mano respecto a esa media.
+#
+# En el turn son 46 filas. En el flop, todas las parejas turn + river son 47 x 46 = 2162 filas;
+# para que la App responda dentro de un frame se prueba solo una muestra de rivers con cada turn
+# (RIOS_POR_CARTA), la misma para todas las cartas, lo que deja unas 750 filas.
+#
+# Uso (desde la carpeta app/):
+#   python -m engine.whatif --jugador A♠ K♠ --mesa Q♠ J♠ 2♦ --rivales 2
+
+import argparse
+import time
+
+import numpy as np
+
+from engine.batch_evaluator import evaluar_fuerzas
+from engine.cards import BARAJA, carta_a_numero, numero_a_carta
+from engine.features import features_mano
+from engine.evaluator import NOMBRES_MANO
+from engine.inference import CLASES, cargar_modelo
+from engine.profiling import medir
+
+_BARAJA = np.array(BARAJA, dtype=np.uint8)
+
+# Diferencia mínima en la probabilidad de victoria para considerar que una carta mejora o empeora
+UMBRAL = 0.02
+
+# Rivers que se prueban con cada turn en el flop (de 46) para que la App no tarde más de un frame
+RIOS_POR_CARTA = 16
+
+
+@medir("whatif.filas")
+def filas_siguiente_carta(cartas_jugador, num_rivales, comunitarias, rios_por_carta=None, semilla=0):
+    """Cartas siguientes posibles (K,) y features (K, M, 17) de las M continuaciones de cada una.
+
+    En el flop, rios_por_carta limita los rivers que se prueban con cada turn (elegidos al azar)
+    para acotar el número de filas.
+    """
+    cartas_jugador = np.asarray(cartas_jugador, dtype=np.int64).astype(np.uint8)
+    comunitarias = np.asarray(comunitarias, dtype=np.int64).astype(np.uint8)
+    if len(comunitarias) not in (3, 4):
+        raise ValueError("La siguiente carta solo se puede calcular en el flop o en el turn")
+
+    desconocidas = _BARAJA[~np.isin(_BARAJA, np.concatenate([cartas_jugador, comunitarias]))]
+    num_siguientes = len(desconocidas)
+    if len(comunitarias) == 4:
+        tableros = np.concatenate([np.broadcast_to(comunitarias, (num_siguientes, 4)), desconocidas[:, None]], axis=1)[:, None, :]
+    else:
+        # Para cada turn, los rivers son el resto de cartas desconocidas
+        rios = np.array([np.delete(np.arange(num_siguientes), i) for i in range(num_siguientes)])
+        if rios_por_carta is not None and rios_por_carta < rios.shape[1]:
+            rios = np.random.default_rng(semilla).permuted(rios, axis=1)[:, :rios_por_carta]
+        tableros = np.concatenate([
+            np.broadcast_to(comunitarias, rios.shape + (3,)),
+            np.broadcast_to(desconocidas[:, None, None], rios.shape + (1,)),
+            desconocidas[rios][:, :, None]], axis=2)
+
+    num_continuaciones = tableros.shape[1]
+    filas = features_mano(np.broadcast_to(cartas_jugador, (num_siguientes * num_continuaciones, 2)),
+                          num_rivales, tableros.reshape(-1, 5))
+    return desconocidas, filas.reshape(num_siguientes, num_continuaciones, -1)
+
+
+def predecir_siguiente_carta(modelo, cartas_jugador, num_rivales, comunitarias, rios_por_carta=None, umbral=UMBRAL):
+    """Distribución media sobre las continuaciones y efecto de cada posible siguiente carta."""
+    siguientes, filas = filas_siguiente_carta(cartas_jugador, num_rivales, comunitarias, rios_por_carta)
+
+    # Una sola llamada al modelo con todas las continuaciones
+    probabilidades = modelo.predecir(filas.reshape(-1, filas.shape[2])).reshape(filas.shape[0], filas.shape[1], 3).mean(axis=1)
+    media = probabilidades.mean(axis=0)
+
+    # Categoría de la mano del jugador con cada siguiente carta
+    manos = np.concatenate([
+        np.broadcast_to(np.asarray(cartas_jugador, dtype=np.int64).astype(np.uint8), (len(siguientes), 2)),
+        np.broadcast_to(np.asarray(comunitarias, dtype=np.int64).astype(np.uint8), (len(siguientes), len(comunitarias))),
+        siguientes[:, None]], axis=1)
+    categorias = evaluar_fuerzas(manos) >> 20
+
+    diferencia = probabilidades[:, 2] - media[2]
+    orden = np.argsort(-diferencia, kind="stable")
+    resultado = {clase: float(media[i]) for i, clase in enumerate(CLASES)}
+    resultado["Clase"] = CLASES[int(np.argmax(media))]
+    resultado["Cartas"] = siguientes
+    resultado["Probabilidades"] = probabilidades
+    resultado["Categorias"] = categorias
+    resultado["Mejoran"] = [int(siguientes[i]) for i in orden if diferencia[i] > umbral]
+    resultado["Empeoran"] = [int(siguientes[i]) for i in orden[::-1] if diferencia[i] < -umbral]
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predice el resultado con cada posible siguiente carta en el flop o en el turn.")
+    parser.add_argument("--jugador", nargs=2, required=True, help="Cartas del jugador (por ejemplo A♠ K♠)")
+    parser.add_argument("--mesa", nargs="+", required=True, help="Cartas comunitarias (3 o 4)")
+    parser.add_argument("--rivales", type=int, default=1, help="Número de rivales")
+    parser.add_argument("--rios", type=int, default=None, help="Rivers que se prueban con cada turn en el flop (por defecto, todos)")
+    args = parser.parse_args()
+
+    if len(args.mesa) not in (3, 4):
+        parser.error("La mesa debe tener 3 o 4 cartas")
+    try:
+        jugador = [carta_a_numero(carta) for carta in args.jugador]
+        mesa = [carta_a_numero(carta) for carta in args.mesa]
+    except KeyError as error:
+        parser.error(f"Carta no válida: {error}")
+    if len(set(jugador + mesa)) != len(jugador + mesa):
+        parser.error("Hay cartas repetidas")
+
+    modelo = cargar_modelo()
+    inicio = time.perf_counter()
+    resultado = predecir_siguiente_carta(modelo, jugador, args.rivales, mesa, args.rios)
+    tiempo = time.perf_counter() - inicio
+
+    print(f"Media: Derrota: {resultado['Derrota']:.2%} | Empate: {resultado['Empate']:.2%} | Victoria: {resultado['Victoria']:.2%} ({tiempo * 1000:.1f} ms)")
+    orden = np.argsort(-resultado["Probabilidades"][:, 2], kind="stable")
+    for i in orden:
+        derrota, empate, victoria = resultado["Probabilidades"][i]
+        print(f"{numero_a_carta(int(resultado['Cartas'][i])):>4} {NOMBRES_MANO[int(resultado['Categorias'][i])]:<16} "
+              f"Derrota: {derrota:.2%} | Empate: {empate:.2%} | Victoria: {victoria:.2%}")
+
+
+if __name__ == "__main__":
+    main()
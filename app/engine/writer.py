@@ -0,0 +1,183 @@
+# ESCRITURA DEL DATASET POR BLOQUES
+#
+# En lugar de acumular una fila (dict) por mano y crear un DataFrame al final, el dataset se
+# escribe en disco por grupos de filas de tamaño fijo. Cada columna es un array de uint8 que se
+# añade a su propio fichero binario (<columna>.bin), así que la memoria usada solo depende del
+# tamaño del grupo y no del número de manos generadas. Al cerrar se escribe columnas.json con
+# el esquema y el número de manos, que marca el conjunto como completo. Otros conjuntos (como el
+# dataset compactado de engine.compaction) pueden añadir columnas de otros tipos, que se anotan
+# en el esquema.
+
+import json
+import os
+
+import numpy as np
+
+from engine.cards import BARAJA, numero_a_carta
+from engine.evaluator import NOMBRES_MANO
+
+# Columnas del dataset y número de valores (uint8) por mano
+COLUMNAS = {
+    "cartas_jugador": 2,
+    "num_rivales": 1,
+    "mano_preflop": 1,
+    "flop": 3,
+    "mano_flop": 1,
+    "cartas_flop": 5,
+    "turn": 1,
+    "mano_turn": 1,
+    "cartas_turn": 5,
+    "river": 1,
+    "mano_river": 1,
+    "cartas_river": 5,
+    "resultado": 1,
+}
+
+# Codificación de las columnas categóricas (la misma con la que se entrenó el modelo)
+NOMBRES_PREFLOP = {0: "Carta Alta Offsuit", 1: "Carta Alta Suited", 2: "Pareja Offsuit"}
+RESULTADOS = {0: "Derrota", 1: "Empate", 2: "Victoria"}
+
+TAM_GRUPO = 65536
+
+
+class EscritorColumnas:
+    """Escribe el dataset en una carpeta con un fichero binario por columna, por grupos de filas."""
+
+    def __init__(self, directorio, tam_grupo=TAM_GRUPO, metadatos=None, columnas=COLUMNAS, tipos=None):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.tam_grupo = tam_grupo
+        self.metadatos = metadatos or {}
+        self.columnas = columnas
+        # Tipo de las columnas que no son uint8
+        self.tipos = tipos or {}
+        self.num_manos = 0
+        self.ocupadas = 0
+
+        # Un buffer fijo por columna que se vuelca a disco cada vez que se llena
+        self.buffers = {
+            columna: np.empty((tam_grupo, ancho) if ancho > 1 else tam_grupo, dtype=self.tipos.get(columna, np.uint8))
+            for columna, ancho in columnas.items()
+        }
+        self.ficheros = {columna: open(os.path.join(directorio, f"{columna}.bin"), "wb") for columna in columnas}
+
+    def escribir(self, columnas):
+        """Añade un bloque de manos (dict de arrays con las columnas del dataset)."""
+        num_manos = len(columnas["resultado"])
+        inicio = 0
+        while inicio < num_manos:
+            cuantas = min(self.tam_grupo - self.ocupadas, num_manos - inicio)
+            for columna, buffer in self.buffers.items():
+                buffer[self.ocupadas:self.ocupadas + cuantas] = columnas[columna][inicio:inicio + cuantas]
+            self.ocupadas += cuantas
+            inicio += cuantas
+            if self.ocupadas == self.tam_grupo:
+                self._volcar()
+
+    def _volcar(self):
+        for columna, buffer in self.buffers.items():
+            buffer[:self.ocupadas].tofile(self.ficheros[columna])
+            self.ficheros[columna].flush()
+        self.num_manos += self.ocupadas
+        self.ocupadas = 0
+
+    def cerrar(self):
+        """Vuelca las últimas filas y guarda el esquema."""
+        self._volcar()
+        for fichero in self.ficheros.values():
+            fichero.close()
+        with open(os.path.join(self.directorio, "columnas.json"), "w", encoding="utf-8") as f:
+            esquema = {"columnas": self.columnas, "num_manos": self.num_manos, **self.metadatos}
+            if self.tipos:
+                esquema["tipos"] = self.tipos
+            json.dump(esquema, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.cerrar()
+        else:
+            for fichero in self.ficheros.values():
+                fichero.close()
+
+
+def leer_columnas(directorio):
+    """Abre una carpeta escrita con EscritorColumnas como arrays de NumPy mapeados en memoria."""
+    with open(os.path.join(directorio, "columnas.json"), encoding="utf-8") as f:
+        esquema = json.load(f)
+    num_manos = esquema["num_manos"]
+    tipos = esquema.get("tipos", {})
+    columnas = {}
+    for columna, ancho in esquema["columnas"].items():
+        forma = (num_manos, ancho) if ancho > 1 else (num_manos,)
+        tipo = np.dtype(tipos.get(columna, np.uint8))
+        ruta = os.path.join(directorio, f"{columna}.bin")
+        columnas[columna] = np.memmap(ruta, dtype=tipo, mode="r", shape=forma) if num_manos else np.empty(forma, tipo)
+    return columnas
+
+
+def iterar_lotes(columnas, tam_lote=TAM_GRUPO):
+    """Recorre las columnas por bloques de tam_lote manos."""
+    num_manos = len(columnas["resultado"])
+    for inicio in range(0, num_manos, tam_lote):
+        yield {columna: valores[inicio:inicio + tam_lote] for columna, valores in columnas.items()}
+
+
+# ESCRITURA EN CSV (mismo formato que el notebook)
+
+_TEXTO_CARTAS = np.array([numero_a_carta(codigo) if codigo in BARAJA else "" for codigo in range(145)], dtype=object)
+
+
+def _lista_cartas(codigos):
+    # "['10♣', 'Q♦']" igual que str() de una lista de Python
+    codigos = np.asarray(codigos).reshape(len(codigos), -1)
+    texto = _TEXTO_CARTAS[codigos]
+    columna = "['" + texto[:, 0]
+    for i in range(1, codigos.shape[1]):
+        columna = columna + "', '" + texto[:, i]
+    return columna + "']"
+
+
+def a_dataframe(columnas):
+    """Convierte un bloque de columnas al DataFrame con el formato del dataset original."""
+    import pandas as pd
+
+    nombres_mano = np.array([""] + list(NOMBRES_MANO.values()), dtype=object)
+    return pd.DataFrame({
+        "cartas_jugador": _lista_cartas(columnas["cartas_jugador"]),
+        "num_rivales": np.asarray(columnas["num_rivales"]),
+        "mano_preflop": np.array(list(NOMBRES_PREFLOP.values()), dtype=object)[columnas["mano_preflop"]],
+        "flop": _lista_cartas(columnas["flop"]),
+        "mano_flop": nombres_mano[columnas["mano_flop"]],
+        "cartas_flop": _lista_cartas(columnas["cartas_flop"]),
+        "turn": _lista_cartas(columnas["turn"]),
+        "mano_turn": nombres_mano[columnas["mano_turn"]],
+        "cartas_turn": _lista_cartas(columnas["cartas_turn"]),
+        "river": _lista_cartas(columnas["river"]),
+        "mano_river": nombres_mano[columnas["mano_river"]],
+        "cartas_river": _lista_cartas(columnas["cartas_river"]),
+        "resultado": np.array(list(RESULTADOS.values()), dtype=object)[columnas["resultado"]],
+    })
+
+
+class EscritorCSV:
+    """Escribe el dataset en CSV bloque a bloque, sin acumularlo en memoria."""
+
+    def __init__(self, ruta):
+        self.fichero = open(ruta, "w", encoding="utf-8", newline="")
+        self.cabecera = True
+
+    def escribir(self, columnas):
+        a_dataframe(columnas).to_csv(self.fichero, header=self.cabecera, index=False)
+        self.cabecera = False
+
+    def cerrar(self):
+        self.fichero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
@@ -1,16 +1,24 @@
 import pygame
 import os
-from utils import load_image, load_font, sound_manager, load_card_images
-from itertools import combinations
-from collections import Counter
-from keras.models import load_model  # type: ignore
-import joblib
-import pandas as pd
+from utils import load_image, load_font, sound_manager, load_card_images, model_manager
+from engine.features import features_mano
+from engine.equity import equity_exacta, estimar_tiempo
+from engine.cache import CacheResultados, clave_canonica
+from engine.inference import CLASES
+from engine.whatif import predecir_siguiente_carta, RIOS_POR_CARTA
+from engine.profiling import medir
 import numpy as np
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Segundos que puede tardar la equity exacta para usarla en lugar del modelo
+PRESUPUESTO_EQUITY = 0.1
+
+# Predicciones ya calculadas, por situación canónica (compartidas por todas las manos)
+cache_predicciones = CacheResultados()
+
 class HandScreen:
+    @medir("pantalla.HandScreen")
     def __init__(self, carta_1, carta_2, num_rivales):
         
         # Fondo
@@ -57,10 +65,24 @@ class HandScreen:
         self.panel_card_images = {}
         load_card_images(self.panel_card_images, BASE_DIR)
 
+        # Cartas pequeñas para las siguientes cartas que mejoran o empeoran
+        self.mini_card_images = {}
+        self.mini_card_width, self.mini_card_height = 24, 36
+        self.max_mini_cards = 6
+        load_card_images(self.mini_card_images, BASE_DIR, size=(self.mini_card_width, self.mini_card_height))
+
         # Estado del panel de selección
         self.showing_panel = False
         self.card_rects = [] 
 
+        # Fondo oscurecido, panel y texto del panel de selección (se crean una sola vez)
+        self.panel_width, self.panel_height = 770, 550
+        self.overlay = pygame.Surface((800, 600), pygame.SRCALPHA)
+        self.overlay.fill((0, 0, 0, 120))
+        self.panel_surface = pygame.Surface((self.panel_width, self.panel_height), pygame.SRCALPHA)
+        self.panel_surface.fill((200, 200, 200, 200))
+        self.instruction_text = self.main_font.render("Selecciona una carta", True, (0, 0, 0))
+
          # Botón para predecir mano
         self.prediction_button = pygame.Rect(320, 365, 160, 40)
         self.button_text = load_font(os.path.join(os.path.dirname(__file__), '..', 'assets', 'fonts', 'poker_font.ttf'), 24).render("Predicción", True, (255, 255, 255))
@@ -72,11 +94,11 @@ class HandScreen:
         self.back_button_rect = self.back_button_image.get_rect(topright=(800 - 20, 20))
 
 
-        # Cargamos el modelo y el escalador
-        self.model = load_model(os.path.join(BASE_DIR, '..', 'models', 'poker_model.keras'))
-        self.scaler = joblib.load(os.path.join(BASE_DIR, '..', 'models', 'scaler.pkl'))
+        # Área del resultado de la predicción y de las siguientes cartas que mejoran o empeoran
+        self.result_rects = [pygame.Rect(0, 195, 800, 30), pygame.Rect(0, self.prediction_button.y - 22, 800, 70)]
 
         self.prediction_result = None # Resultado de la predicción
+        self.pending_prediction = False # Predicción a la espera de que termine la carga del modelo
 
     def handle_events(self, event):
         # Si el panel de selección está activo
@@ -89,9 +111,11 @@ class HandScreen:
                         self.selected_cards.append(card_id)
                         self.current_card_index += 1
 
-                        # Habilitamos el botón si se han seleccionado 5 cartas
-                        if all(self.community_cards):
+                        # Habilitamos el botón desde el flop (3 cartas) y borramos la predicción anterior
+                        if self.current_card_index >= 3:
                             self.enable_button = True
+                        self.prediction_result = None
+                        self.pending_prediction = False
 
                         if self.current_card_index >= len(self.card_positions):
                             self.current_card_index = len(self.card_positions) - 1
@@ -121,57 +145,83 @@ class HandScreen:
     
         return self
 
-    def predict_hand(self):    
-        
-        mano_final = obtener_mejor_mano(self.selected_cards)[1]             
-        entrada_manual = {
-            "carta_1": int(self.selected_cards[0]),
-            "carta_2": int(self.selected_cards[1]),
-            "num_rivales": self.num_rivales,
-            "mano_preflop": clasificar_mano_preflop(self.selected_cards),
-            "flop_1": int(self.community_cards[0]),
-            "flop_2": int(self.community_cards[1]),
-            "flop_3": int(self.community_cards[2]),
-            "mano_flop": clasificar_mano(
-                [int(self.selected_cards[0]), int(self.selected_cards[1])] + self.community_cards[:3])[0],
-            "turn": int(self.community_cards[3]),
-            "mano_turn": clasificar_mano(
-                [int(self.selected_cards[0]), int(self.selected_cards[1])] + self.community_cards[:4])[0],
-            "river": int(self.community_cards[4]),
-            "mano_river": clasificar_mano(
-                [int(self.selected_cards[0]), int(self.selected_cards[1])] + self.community_cards)[0],
-            "carta_final_1": int(mano_final[0]),
-            "carta_final_2": int(mano_final[1]),
-            "carta_final_3": int(mano_final[2]),
-            "carta_final_4": int(mano_final[3]),
-            "carta_final_5": int(mano_final[4])
-        }
+    def dirty_rects(self, event):
+        # Al abrir o cerrar el panel de selección cambia toda la pantalla (visible_button es el
+        # estado del último dibujo)
+        if self.showing_panel == self.visible_button:
+            return None
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if not self.showing_panel and self.prediction_button.collidepoint(event.pos):
+                return self.result_rects
+            return []
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP, pygame.KEYDOWN, pygame.KEYUP):
+            return []
+        return None
+
+    @medir("prediccion.mano")
+    def predict_hand(self):
+        # En el flop y en el turn calculamos el resultado con cada posible siguiente carta
+        comunitarias = [carta for carta in self.community_cards if carta]
+        if len(comunitarias) < 5:
+            self.prediction_result = self.predict_next_card(comunitarias)
+            return self.prediction_result
+
+        # Las situaciones repetidas o iguales salvo los palos se responden desde la caché
+        clave = clave_canonica(self.selected_cards[:2], self.community_cards, self.num_rivales, por_calles=True)
+        resultado = cache_predicciones.obtener(clave)
+        if resultado is None:
+            resultado = self.compute_prediction()
+            if resultado is not None:
+                resultado = cache_predicciones.guardar(clave, resultado)
+        self.prediction_result = resultado
+        return resultado
 
-        columnas = [
-            "carta_1", "carta_2", "num_rivales", "mano_preflop",
-            "flop_1", "flop_2", "flop_3", "mano_flop", "turn", "mano_turn",
-            "river", "mano_river",
-            "carta_final_1", "carta_final_2", "carta_final_3",
-            "carta_final_4", "carta_final_5"
-        ]
+    @medir("prediccion.calculo")
+    def compute_prediction(self):
+        # Si el cálculo exacto es barato (en el river con pocos rivales) no hace falta el modelo
+        if estimar_tiempo(len(self.community_cards), self.num_rivales) <= PRESUPUESTO_EQUITY:
+            return equity_exacta(self.selected_cards[:2], self.community_cards, self.num_rivales)
 
-        entrada_df = pd.DataFrame([entrada_manual], columns=columnas)
-        entrada_scaled = self.scaler.transform(entrada_df)
+        # Predicción con el modelo compartido (cargado en segundo plano al abrir la App)
+        model = self.get_model()
+        if model is None:
+            return None
 
-        # Predicción
-        probabilidades = self.model.predict(entrada_scaled, verbose=0)
+        # Mismas features que en el entrenamiento (engine.features). El escalado está integrado en el modelo
+        entrada = features_mano(self.selected_cards[:2], self.num_rivales, self.community_cards)
+        probabilidades = model.predecir(entrada)
         clase_predicha = np.argmax(probabilidades)
 
-        clases = ['Derrota', 'Empate', 'Victoria']
         resultado = {
             "Derrota": probabilidades[0][0],
             "Empate": probabilidades[0][1],
             "Victoria": probabilidades[0][2],
-            "Clase": clases[clase_predicha]
+            "Clase": CLASES[clase_predicha]
         }
-        self.prediction_result = resultado
         return resultado
 
+    @medir("prediccion.siguiente_carta")
+    def predict_next_card(self, comunitarias):
+        model = self.get_model()
+        if model is None:
+            return None
+
+        # Todas las continuaciones se evalúan en una sola llamada al modelo
+        return predecir_siguiente_carta(model, self.selected_cards[:2], self.num_rivales, comunitarias, RIOS_POR_CARTA)
+
+    def get_model(self):
+        # Modelo compartido sin bloquear la interfaz: si aún se está cargando, la predicción queda
+        # pendiente y se termina en on_model_status
+        model = model_manager.get_model(timeout=0)
+        self.pending_prediction = model is None and model_manager.error is None
+        return model
+
+    def on_model_status(self):
+        # La App avisa cuando cambia el estado del modelo (cargado o no disponible)
+        if self.pending_prediction and model_manager.is_ready():
+            self.predict_hand()
+        self.pending_prediction = False
+
     def draw(self, screen):
         screen.blit(self.background, (0, 0))
 
@@ -219,23 +269,37 @@ class HandScreen:
             result_surface = self.small_font.render(result_text, True, (255, 255, 255))
             screen.blit(result_surface, (190, 200)) 
 
-        pygame.display.flip()
+            # Siguientes cartas que más mejoran (a la izquierda del botón) y empeoran (a la derecha)
+            if "Mejoran" in self.prediction_result and self.visible_button:
+                self.draw_next_cards(screen, "Mejoran", self.prediction_result["Mejoran"], self.prediction_button.x - 165)
+                self.draw_next_cards(screen, "Empeoran", self.prediction_result["Empeoran"], self.prediction_button.right + 9)
+
+        elif self.pending_prediction:
+            pending_surface = self.small_font.render("Predicción pendiente: cargando modelo...", True, (255, 255, 255))
+            screen.blit(pending_surface, (190, 200))
+
+        # Estado del modelo mientras se carga o si no está disponible
+        if not model_manager.is_ready():
+            status_surface = self.small_font.render(model_manager.status(), True, (255, 255, 255))
+            screen.blit(status_surface, (10, 10))
+
+    def draw_next_cards(self, screen, title, cards, x):
+        title_surface = self.small_font.render(title, True, (255, 255, 255))
+        screen.blit(title_surface, (x, self.prediction_button.y - 20))
+        for i, card in enumerate(cards[:self.max_mini_cards]):
+            card_image = self.mini_card_images[str(card)]
+            screen.blit(card_image, (x + i * (self.mini_card_width + 2), self.prediction_button.y + 8))
 
     def draw_card_selection_panel(self, screen):
         # Dimensiones del panel
-        panel_width, panel_height = 770, 550
+        panel_width, panel_height = self.panel_width, self.panel_height
         panel_x, panel_y = (800 - panel_width) // 2, (600 - panel_height) // 2
 
         # Fondo
-        overlay = pygame.Surface((800, 600), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 120))  
-        screen.blit(overlay, (0, 0))
+        screen.blit(self.overlay, (0, 0))
 
         # Fondo del panel
-        panel_color = (200, 200, 200, 200)  
-        panel_surface = pygame.Surface((panel_width, panel_height), pygame.SRCALPHA)
-        panel_surface.fill(panel_color)
-        screen.blit(panel_surface, (panel_x, panel_y))
+        screen.blit(self.panel_surface, (panel_x, panel_y))
 
         # Dimensiones de las cartas
         card_width, card_height = 50, 75
@@ -263,79 +327,5 @@ class HandScreen:
             card_rect = pygame.Rect(x_pos, y_pos, card_width, card_height)
             self.card_rects.append((card_rect, card_id))
 
-        instruction_text = self.main_font.render("Selecciona una carta", True, (0, 0, 0))
-        instruction_rect = instruction_text.get_rect(center=(400, panel_y + 20))
-        screen.blit(instruction_text, instruction_rect)
-
-# FUNCIONES PARA EVALUAR LA MEJOR MANO POSIBLE
-
-def clasificar_mano(cartas):
-    # Pasamos las cartas a enteros
-    cartas = [int(carta) for carta in cartas]
-
-    # Extraemos valores y palos de las cartas
-    valores = [carta // 10 for carta in cartas] 
-    palos = [carta % 10 for carta in cartas]
-
-    # Frecuencia de los valores de las cartas
-    conteo_valores = Counter(valores)
-    conteo_palos = Counter(palos)
-
-    # Verificaciones
-    es_color = len(conteo_palos) == 1
-    valores.sort()
-
-    # Escalera
-    es_escalera = len(conteo_valores) == 5 and (max(valores) - min(valores)) == 4
-    
-    # Caso especial escalera A, 2, 3, 4, 5
-    if set(valores) == {14, 2, 3, 4, 5}:
-        es_escalera = True
-        valores = [5, 4, 3, 2, 1]
-
-    # Evaluamos las manos
-    if es_color and es_escalera:
-        if set(valores) == {14, 13, 12, 11, 10}:
-            return (10, valores, "Escalera Real")
-        return (9, valores, "Escalera de Color")
-    elif 4 in conteo_valores.values():
-        return (8, valores, "Póker")
-    elif 3 in conteo_valores.values() and 2 in conteo_valores.values():
-        return (7, valores, "Full House")
-    elif es_color:
-        return (6, valores, "Color")
-    elif es_escalera:
-        return (5, valores, "Escalera")
-    elif 3 in conteo_valores.values():
-        return (4, valores, "Trío")
-    elif list(conteo_valores.values()).count(2) == 2:
-        return (3, valores, "Doble Pareja")
-    elif 2 in conteo_valores.values():
-        return (2, valores, "Pareja")
-    else:
-        return (1, valores, "Carta Alta")
-
-def clasificar_mano_preflop(cartas):
-    # Si las dos cartas tienen el mismo valor, es una pareja
-    if cartas[0][:-1] == cartas[1][:-1]:
-        tipo = 2
-    else:
-        # Comprobamos si son del mismo palo
-        if cartas[0][-1] == cartas[1][-1]:
-            tipo = 1
-        else:
-            tipo = 0
-    
-    return tipo
-
-def obtener_mejor_mano(cartas):
-    combinaciones_manos = combinations(cartas, 5)
-    
-    # Evaluamos una mano con desempate por kicker
-    def evaluar_mano(c):
-        clasificacion, valores, _ = clasificar_mano(c)
-        return (clasificacion, valores)  # Clasificación principal y desempate por valores
-
-    # Seleccionamos la mejor mano considerando clasificación y desempates
-    mejor_mano = max(combinaciones_manos, key=evaluar_mano)
-    return clasificar_mano(mejor_mano), mejor_mano
+        instruction_rect = self.instruction_text.get_rect(center=(400, panel_y + 20))
+        screen.blit(self.instruction_text, instruction_rect)
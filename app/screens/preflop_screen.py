@@ -1,11 +1,13 @@
 import pygame
 import os
 from utils import load_image, load_font, load_card_images, sound_manager
-from screens.hand_screen import HandScreen
+from engine.preflop import equity_preflop
+from engine.profiling import medir
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 class PreflopScreen():
+    @medir("pantalla.PreflopScreen")
     def __init__(self):
         # Cargamos el fonto de pantalla y la fuente
         self.background = load_image(os.path.join(BASE_DIR, '..', 'assets', 'img', 'background', 'background_menu.png'), (800, 600))
@@ -16,6 +18,10 @@ class PreflopScreen():
         self.card_rects = []
         load_card_images(self.card_images, BASE_DIR)
 
+        # Cartas seleccionadas, más grandes
+        self.selected_card_images = {}
+        load_card_images(self.selected_card_images, BASE_DIR, size=(60, 90))
+
         # Área de selección
         self.selected_cards = []
 
@@ -31,10 +37,21 @@ class PreflopScreen():
         # Tamaño de fuente
         self.main_font = load_font(os.path.join(os.path.dirname(__file__), '..', 'assets', 'fonts', 'poker_font.ttf'), 30)
         self.secondary_font = load_font(os.path.join(os.path.dirname(__file__), '..', 'assets', 'fonts', 'poker_font.ttf'), 24)
+        self.small_font = load_font(os.path.join(os.path.dirname(__file__), '..', 'assets', 'fonts', 'poker_font.ttf'), 18)
 
         # Colores
         self.selected_border_color = (255, 215, 0) 
 
+        # Textos fijos, renderizados una sola vez
+        self.main_text = self.main_font.render("Selecciona tus 2 cartas iniciales", True, (255, 255, 255))
+        self.selected_cards_text = self.secondary_font.render("Cartas seleccionadas:", True, (255, 255, 255))
+        self.rivals_label = self.secondary_font.render("Número de rivales (1-8):", True, (255, 255, 255))
+
+        # Áreas que cambian al seleccionar cartas o escribir los rivales (cartas seleccionadas,
+        # cuadro de texto con la equity y botón de continuar)
+        self.selected_area = pygame.Rect(30, 470, 140, 90)
+        self.input_area = pygame.Rect(self.input_rect.x, self.input_rect.y, 800 - self.input_rect.x, 130)
+
     def handle_events(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             # Manejo de selección de cartas
@@ -51,6 +68,7 @@ class PreflopScreen():
             # Si todo está corréctamente seleccionado, pasamos a la siguiente pantalla
             if self.continue_button.collidepoint(event.pos) and len(self.selected_cards) == 2 and self.rivals_input.isdigit() and 1 <= int(self.rivals_input) <= 8:
                 sound_manager.play_sound("button")
+                from screens.hand_screen import HandScreen
                 return HandScreen(self.selected_cards[0], self.selected_cards[1], int(self.rivals_input))
 
         # Capturamos entrada de texto
@@ -62,6 +80,17 @@ class PreflopScreen():
 
         return self
 
+    def dirty_rects(self, event):
+        # Un clic solo cambia la carta pulsada y la parte de abajo, y una tecla el cuadro de los rivales
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            clicked = [rect.inflate(8, 8) for rect, _ in self.card_rects if rect.collidepoint(event.pos)]
+            return clicked + [self.selected_area, self.input_area, self.continue_button]
+        if event.type == pygame.KEYDOWN:
+            return [self.input_area, self.continue_button]
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP, pygame.KEYUP):
+            return []
+        return None
+
     def handle_card_selection(self, card_id):
         if card_id in self.selected_cards:
             self.selected_cards.remove(card_id)
@@ -113,13 +142,11 @@ class PreflopScreen():
                 card_index += 1
 
         # Texto de arriba
-        main_text = self.main_font.render("Selecciona tus 2 cartas iniciales", True, (255, 255, 255))
-        instruction_rect = main_text.get_rect(center=(400, start_y - 40))
-        screen.blit(main_text, instruction_rect)
+        instruction_rect = self.main_text.get_rect(center=(400, start_y - 40))
+        screen.blit(self.main_text, instruction_rect)
 
         # Texto de cartas seleccionadas
-        selected_cards_text = self.secondary_font.render("Cartas seleccionadas:", True, (255, 255, 255))
-        screen.blit(selected_cards_text, (30, 430))
+        screen.blit(self.selected_cards_text, (30, 430))
 
         # Dibujamos las cartas seleccionadas
         selected_start_x = 30  
@@ -128,8 +155,7 @@ class PreflopScreen():
         card_width, card_height = 60, 90
 
         for i, card_id in enumerate(self.selected_cards):
-            card_image = self.card_images[card_id]
-            scaled_card = load_image(os.path.join(BASE_DIR, '..', 'assets', 'img', 'cards', f'{card_id}.png'), (card_width, card_height))
+            scaled_card = self.selected_card_images[card_id]
             x_pos = selected_start_x + i * (card_width + selected_margin)
             y_pos = selected_start_y
             screen.blit(scaled_card, (x_pos, y_pos))
@@ -143,8 +169,14 @@ class PreflopScreen():
 
 
         # Mostramos el texto
-        rivals_label = self.secondary_font.render("Número de rivales (1-8):", True, (255, 255, 255))
-        screen.blit(rivals_label, (self.input_rect.x, self.input_rect.y - 40))
+        screen.blit(self.rivals_label, (self.input_rect.x, self.input_rect.y - 40))
+
+        # Mostramos la equity preflop de la tabla precalculada
+        if len(self.selected_cards) == 2 and self.rivals_input.isdigit() and 1 <= int(self.rivals_input) <= 8:
+            equity = equity_preflop(self.selected_cards[0], self.selected_cards[1], int(self.rivals_input))
+            for i, clase in enumerate(("Victoria", "Empate", "Derrota")):
+                equity_text = self.small_font.render(f"{clase}: {equity[clase]:.2%}", True, (255, 255, 255))
+                screen.blit(equity_text, (self.input_rect.x, self.input_rect.bottom + 10 + i * 22))
 
         # Mostramos el botón de continuar
         if len(self.selected_cards) == 2 and self.rivals_input.isdigit() and 1 <= int(self.rivals_input) <= 8:
@@ -153,7 +185,5 @@ class PreflopScreen():
             pygame.draw.rect(screen, (169, 169, 169), self.continue_button, border_radius=10)  
         screen.blit(self.button_text, (self.continue_button.x + 25, self.continue_button.y + 8)) 
 
-        pygame.display.flip()
-
 
 
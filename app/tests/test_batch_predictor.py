@@ -0,0 +1,33 @@
+# Pruebas de la comprobación de las situaciones del predictor por lotes
+
+import numpy as np
+import pytest
+
+from engine.batch_predictor import comprobar_situaciones, leer_situaciones
+
+CABECERA = "cartas_jugador,num_rivales,flop,turn,river\n"
+FILA = "\"['A♠', 'K♠']\",{rivales},\"['Q♠', 'J♠', '2♦']\",['7♣'],['{river}']\n"
+
+
+def _csv(tmp_path, filas):
+    ruta = tmp_path / "situaciones.csv"
+    ruta.write_text(CABECERA + "".join(FILA.format(**fila) for fila in filas), encoding="utf-8")
+    return str(ruta)
+
+
+def test_situaciones_validas():
+    comprobar_situaciones(np.array([[141, 131]]), np.array([8]), np.array([[121, 111, 23, 72, 94]]))
+
+
+@pytest.mark.parametrize("fila, mensaje", [
+    ({"rivales": 2, "river": "Z♥"}, "cartas desconocidas"),
+    ({"rivales": 2, "river": "A♠"}, "cartas repetidas"),
+    ({"rivales": 0, "river": "9♥"}, "rivales"),
+    ({"rivales": 9, "river": "9♥"}, "rivales"),
+    ({"rivales": 258, "river": "9♥"}, "rivales"),
+])
+def test_filas_no_validas(tmp_path, fila, mensaje):
+    # La fila mala es la tercera, en el segundo bloque
+    ruta = _csv(tmp_path, [{"rivales": 2, "river": "9♥"}] * 2 + [fila])
+    with pytest.raises(ValueError, match=f"fila 2: .*{mensaje}"):
+        list(leer_situaciones(ruta, tam_lote=2))
@@ -0,0 +1,127 @@
+# Pruebas del evaluador de manos (una a una y por lotes) y de la equity exacta contra fuerza bruta
+
+import itertools
+
+import numpy as np
+import pytest
+
+from engine.batch_evaluator import evaluar_fuerzas, evaluar_lote
+from engine.cards import BARAJA, carta_a_numero
+from engine.equity import equity_exacta
+from engine.evaluator import evaluar_mano, indices_mejor_mano, nombre_mano
+
+
+def _fuerza_5(cartas):
+    # Clasificación directa de 5 cartas con la misma codificación que engine.evaluator
+    valores = sorted((carta // 10 for carta in cartas), reverse=True)
+    color = len({carta % 10 for carta in cartas}) == 1
+    distintos = sorted(set(valores), reverse=True)
+    escalera = None
+    if len(distintos) == 5 and distintos[0] - distintos[4] == 4:
+        escalera = distintos[0]
+    elif distintos == [14, 5, 4, 3, 2]:
+        escalera = 5
+
+    # Valores ordenados por repeticiones y después por valor
+    grupos = sorted(((valores.count(v), v) for v in distintos), reverse=True)
+    repeticiones = [n for n, _ in grupos]
+    desempate = [v for _, v in grupos]
+    if escalera and color:
+        categoria, desempate = (10 if escalera == 14 else 9), [escalera]
+    elif repeticiones[0] == 4:
+        categoria = 8
+    elif repeticiones[:2] == [3, 2]:
+        categoria = 7
+    elif color:
+        categoria = 6
+    elif escalera:
+        categoria, desempate = 5, [escalera]
+    elif repeticiones[0] == 3:
+        categoria = 4
+    elif repeticiones[:2] == [2, 2]:
+        categoria = 3
+    elif repeticiones[0] == 2:
+        categoria = 2
+    else:
+        categoria = 1
+
+    fuerza = categoria << 20
+    for desplazamiento, valor in zip((16, 12, 8, 4, 0), desempate):
+        fuerza |= valor << desplazamiento
+    return fuerza
+
+
+def fuerza_bruta(cartas):
+    """Fuerza de la mejor de todas las combinaciones de 5 cartas."""
+    return max(_fuerza_5(combinacion) for combinacion in itertools.combinations(cartas, 5))
+
+
+def _cartas(texto):
+    return [carta_a_numero(carta) for carta in texto.split()]
+
+
+@pytest.mark.parametrize("num_cartas", [5, 6, 7])
+def test_manos_al_azar(num_cartas):
+    rng = np.random.default_rng(num_cartas)
+    manos = np.array([rng.choice(BARAJA, num_cartas, replace=False) for _ in range(3000)], dtype=np.uint8)
+    esperadas = [fuerza_bruta(mano.tolist()) for mano in manos]
+    assert [evaluar_mano(mano.tolist()) for mano in manos] == esperadas
+    assert evaluar_fuerzas(manos).tolist() == esperadas
+
+    # Las 5 cartas elegidas forman la mejor mano
+    categorias, fuerzas, indices = evaluar_lote(manos)
+    assert (categorias == fuerzas >> 20).all()
+    for mano, fila in zip(manos[:300], indices[:300]):
+        assert _fuerza_5(mano[fila].tolist()) == evaluar_mano(mano.tolist())
+        assert sorted(indices_mejor_mano(mano.tolist())) == sorted(fila.tolist())
+
+
+@pytest.mark.parametrize("mano, nombre, valores", [
+    ("A♥ 2♥ 3♥ 4♥ 5♥ K♠ Q♦", "Escalera de Color", [5]),
+    ("6♣ 2♣ 3♣ 4♣ 5♣ A♣ 9♦", "Escalera de Color", [6]),
+    ("A♠ K♠ Q♠ J♠ 10♠ 9♠ 2♦", "Escalera Real", [14]),
+    ("A♦ 2♠ 3♣ 4♥ 5♦ 9♠ J♦", "Escalera", [5]),
+    ("9♠ 9♦ 9♣ 4♥ 4♦ 4♠ 2♦", "Full House", [9, 4]),
+    ("7♠ 7♦ 7♣ 7♥ K♦ 2♠ 3♦", "Póker", [7, 13]),
+    ("7♠ 7♦ 7♣ 7♥ 8♦ 8♠ 8♥", "Póker", [7, 8]),
+    ("Q♠ Q♦ 5♣ 5♥ 3♦ 3♠ 2♦", "Doble Pareja", [12, 5, 3]),
+    ("2♥ 5♥ 7♥ 9♥ J♥ 8♠ 6♦", "Color", [11, 9, 7, 5, 2]),
+])
+def test_casos_limite(mano, nombre, valores):
+    cartas = _cartas(mano)
+    fuerza = evaluar_mano(cartas)
+    assert nombre_mano(fuerza) == nombre
+    assert fuerza >> 16 & 15 == valores[0]
+    assert fuerza == fuerza_bruta(cartas) == int(evaluar_fuerzas(np.array([cartas], dtype=np.uint8))[0])
+
+
+def _equity_enumerada(jugador, mesa, num_rivales):
+    # Victorias, empates y total recorriendo todos los tableros y manos de los rivales
+    resto = [carta for carta in BARAJA if carta not in jugador + mesa]
+    victorias = empates = total = 0
+    for tablero in itertools.combinations(resto, 5 - len(mesa)):
+        comunitarias = mesa + list(tablero)
+        libres = [carta for carta in resto if carta not in tablero]
+        fuerza = evaluar_mano(jugador + comunitarias)
+        fuerzas = {mano: evaluar_mano(list(mano) + comunitarias) for mano in itertools.combinations(libres, 2)}
+        for rivales in itertools.combinations(fuerzas, num_rivales):
+            if len({carta for mano in rivales for carta in mano}) < 2 * num_rivales:
+                continue
+            mejor = max(fuerzas[mano] for mano in rivales)
+            victorias += fuerza > mejor
+            empates += fuerza == mejor
+            total += 1
+    return victorias, empates, total
+
+
+@pytest.mark.parametrize("jugador, mesa, num_rivales", [
+    ("A♠ K♠", "Q♠ J♠ 2♦ 7♣ 9♥", 1),
+    ("8♦ 8♣", "A♠ K♦ 8♠ 3♣", 1),
+    ("Q♥ 9♥", "10♥ 9♠ 2♥ J♣ 4♦", 2),
+])
+def test_equity_exacta_contra_enumeracion(jugador, mesa, num_rivales):
+    victorias, empates, total = _equity_enumerada(_cartas(jugador), _cartas(mesa), num_rivales)
+    resultado = equity_exacta(_cartas(jugador), _cartas(mesa), num_rivales)
+    assert resultado["Exacta"] and resultado["Manos"] == total
+    assert resultado["Victoria"] == pytest.approx(victorias / total)
+    assert resultado["Empate"] == pytest.approx(empates / total)
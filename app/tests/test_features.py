@@ -0,0 +1,23 @@
+# Pruebas de que el modelo recibe las mismas features al entrenar y al predecir
+
+import numpy as np
+
+from engine.cache import clave_canonica
+from engine.features import features_mano, matriz_features
+from engine.generator import simular_manos
+
+
+def test_entrenamiento_y_prediccion_iguales():
+    # Las columnas del generador tienen las cartas sin canonizar, como cualquier dataset
+    columnas = simular_manos(np.random.default_rng(0), 5000)
+    comunitarias = np.concatenate([columnas["flop"], columnas["turn"][:, None], columnas["river"][:, None]], axis=1)
+    X = matriz_features(columnas)
+    assert np.array_equal(X, features_mano(columnas["cartas_jugador"], columnas["num_rivales"], comunitarias))
+
+
+def test_mismas_features_salvo_palos_y_orden():
+    # A♠ K♠ con Q♠ J♠ 2♦ 7♣ 9♥ y la misma mano con los palos cambiados y otro orden
+    X = features_mano([[141, 131], [134, 144]], 2, [[121, 111, 23, 72, 94], [114, 124, 21, 73, 92]])
+    assert np.array_equal(X[0], X[1])
+    assert clave_canonica([141, 131], [121, 111, 23, 72, 94], 2, por_calles=True) == \
+        clave_canonica([134, 144], [114, 124, 21, 73, 92], 2, por_calles=True)
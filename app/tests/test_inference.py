@@ -0,0 +1,31 @@
+# Pruebas de la carga del modelo exportado
+
+import os
+
+import numpy as np
+import pytest
+
+from engine.features import FEATURES
+from engine.inference import cargar_modelo, guardar_pesos
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    rng = np.random.default_rng(0)
+    pesos = [rng.normal(size=(len(FEATURES), 8)), rng.normal(size=(8, 3))]
+    ruta = guardar_pesos(str(tmp_path / "poker_model.npz"), pesos, [np.zeros(8), np.zeros(3)], [0.1])
+    keras = tmp_path / "poker_model.keras"
+    keras.write_bytes(b"")
+    return ruta, str(keras), str(tmp_path / "scaler.pkl")
+
+
+def test_sin_scaler_usa_el_modelo_exportado(rutas):
+    ruta, keras, scaler = rutas
+    assert cargar_modelo(ruta, keras, scaler).predecir(np.zeros((2, len(FEATURES)))).shape == (2, 3)
+
+
+def test_sin_scaler_ni_modelo_exportado(rutas):
+    ruta, keras, scaler = rutas
+    os.remove(ruta)
+    with pytest.raises(ValueError, match="scaler"):
+        cargar_modelo(ruta, keras, scaler)
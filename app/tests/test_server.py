@@ -0,0 +1,94 @@
+# Pruebas de las respuestas de error del servidor de predicciones
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from engine.features import FEATURES
+from engine.inference import ModeloNumpy, guardar_pesos
+from engine.server import PeticionInvalida, iniciar_servidor, situaciones_desde_json
+
+SITUACION = {"cartas_jugador": ["A♠", "K♠"], "num_rivales": 2, "comunitarias": ["Q♠", "J♠", "2♦", "7♣", "9♥"]}
+
+
+class ModeloQueFalla(ModeloNumpy):
+    """Modelo que falla con cualquier lote que tenga una situación con 8 rivales."""
+
+    def predecir(self, X):
+        if (np.asarray(X)[:, FEATURES.index("num_rivales")] == 8).any():
+            raise RuntimeError("entrada no soportada")
+        return super().predecir(X)
+
+
+@pytest.fixture
+def ruta_modelo(tmp_path):
+    rng = np.random.default_rng(0)
+    pesos = [rng.normal(size=(len(FEATURES), 8)) * 0.01, rng.normal(size=(8, 3))]
+    return guardar_pesos(str(tmp_path / "modelo.npz"), pesos, [np.zeros(8), np.zeros(3)], [0.1])
+
+
+async def _peticion(puerto, cuerpo):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    datos = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode()
+    escritor.write(f"POST /predecir HTTP/1.1\r\nContent-Length: {len(datos)}\r\nConnection: close\r\n\r\n".encode() + datos)
+    await escritor.drain()
+    respuesta = await lector.read()
+    escritor.close()
+    cabecera, _, cuerpo = respuesta.partition(b"\r\n\r\n")
+    return int(cabecera.split()[1]), json.loads(cuerpo)
+
+
+def _servir(modelo, cuerpos, **opciones):
+    # Lanza todas las peticiones a la vez (para que vayan en el mismo microlote) y devuelve sus respuestas
+    async def probar():
+        servidor, lotes = await iniciar_servidor(modelo, puerto=0, espera_ms=20, **opciones)
+        puerto = servidor.sockets[0].getsockname()[1]
+        try:
+            return await asyncio.gather(*[_peticion(puerto, cuerpo) for cuerpo in cuerpos])
+        finally:
+            servidor.close()
+            await lotes.detener()
+
+    return asyncio.run(probar())
+
+
+@pytest.mark.parametrize("carta", [15, 0, 999, 140, "15", "1♠", "A♤"])
+def test_cartas_fuera_de_la_baraja(carta):
+    with pytest.raises(PeticionInvalida):
+        situaciones_desde_json({**SITUACION, "cartas_jugador": [carta, "K♠"]})
+
+
+def test_situacion_valida():
+    cartas_jugador, num_rivales, comunitarias = situaciones_desde_json({**SITUACION, "cartas_jugador": [141, "131"]})
+    assert cartas_jugador.tolist() == [[141, 131]]
+    assert num_rivales.tolist() == [2]
+    assert comunitarias.tolist() == [[121, 111, 23, 72, 94]]
+
+
+def test_respuestas_400(ruta_modelo):
+    cuerpos = [
+        {**SITUACION, "cartas_jugador": [15, "K♠"]},
+        {**SITUACION, "comunitarias": ["Q♠", "J♠", "2♦", "7♣"]},
+        {**SITUACION, "comunitarias": ["A♠", "J♠", "2♦", "7♣", "9♥"]},
+        {**SITUACION, "num_rivales": 9},
+        {"situaciones": []},
+        b"{no es json",
+        SITUACION,
+    ]
+    estados = [estado for estado, _ in _servir(ModeloNumpy(ruta_modelo), cuerpos)]
+    assert estados == [400] * 6 + [200]
+
+
+def test_peticion_mayor_que_la_cola(ruta_modelo):
+    (estado, cuerpo), = _servir(ModeloNumpy(ruta_modelo), [{"situaciones": [SITUACION] * 5}], max_cola=4)
+    assert estado == 413
+    assert "máximo" in cuerpo["error"]
+
+
+def test_un_error_no_afecta_al_resto_del_lote(ruta_modelo):
+    cuerpos = [SITUACION, {**SITUACION, "num_rivales": 8}, {"situaciones": [SITUACION] * 2}]
+    respuestas = _servir(ModeloQueFalla(ruta_modelo), cuerpos)
+    assert [estado for estado, _ in respuestas] == [200, 500, 200]
+    assert len(respuestas[2][1]["predicciones"]) == 2
@@ -1,24 +1,129 @@
 import pygame
 import os
 import random 
+import threading
+import time
+from collections import deque
+
+from engine.profiling import contar, tramo
+
+CARD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'img', 'cards')
+
+# Identificadores de las 52 cartas (valor * 10 + palo), en el orden de la hoja de cartas
+CARD_IDS = [f"{valor}{palo}" for palo in range(1, 5) for valor in range(2, 15)]
+
+# Tamaño de cada carta en la hoja (el doble de la carta más grande que se dibuja)
+ATLAS_CARD_SIZE = (160, 240)
+
+
+class AssetCache:
+    """Imágenes y fuentes compartidas por todas las pantallas: cada fichero se lee del disco una sola vez."""
+
+    def __init__(self):
+        self.images = {}
+        self.scaled = {}
+        self.fonts = {}
+        self.atlas = None
+        self.disk_loads = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _read(self, path):
+        self.disk_loads += 1
+        contar("recursos.lecturas")
+        with tramo("recursos.lectura"):
+            return pygame.image.load(path).convert_alpha()
+
+    def get_image(self, image_path, scale=None):
+        """Imagen decodificada una sola vez y escalada una sola vez por tamaño."""
+        path = os.path.abspath(image_path)
+        key = (path, tuple(scale) if scale else None)
+        if key in self.scaled:
+            self.hits += 1
+            return self.scaled[key]
+
+        self.misses += 1
+        if path not in self.images:
+            self.images[path] = self._read(path)
+        image = self.images[path]
+        if scale:
+            image = pygame.transform.scale(image, scale)
+        self.scaled[key] = image
+        return image
+
+    def _build_atlas(self):
+        # Las 52 cartas se reducen a ATLAS_CARD_SIZE en una sola hoja de 13 x 4; los originales
+        # (941 x 1280) no se conservan, ocuparían unos 250 MB
+        with tramo("recursos.atlas"):
+            self._fill_atlas()
+
+    def _fill_atlas(self):
+        width, height = ATLAS_CARD_SIZE
+        self.atlas = pygame.Surface((13 * width, 4 * height), pygame.SRCALPHA).convert_alpha()
+        self.atlas_rects = {}
+        for i, card_id in enumerate(CARD_IDS):
+            rect = pygame.Rect((i % 13) * width, (i // 13) * height, width, height)
+            card = self._read(os.path.join(CARD_FOLDER, f"{card_id}.png"))
+            self.atlas.blit(pygame.transform.smoothscale(card, ATLAS_CARD_SIZE), rect)
+            self.atlas_rects[card_id] = rect
+
+    def get_card(self, card_id, size=(50, 75)):
+        """Carta escalada a size, recortada de la hoja de cartas y guardada por (carta, tamaño)."""
+        key = (card_id, tuple(size))
+        if key in self.scaled:
+            self.hits += 1
+            return self.scaled[key]
+
+        self.misses += 1
+        if self.atlas is None:
+            self._build_atlas()
+        card = self.atlas.subsurface(self.atlas_rects[card_id])
+        if tuple(size) != ATLAS_CARD_SIZE:
+            card = pygame.transform.smoothscale(card, size)
+        self.scaled[key] = card
+        return card
+
+    def get_font(self, path, size):
+        key = (os.path.abspath(path), size)
+        if key not in self.fonts:
+            with tramo("recursos.fuente"):
+                self.fonts[key] = pygame.font.Font(key[0], size)
+        return self.fonts[key]
+
+    def memory_usage(self):
+        """Bytes de píxeles de las imágenes guardadas (las cartas a tamaño de la hoja la comparten)."""
+        surfaces = list(self.images.values()) + [image for image in self.scaled.values() if image.get_parent() is None]
+        if self.atlas is not None:
+            surfaces.append(self.atlas)
+        return sum(surface.get_width() * surface.get_height() * surface.get_bytesize() for surface in surfaces)
+
+    def stats(self):
+        """Contadores de la caché para comprobar que los cambios de pantalla no leen del disco."""
+        return {
+            "disk_loads": self.disk_loads,
+            "hits": self.hits,
+            "misses": self.misses,
+            "images": len(self.images) + (len(CARD_IDS) if self.atlas is not None else 0),
+            "scaled": len(self.scaled),
+            "fonts": len(self.fonts),
+            "memory_bytes": self.memory_usage(),
+        }
+
+asset_cache = AssetCache()
+
 
 def load_image(image_path, scale=None):
-    """Cargar y escalar una imagen desde la ruta especificada."""
-    image = pygame.image.load(os.path.abspath(image_path)).convert_alpha()
-    if scale:
-        image = pygame.transform.scale(image, scale)
-    return image
+    """Cargar y escalar una imagen desde la ruta especificada (desde la caché compartida)."""
+    return asset_cache.get_image(image_path, scale)
 
 def load_font(path, size):
-    return pygame.font.Font(path, size)
+    return asset_cache.get_font(path, size)
 
-def load_card_images(card_images, BASE_DIR, size=(50, 75)):
-    card_folder = os.path.join(BASE_DIR, '..', 'assets', 'img', 'cards')
-    for filename in os.listdir(card_folder):
-        if filename.endswith(".png"):
-            card_id = filename.split(".")[0]      
-            card_image = load_image(os.path.join(card_folder, filename), size)
-            card_images[card_id] = card_image
+def load_card_images(card_images, BASE_DIR=None, size=(50, 75)):
+    """Rellena card_images con las 52 cartas al tamaño indicado (desde la caché compartida)."""
+    for card_id in CARD_IDS:
+        card_images[card_id] = asset_cache.get_card(card_id, size)
+    return card_images
 
 class SoundManager:
     def __init__(self):
@@ -65,3 +170,111 @@ class SoundManager:
 
 sound_manager = SoundManager()
 
+
+class ModelManager:
+    def __init__(self):
+        self.model = None
+        self.error = None
+        self.loaded = threading.Event()
+        self.thread = None
+
+    def start_loading(self):
+        """Empieza a cargar el modelo en segundo plano (solo la primera vez)."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._load, daemon=True)
+            self.thread.start()
+
+    def _load(self):
+        try:
+            # Los módulos pesados se importan aquí, fuera del hilo de la interfaz
+            from engine.inference import cargar_modelo
+            from engine.features import features_mano
+            import engine.equity  # noqa: F401
+
+            with tramo("modelo.carga"):
+                model = cargar_modelo()
+
+            # Primera predicción para que la del usuario no pague la inicialización
+            with tramo("modelo.calentamiento"):
+                model.predecir(features_mano(["141", "131"], 1, ["121", "111", "101", "22", "33"]))
+            self.model = model
+        except Exception as error:
+            self.error = error
+            print(f"No se pudo cargar el modelo: {error}")
+        finally:
+            self.loaded.set()
+
+    def is_ready(self):
+        """Indica si el modelo ya está cargado."""
+        return self.model is not None
+
+    def status(self):
+        """Estado de la carga para mostrarlo en la interfaz."""
+        if self.error is not None:
+            return "Modelo no disponible"
+        if self.model is None:
+            return "Cargando modelo..."
+        return "Modelo listo"
+
+    def get_model(self, timeout=None):
+        """Devuelve el modelo compartido, esperando a que se cargue (None si no se ha podido cargar)."""
+        self.start_loading()
+        self.loaded.wait(timeout)
+        return self.model
+
+model_manager = ModelManager()
+
+
+class FrameStats:
+    """Tiempos de los últimos frames dibujados, con un panel opcional para mostrarlos en pantalla."""
+
+    def __init__(self, size=120):
+        self.draw_times = deque(maxlen=size)
+        self.frame_times = deque(maxlen=size)
+        self.full_redraws = 0
+        self.partial_redraws = 0
+        self.last_frame = None
+        self.started = None
+        self.visible = False
+        self.font = None
+        self.rect = pygame.Rect(0, 578, 420, 22)
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self, full):
+        """Registra el frame dibujado (full indica si se ha redibujado la pantalla completa)."""
+        now = time.perf_counter()
+        self.draw_times.append(now - self.started)
+        if self.last_frame is not None:
+            self.frame_times.append(now - self.last_frame)
+        self.last_frame = now
+        if full:
+            self.full_redraws += 1
+        else:
+            self.partial_redraws += 1
+
+    def summary(self):
+        """Media y máximo del tiempo de dibujo (ms) y frames por segundo mientras hay cambios."""
+        if not self.draw_times:
+            return {"fps": 0.0, "draw_ms": 0.0, "max_draw_ms": 0.0, "full": 0, "partial": 0}
+        return {
+            "fps": len(self.frame_times) / sum(self.frame_times) if self.frame_times else 0.0,
+            "draw_ms": 1000 * sum(self.draw_times) / len(self.draw_times),
+            "max_draw_ms": 1000 * max(self.draw_times),
+            "full": self.full_redraws,
+            "partial": self.partial_redraws,
+        }
+
+    def draw(self, screen):
+        """Dibuja los tiempos en la esquina inferior izquierda y devuelve el área ocupada."""
+        if self.font is None:
+            self.font = pygame.font.Font(None, 20)
+        stats = self.summary()
+        text = (f"{stats['fps']:.0f} FPS | dibujo {stats['draw_ms']:.2f} ms (máx {stats['max_draw_ms']:.2f}) | "
+                f"completos {stats['full']} parciales {stats['partial']}")
+        pygame.draw.rect(screen, (0, 0, 0), self.rect)
+        screen.blit(self.font.render(text, True, (255, 255, 0)), (self.rect.x + 4, self.rect.y + 4))
+        return self.rect
+
+frame_stats = FrameStats()